@@ -0,0 +1,397 @@
+"""
+Micro-benchmark suite for the dashboard widgets and NLP stages.
+
+Generates (or reuses) a synthetic dataset at the requested scale, times the widgets'
+figure builders and the NLP stages with stubbed models, and writes the results as JSON
+so runs can be compared between versions. No network access or model download is needed,
+only the NLTK punkt tokenizer data used for sentence splitting.
+
+Usage:
+    python -m benchmarks.run_benchmarks --scale 10 --output bench_results/scale_10.json
+    python -m benchmarks.run_benchmarks --compare bench_results/old.json bench_results/new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import torch
+
+from benchmarks.synthetic_data import write_dataset
+from utils.serialization import figure_payload_sizes
+
+
+class StubKeyphraseExtractor:
+    """
+    Stands in for KeyphraseExtractionPipeline: returns capitalized words as keyphrases.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _extract(self, text):
+        return np.unique([word.strip(".,") for word in text.split() if word[:1].isupper()])
+
+    def __call__(self, inputs, **kwargs):
+        if isinstance(inputs, list):
+            return [self._extract(text) for text in inputs]
+        return self._extract(inputs)
+
+
+class StubTokenizer:
+    """
+    Stands in for the DeBERTa tokenizer: maps words to ids by hashing.
+    """
+
+    is_fast = True
+    pad_token_id = 0
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def _ids(self, text):
+        return [3 + sum(map(ord, word)) % 30000 for word in text.split()]
+
+    def build_inputs_with_special_tokens(self, ids, pair_ids):
+        return [1] + ids + [2] + pair_ids + [2]
+
+    def create_token_type_ids_from_sequences(self, ids, pair_ids):
+        return [0] * (len(ids) + 2) + [1] * (len(pair_ids) + 1)
+
+    def __call__(self, text, text_pair=None, add_special_tokens=True, **kwargs):
+        if not isinstance(text, str):
+            return {"input_ids": [self(t, add_special_tokens=add_special_tokens)["input_ids"] for t in text]}
+        ids = self._ids(text)
+        if add_special_tokens:
+            ids = self.build_inputs_with_special_tokens(ids, self._ids(text_pair or ""))
+        return {"input_ids": ids}
+
+
+class StubPolarityModel:
+    """
+    Stands in for the ABSA sequence classifier: deterministic logits from the input ids.
+    """
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def eval(self):
+        return self
+
+    def __call__(self, input_ids, **kwargs):
+        totals = input_ids.sum(dim=1).double()
+        logits = torch.stack([totals % 3, (totals / 3) % 3, (totals / 7) % 3], dim=1).float()
+        return SimpleNamespace(logits=logits)
+
+
+class StubNLP:
+    """
+    Stands in for the spaCy pipeline: noun chunks are runs of capitalized words.
+    """
+
+    def __call__(self, text):
+        chunks, current = [], []
+        for word in text.split():
+            if word[:1].isupper():
+                current.append(word.strip(".,"))
+            elif current:
+                chunks.append(SimpleNamespace(text=" ".join(current)))
+                current = []
+        if current:
+            chunks.append(SimpleNamespace(text=" ".join(current)))
+        return SimpleNamespace(noun_chunks=chunks)
+
+
+def stub_models():
+    """
+    Patch model loading in the inference service and the NLP widgets so no model is downloaded or run.
+
+    Returns:
+        ExitStack: Context manager that undoes the patches on exit.
+    """
+    stack = ExitStack()
+    stack.enter_context(mock.patch("processing.inference.AutoTokenizer", StubTokenizer))
+    stack.enter_context(mock.patch("processing.tokenization.AutoTokenizer", StubTokenizer))
+    stack.enter_context(mock.patch("processing.inference.AutoModelForSequenceClassification", StubPolarityModel))
+    stack.enter_context(mock.patch("processing.inference.KeyphraseExtractionPipeline", StubKeyphraseExtractor))
+    stack.enter_context(mock.patch("widgets.wordcloud.spacy.load", lambda *args, **kwargs: StubNLP()))
+    return stack
+
+
+def time_call(fn, repeat):
+    """
+    Call a function `repeat` times and return the wall-clock duration of each call in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(name, durations):
+    """
+    Summarize a list of durations into a result record.
+    """
+    return {
+        "name": name,
+        "repeat": len(durations),
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "mean_s": statistics.fmean(durations),
+        "max_s": max(durations),
+    }
+
+
+def git_revision():
+    """
+    Return the current git commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(data_path, articles_dir, repeat=5):
+    """
+    Run all benchmarks against one dataset.
+
+    Parameters:
+        data_path (str): Path of the mc1.json-shaped data file.
+        articles_dir (str): Directory containing the article text files.
+        repeat (int): Number of timed calls per benchmark.
+
+    Returns:
+        Tuple[List[dict], dict]: One result record per benchmark, and the serialized
+        payload sizes of the main figures.
+    """
+    from widgets.knowledge_graph import KnowledgeGraphPlot
+    from widgets.heatmap import Heatmap
+    from widgets.pcp import PCP
+    from widgets.horizontal_bar import HorizontalBarPlot
+    from widgets.wordcloud import WordCloudWidget
+    from widgets.sentiment_comparison_bar import DivergingSentimentPlot
+    from processing.article_catalog import ArticleCatalog
+    from processing.corpus_index import CorpusIndex, custom_sentence_split
+    from processing.ingest import load_graph_tables
+    from processing.inference import BatchedInference
+    from processing.rollups import RESOLUTIONS, SentimentRollup
+    from processing.divergence import article_scores, divergence_cells
+    from processing.annotator_agreement import AnnotatorAgreement
+    from processing.algorithm_agreement import AlgorithmAgreementIndex
+    from processing.sentiment_index import SentimentIndex, article_meta
+
+    results = []
+
+    def bench(name, fn, n=repeat):
+        results.append(summarize(name, time_call(fn, n)))
+        print(f"{name:<45} median {results[-1]['median_s'] * 1000:10.2f} ms")
+
+    def load():
+        with open(data_path, "r") as f:
+            return json.load(f)
+
+    bench("ingest.json_load", load, n=max(1, repeat // 2))
+    data = load()
+
+    with tempfile.TemporaryDirectory() as ingest_dir:
+        bench("ingest.snapshot_build", lambda: load_graph_tables(data_path, ingest_dir=ingest_dir, stream=True), n=1)
+        bench("ingest.snapshot_load", lambda: load_graph_tables(data_path, ingest_dir=ingest_dir))
+
+    bench("init.KnowledgeGraphPlot", lambda: KnowledgeGraphPlot(data=data, html_id="graph"), n=1)
+    bench("init.Heatmap", lambda: Heatmap(data=data, html_id="heatmap"), n=1)
+    bench("init.PCP", lambda: PCP(data=data, html_id="stream_graph"), n=1)
+    bench("init.HorizontalBarPlot", lambda: HorizontalBarPlot(data=data, html_id="horizontalbar"), n=1)
+
+    knowledge_graph = KnowledgeGraphPlot(data=data, html_id="graph")
+    heatmap = Heatmap(data=data, html_id="heatmap")
+    pcp = PCP(data=data, html_id="stream_graph")
+    horizontal_bar = HorizontalBarPlot(data=data, html_id="horizontalbar")
+
+    # Benchmark against the busiest company and its busiest heatmap cell
+    company = heatmap.df_links["company"].value_counts().idxmax()
+    company_links = heatmap.df_links[heatmap.df_links["company"] == company]
+    month, source = company_links.groupby(["month", "_raw_source"]).size().idxmax()
+    month = str(month)
+
+    all_types = knowledge_graph.edge_types_available
+    bench("AdjacencyIndex.partition[all]", lambda: knowledge_graph.adjacency.partition(all_types))
+    bench("AdjacencyIndex.ego[2 hops]", lambda: knowledge_graph.adjacency.ego(company, all_types, 2, max_degree=25))
+    bench(
+        "KnowledgeGraphPlot.generate_figure[2-hop ego]",
+        lambda: knowledge_graph.generate_figure(all_types, company, ego_hops=2),
+    )
+    bench("KnowledgeGraphPlot.generate_figure[all]", lambda: knowledge_graph.generate_figure(all_types, company))
+    bench(
+        "KnowledgeGraphPlot.generate_figure[2 types]",
+        lambda: knowledge_graph.generate_figure(all_types[:2], company),
+    )
+
+    bench("Heatmap.generate_figure", lambda: heatmap.generate_figure(company))
+    heatmap_values = heatmap.cell_values(company)
+    bench("Heatmap.figure_from_values", lambda: heatmap.figure_from_values(heatmap_values))
+    bench("Heatmap.patch_from_values", lambda: heatmap.patch_from_values(heatmap_values))
+    scores = heatmap._scores(heatmap.df_links)
+    bench("SentimentRollup.from_scores", lambda: SentimentRollup.from_scores(scores), n=3)
+    for resolution in RESOLUTIONS:
+        bench(f"Heatmap.cell_values[{resolution}]", lambda r=resolution: heatmap.cell_values(company, r))
+    first_day, _ = heatmap.time_range()
+    zoom_end = (datetime.fromisoformat(first_day) + timedelta(days=27)).date().isoformat()
+    bench("Heatmap.cell_values[week, 4 weeks]", lambda: heatmap.cell_values(company, "week", first_day, zoom_end))
+    payloads = {
+        "KnowledgeGraphPlot.generate_figure[all]": figure_payload_sizes(
+            knowledge_graph.generate_figure(all_types, company)
+        ),
+        "Heatmap.generate_figure": figure_payload_sizes(heatmap.generate_figure(company)),
+    }
+    heatmap.generate_figure(company)
+    source_abbr = {full: abbr for abbr, full in heatmap.row_mapping.items()}[source]
+    month_abbr = heatmap.period_labels()[month]
+    click = {"points": [{"x": month_abbr, "y": source_abbr}]}
+    bench("Heatmap.get_sentiment_score", lambda: heatmap.get_sentiment_score(click))
+    bench("Heatmap.get_articles", lambda: heatmap.get_articles(month, source))
+
+    bench("PCP._prepare_plot_df[company]", lambda: pcp._prepare_plot_df(company, None))
+    bench("PCP._prepare_plot_df[cell]", lambda: pcp._prepare_plot_df(company, heatmap_filter=(month, source)))
+    bench(
+        "AlgorithmAgreementIndex.from_links", lambda: AlgorithmAgreementIndex.from_links(horizontal_bar.df_links), n=3
+    )
+    bench("AlgorithmAgreementIndex.lookup[company]", lambda: horizontal_bar.agreement.lookup(company))
+    bench("AlgorithmAgreementIndex.lookup[cell]", lambda: horizontal_bar.agreement.lookup(company, month, source))
+    bench(
+        "AnnotatorAgreement[all]",
+        lambda: AnnotatorAgreement(pcp.df_links, pcp.edge_type_sentiment, heatmap.valid_companies),
+        n=3,
+    )
+    bench(
+        "HorizontalBarPlot._prepare_plot_df[company]",
+        lambda: horizontal_bar._prepare_plot_df(company, None),
+    )
+    bench(
+        "HorizontalBarPlot._prepare_plot_df[cell]",
+        lambda: horizontal_bar._prepare_plot_df(company, heatmap_filter=(month, source)),
+    )
+
+    entities = [node["id"] for node in data["nodes"]]
+    links = pd.DataFrame(data["links"])
+    bench("ArticleCatalog.from_directory", lambda: ArticleCatalog.from_directory(articles_dir, links), n=3)
+    catalog = ArticleCatalog.from_directory(articles_dir, links)
+    bench("ArticleCatalog.articles_of[company]", lambda: catalog.articles_of(company=company))
+    bench("ArticleCatalog.articles_of[source]", lambda: catalog.articles_of(source=source))
+    articles = heatmap.get_articles(month, source)
+    texts = [catalog.read(art) for art in articles]
+
+    bench("nlp.corpus_index_build", lambda: CorpusIndex(entities, catalog=catalog), n=1)
+    corpus_index = CorpusIndex(entities, catalog=catalog)
+    bench("nlp.segmentation[cell]", lambda: [custom_sentence_split(text) for text in texts])
+    bench("nlp.entity_sentences[cell]", lambda: [corpus_index.entity_sentences(art, company) for art in articles])
+
+    with stub_models():
+        inference = BatchedInference()
+        wordcloud = WordCloudWidget([], id="wordcloud", corpus_index=corpus_index, inference=inference)
+        sentiment_bar = DivergingSentimentPlot("sentiment-bar", corpus_index=corpus_index, inference=inference)
+        entity_sentences = [corpus_index.entity_sentences(art, company) for art in articles]
+
+        bench(
+            "nlp.keyphrase_model[cell]",
+            lambda: inference.keyphrases([" ".join(sents) for sents in entity_sentences]),
+        )
+        corpus_texts = [" ".join(sents) for sents in corpus_index.sentences.values()]
+        bench("nlp.keyphrase_model[corpus]", lambda: inference.keyphrases(corpus_texts), n=1)
+        bench(
+            "nlp.spacy_chunks[cell]",
+            lambda: [wordcloud.extract_polar_chunks("", company, entity_sentences=sents) for sents in entity_sentences],
+        )
+        bench("nlp.absa[cell]", lambda: sentiment_bar.classify_aspect_sentiment(list(articles), company))
+        sentiment_index = SentimentIndex(corpus_index, "stub", index_dir="")
+        mention_pairs = sentiment_index.mention_pairs()
+        bench("nlp.sentiment_index_fill[corpus]", lambda: sentiment_index.fill(mention_pairs, inference), n=1)
+        bench("nlp.sentiment_index[cell]", lambda: sentiment_index.article_scores(articles, company, inference))
+        meta = article_meta(heatmap.df_links)
+        bench(
+            "nlp.sentiment_index_aggregate[entity,source,month]",
+            lambda: sentiment_index.aggregate(["entity", "source", "month"], meta),
+        )
+        scores = article_scores(sentiment_index, heatmap.valid_companies)
+        bench("divergence.article_scores[all]", lambda: article_scores(sentiment_index, heatmap.valid_companies))
+        bench("divergence.cells[all, month]", lambda: divergence_cells(heatmap.rollup, heatmap.df_links, scores))
+        bench(
+            "WordCloudWidget.render_wordcloud[cell]",
+            lambda: wordcloud.render_wordcloud(articles, company, month, source),
+        )
+
+    return results, payloads
+
+
+def compare(old_path, new_path):
+    """
+    Print the median time ratio of every benchmark present in two result files.
+    """
+    with open(old_path, "r") as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    with open(new_path, "r") as f:
+        new = {r["name"]: r for r in json.load(f)["results"]}
+
+    print(f"{'benchmark':<45} {'old ms':>10} {'new ms':>10} {'ratio':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        old_ms = old[name]["median_s"] * 1000
+        new_ms = new[name]["median_s"] * 1000
+        ratio = new_ms / old_ms if old_ms else float("nan")
+        print(f"{name:<45} {old_ms:10.2f} {new_ms:10.2f} {ratio:8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run widget and NLP micro-benchmarks on synthetic data.")
+    parser.add_argument("--scale", type=float, default=1, help="Size multiple of the original sample")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=None, help="Dataset directory (generated if missing)")
+    parser.add_argument("--output", default=None, help="Path of the JSON results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        raise SystemExit(0)
+
+    data_dir = args.data_dir or f"bench_data/scale_{args.scale:g}"
+    data_path = os.path.join(data_dir, "mc1.json")
+    articles_dir = os.path.join(data_dir, "articles")
+    if not os.path.exists(data_path):
+        data_path, articles_dir = write_dataset(data_dir, scale=args.scale, seed=args.seed)
+
+    results, payloads = run_suite(data_path, articles_dir, repeat=args.repeat)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "seed": args.seed,
+            "data_path": data_path,
+        },
+        "results": results,
+        "payloads": payloads,
+    }
+    output = args.output or f"bench_results/scale_{args.scale:g}.json"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
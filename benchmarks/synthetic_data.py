@@ -0,0 +1,271 @@
+"""
+Generate synthetic mc1.json-shaped graph data and article text at a configurable scale.
+
+The generated data follows the structure of the VAST 2024 MC1 knowledge graph
+(node-link JSON with `nodes` and `links`) and of `data/articles`, so it can be fed
+to the widgets unchanged. Scale 1 is roughly the size of the original sample.
+
+Usage:
+    python -m benchmarks.synthetic_data --scale 10 --output-dir bench_data/scale_10
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# Approximate sizes of the original sample at scale 1
+BASE_COMPANIES = 120
+BASE_OTHER_NODES = 260
+BASE_LINKS_PER_COMPANY = 24
+
+COMPANY_TYPES = {
+    "Entity.Organization.Company": 0.45,
+    "Entity.Organization.FishingCompany": 0.3,
+    "Entity.Organization.LogisticsCompany": 0.12,
+    "Entity.Organization": 0.06,
+    "Entity.Organization.NGO": 0.04,
+    "Entity.Organization.GovernmentOrg": 0.03,
+}
+
+OTHER_NODE_TYPES = {
+    "Entity.Person": 0.6,
+    "Entity.Person.CEO": 0.15,
+    "Entity.Location.Region": 0.1,
+    "Entity.Location.Point": 0.05,
+    "Entity.Vessel.FishingVessel": 0.05,
+    "Entity.Commodity.Fish": 0.05,
+}
+
+EDGE_TYPES = {
+    "Event.Transaction": 0.2,
+    "Event.Fishing": 0.12,
+    "Event.Owns.PartiallyOwns": 0.1,
+    "Event.CertificateIssued": 0.08,
+    "Event.Communication.Conference": 0.08,
+    "Event.Invest": 0.08,
+    "Event.Aid": 0.06,
+    "Event.Applaud": 0.06,
+    "Event.Criticize": 0.06,
+    "Event.Fishing.SustainableFishing": 0.05,
+    "Event.Fishing.OverFishing": 0.04,
+    "Event.CertificateIssued.Summons": 0.04,
+    "Event.Convicted": 0.03,
+}
+
+POSITIVE_EDGE_TYPES = {"Event.Applaud", "Event.Aid", "Event.Invest", "Event.Fishing.SustainableFishing"}
+NEGATIVE_EDGE_TYPES = {
+    "Event.Criticize",
+    "Event.Convicted",
+    "Event.CertificateIssued.Summons",
+    "Event.Fishing.OverFishing",
+}
+
+SOURCES = {"Haacklee Herald": 0.4, "Lomark Daily": 0.35, "The News Buoy": 0.25}
+
+ALGORITHMS = {"BassLine": 0.55, "ShadGPT": 0.45}
+
+ANNOTATORS = {
+    "Olokun Daramola": 0.3,
+    "Maarten Hollender": 0.22,
+    "Junior Shurdlu": 0.18,
+    "Sanjay Pratiksha": 0.14,
+    "Harvey Janus": 0.1,
+    "Urashima Kenta": 0.06,
+}
+
+SURNAMES = [
+    "Alvarez", "Anderson", "Arellano", "Barnes", "Barnett", "Bell", "Bishop", "Blackwell", "Bowers", "Brown",
+    "Burns", "Cain", "Castillo", "Cervantes", "Cisneros", "Clark", "Clements", "Davis", "Elliott", "Forbes",
+    "Green", "Hernandez", "Jones", "Kramer", "Lam", "Leon", "Martinez", "Meyer", "Murray", "Nelson",
+    "Nguyen", "Rasmussen", "Reynolds", "Scott", "Simpson", "Sloan", "Sullivan", "Wall", "Wilcox", "Young",
+]
+COMPANY_SUFFIXES = ["Ltd", "PLC", "Inc", "Group", "and Sons", "LLC", "Corporation", "Transit Ltd"]
+FIRST_NAMES = ["Ana", "Ben", "Chen", "Dara", "Eli", "Femi", "Gia", "Hugo", "Ines", "Jon", "Kofi", "Lena"]
+
+POSITIVE_PHRASES = [
+    "praised for its sustainable fishing practices",
+    "received aid to expand marine conservation efforts",
+    "announced a new investment in efficient vessels",
+    "was applauded by local communities",
+]
+NEGATIVE_PHRASES = [
+    "was criticized for overfishing in protected waters",
+    "was convicted of illegal fishing",
+    "received a summons from the fisheries authority",
+    "faced condemnation from environmental groups",
+]
+NEUTRAL_PHRASES = [
+    "completed a routine transaction",
+    "attended a regional fishing conference",
+    "renewed its fishing certificate",
+    "reported steady catches this season",
+]
+
+
+def _weighted(rng, weights, k=1):
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+def _unique_name(rng, used, make):
+    name = make()
+    while name in used:
+        name = f"{make()} {rng.randint(2, 999)}"
+    used.add(name)
+    return name
+
+
+def _company_name(rng):
+    style = rng.random()
+    if style < 0.4:
+        return f"{rng.choice(SURNAMES)} {rng.choice(COMPANY_SUFFIXES)}"
+    if style < 0.7:
+        return f"{rng.choice(SURNAMES)}-{rng.choice(SURNAMES)}"
+    return f"{rng.choice(SURNAMES)}, {rng.choice(SURNAMES)} and {rng.choice(SURNAMES)}"
+
+
+def _node(node_id, node_type, rng, start_date):
+    date = start_date + timedelta(days=rng.randint(0, 180))
+    return {
+        "type": node_type,
+        "_last_edited_by": _weighted(rng, ANNOTATORS)[0],
+        "_date_added": date.strftime("%Y-%m-%dT%H:%M:%S"),
+        "_last_edited_date": date.strftime("%Y-%m-%dT%H:%M:%S"),
+        "_raw_source": _weighted(rng, SOURCES)[0],
+        "_algorithm": _weighted(rng, ALGORITHMS)[0],
+        "id": node_id,
+    }
+
+
+def _article_text(rng, company, mentions):
+    """
+    Build article text with paragraphs mentioning the company and related entities.
+    """
+    paragraphs = [f"{company} in the News"]
+    for entity, edge_type in mentions:
+        if edge_type in NEGATIVE_EDGE_TYPES:
+            pool = NEGATIVE_PHRASES
+        elif edge_type in POSITIVE_EDGE_TYPES:
+            pool = POSITIVE_PHRASES
+        else:
+            pool = NEUTRAL_PHRASES
+        sentences = [
+            f"{company} {rng.choice(pool)}.",
+            f"According to {entity}, the developments are significant for the region.",
+            f"Observers noted that {company} and {entity} have a long history of cooperation.",
+            "The fishing industry in Oceanus continues to evolve.",
+        ]
+        rng.shuffle(sentences)
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def generate(scale=1, seed=42, articles_per_company=1.5):
+    """
+    Generate synthetic graph data and articles.
+
+    Parameters:
+        scale (float): Size multiple of the original sample.
+        seed (int): Random seed, so runs at the same scale are reproducible.
+        articles_per_company (float): Average number of article groups per company.
+
+    Returns:
+        Tuple[dict, dict]: The node-link graph data and a mapping of article id to article text.
+    """
+    rng = random.Random(seed)
+    start_date = datetime(2035, 2, 1)
+    used_names = set()
+
+    n_companies = max(1, int(BASE_COMPANIES * scale))
+    n_others = max(1, int(BASE_OTHER_NODES * scale))
+
+    companies = [_unique_name(rng, used_names, lambda: _company_name(rng)) for _ in range(n_companies)]
+    others = [
+        _unique_name(rng, used_names, lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}")
+        for _ in range(n_others)
+    ]
+
+    nodes = [_node(name, _weighted(rng, COMPANY_TYPES)[0], rng, start_date) for name in companies]
+    nodes += [_node(name, _weighted(rng, OTHER_NODE_TYPES)[0], rng, start_date) for name in others]
+
+    links = []
+    articles = {}
+    for company in companies:
+        article_ids = []
+        for i in range(max(1, int(rng.expovariate(1 / articles_per_company)))):
+            for j in range(rng.randint(1, 2)):
+                for source in _weighted(rng, SOURCES, k=rng.randint(1, 3)):
+                    article_id = f"{company}__{i}__{j}__{source}"
+                    if article_id not in articles:
+                        articles[article_id] = []
+                        article_ids.append((article_id, source))
+
+        n_links = max(1, int(rng.gauss(BASE_LINKS_PER_COMPANY, BASE_LINKS_PER_COMPANY / 3)))
+        for key in range(n_links):
+            edge_type = _weighted(rng, EDGE_TYPES)[0]
+            other = rng.choice(others if rng.random() < 0.7 else companies)
+            if other == company:
+                continue
+            source_node, target_node = (other, company) if rng.random() < 0.6 else (company, other)
+            article_id, raw_source = rng.choice(article_ids)
+            date = start_date + timedelta(days=rng.randint(0, 180), seconds=rng.randint(0, 86399))
+            links.append(
+                {
+                    "type": edge_type,
+                    "_last_edited_by": _weighted(rng, ANNOTATORS)[0],
+                    "_date_added": date.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "_last_edited_date": date.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "_raw_source": raw_source,
+                    "_algorithm": _weighted(rng, ALGORITHMS)[0],
+                    "source": source_node,
+                    "target": target_node,
+                    "key": key,
+                    "_articleid": article_id,
+                }
+            )
+            articles[article_id].append((other, edge_type))
+
+    article_texts = {
+        article_id: _article_text(rng, article_id.split("__")[0], mentions) for article_id, mentions in articles.items()
+    }
+    data = {"directed": True, "multigraph": True, "graph": {}, "nodes": nodes, "links": links}
+    return data, article_texts
+
+
+def write_dataset(output_dir, scale=1, seed=42):
+    """
+    Generate a dataset and write it as `<output_dir>/mc1.json` and `<output_dir>/articles/*.txt`.
+
+    Parameters:
+        output_dir (str): Directory to write into.
+        scale (float): Size multiple of the original sample.
+        seed (int): Random seed.
+
+    Returns:
+        Tuple[str, str]: Paths of the written mc1.json and articles directory.
+    """
+    data, articles = generate(scale=scale, seed=seed)
+    articles_dir = os.path.join(output_dir, "articles")
+    os.makedirs(articles_dir, exist_ok=True)
+
+    data_path = os.path.join(output_dir, "mc1.json")
+    with open(data_path, "w") as f:
+        json.dump(data, f)
+
+    for article_id, text in articles.items():
+        with open(os.path.join(articles_dir, f"{article_id}.txt"), "w") as f:
+            f.write(text)
+
+    return data_path, articles_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic mc1.json dataset with articles.")
+    parser.add_argument("--scale", type=float, default=1, help="Size multiple of the original sample (e.g. 10, 100)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default="bench_data/scale_1")
+    args = parser.parse_args()
+
+    data_path, articles_dir = write_dataset(args.output_dir, scale=args.scale, seed=args.seed)
+    print(f"Wrote {data_path} and {articles_dir}")
@@ -1,7 +1,19 @@
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 from widgets.layout import *
 from widgets.sentiment_comparison_bar import *
-from dash import Output, Input, callback_context, no_update
+from dash import Output, Input, State, callback_context, no_update
+from utils.metrics import timed_callback
+from utils.profiler import profiled, tag
+from utils.jobs import JobCancelled
+from callbacks.panels import (
+    annotator_rows,
+    aspect_sentiments,
+    divergence_rows,
+    heatmap_values,
+    horizontal_bar_figure,
+    phrase_sentiments,
+    stream_graph_figure,
+)
 
 
 def register_callbacks(app):
@@ -15,14 +27,46 @@ def register_callbacks(app):
     Callbacks Registered:
     ---------------------
     1. update_graph:
-            Updates the network graph visualization based on selected edge types and clicked node.
+            Updates the network graph visualization based on selected edge types and clicked node,
+            showing either the whole graph or the k-hop neighbourhood of the clicked node.
 
     2. update_heatmap:
-            Updates the sentiment heatmap based on the node selected in the graph.
+            Updates the sentiment heatmap based on the node selected in the graph or the row
+            clicked in the most suspicious cells table, and the chosen time resolution (day, week,
+            month, quarter) and date range, looked up in the heatmap's sentiment rollup. When the
+            sources and periods match the heatmap on screen, only the cell values and title are
+            sent as a partial update.
 
-    3. update_all_outputs:
-            Updates the word cloud, horizontal bar chart, stream graph, and sentiment comparison
-            when a heatmap cell is clicked. Falls back to placeholder messages when only the graph is clicked.
+    3. update_selection:
+            Resolves the company, period (stored as "month", of the heatmap's resolution), source,
+            article list and triplet sentiment score of a graph, heatmap or divergence table click
+            once, and stores them in the "selection" store. A table row selects its cell like a
+            heatmap click; an annotator × company row of the annotator agreement table selects its
+            company like a graph click.
+
+    4. update_horizontal_bar, update_stream_graph, update_algorithm_facts, update_wordcloud, update_sentiment:
+            Each re-render one panel from the "selection" store, independently of the others, so
+            the fast bar and PCP charts appear without waiting for the NLP panels. The word cloud
+            and sentiment comparison fall back to placeholder messages when only the graph is clicked.
+            Their NLP results are memoized in `panel_cache` per (dataset version, company, month,
+            source, model version). On a miss the run goes through `nlp_jobs`: identical concurrent
+            requests share one run, and a run superseded by a newer click from the same session is
+            cancelled and not displayed. The heatmap, bar and PCP figures are memoized in `figure_cache`.
+            The computations live in `callbacks.panels`, shared with the background cache warmer.
+            The BassLine vs ShadGPT facts are looked up in the bar chart's agreement index directly.
+
+    5. update_divergence_table:
+            Fills the most suspicious cells table with the CatchNet vs article sentiment gap of
+            every cell at the heatmap's time resolution, computed for all companies at once.
+
+    6. update_annotator_table:
+            Fills the annotator agreement table with the annotators, or (annotator, company) pairs,
+            whose edge type distribution diverges most from the other annotators', computed for
+            all annotators and companies at once.
+
+    7. update_edge_type_options:
+            Adds edge types that arrived through the dataset watcher to the edge type dropdown,
+            checked every watcher interval.
 
     Parameters:
     -----------
@@ -34,8 +78,30 @@ def register_callbacks(app):
     None
     """
 
-    @app.callback(Output("graph", "figure"), Input("dropdown", "value"), Input("graph", "clickData"))
-    def update_graph(selected_edge_types, clicked_node_id):
+    # Give each browser tab a random session id once, without a server round trip
+    app.clientside_callback(
+        """
+        function(id, current) {
+            if (current) { return current; }
+            if (window.crypto && window.crypto.randomUUID) { return window.crypto.randomUUID(); }
+            return Date.now().toString(36) + Math.random().toString(36).slice(2);
+        }
+        """,
+        Output("session-id", "data"),
+        Input("session-id", "id"),
+        State("session-id", "data"),
+    )
+
+    @app.callback(
+        Output("graph", "figure"),
+        Input("dropdown", "value"),
+        Input("graph", "clickData"),
+        Input("graph-view", "value"),
+        Input("ego-hops", "value"),
+    )
+    @profiled("update_graph")
+    @timed_callback("update_graph")
+    def update_graph(selected_edge_types, clicked_node_id, view, hops):
         if not selected_edge_types:
             selected_edge_types = knowledge_graph.edge_types_available
 
@@ -45,58 +111,214 @@ def register_callbacks(app):
         else:
             text = "Namorna Transit Ltd"
 
-        return knowledge_graph.generate_figure(selected_edge_types, highlight_node_id=text)
+        tag(company=text, edge_types=selected_edge_types, view=view)
+        ego_hops = hops if view == "ego" else None
+        return knowledge_graph.generate_figure(selected_edge_types, highlight_node_id=text, ego_hops=ego_hops)
 
-    @app.callback(Output("heatmap", "figure"), Input("graph", "clickData"), prevent_initial_call=True)
-    def update_heatmap(clickData):
-        company_name = clickData["points"][0]["text"]
-        company_name = company_name.split("Node: ")[1].split("<br>")[0]
-        return heatmap.generate_figure(company_name, clickData)
+    @app.callback(
+        Output("heatmap", "figure"),
+        Output("heatmap-axes", "data"),
+        Output("heatmap-company", "data"),
+        Input("graph", "clickData"),
+        Input("divergence-table", "active_cell"),
+        Input("heatmap-resolution", "value"),
+        Input("heatmap-range", "start_date"),
+        Input("heatmap-range", "end_date"),
+        State("divergence-table", "data"),
+        State("heatmap-axes", "data"),
+        State("heatmap-company", "data"),
+        prevent_initial_call=True,
+    )
+    @profiled("update_heatmap")
+    @timed_callback("update_heatmap")
+    def update_heatmap(
+        clickData, active_cell, resolution, start_date, end_date, table_rows, shown_axes, shown_company
+    ):
+        triggered = callback_context.triggered[0]["prop_id"].split(".")[0]
+        if triggered == "graph" and clickData is not None:
+            company_name = clickData["points"][0]["text"]
+            company_name = company_name.split("Node: ")[1].split("<br>")[0]
+        elif triggered == "divergence-table" and active_cell is not None:
+            company_name = table_rows[active_cell["row_id"]]["company"]
+        else:
+            company_name = shown_company or "Namorna Transit Ltd"
+        tag(company=company_name, resolution=resolution)
+        heatmap.company_name = company_name
+        values = heatmap_values(company_name, resolution, start_date, end_date)
+        if values is None:
+            return heatmap.figure_from_values(None), None, company_name
+
+        # Same sources and periods as the figure on screen: only swap the cell values and title
+        axes = [list(labels) for labels in values["axes"]]
+        if axes == shown_axes:
+            return heatmap.patch_from_values(values), no_update, company_name
+        return heatmap.figure_from_values(values), axes, company_name
 
     @app.callback(
-        [
-            Output("wordcloud-container", "children"),
-            Output("horizontalbar", "figure"),
-            Output("stream_graph", "figure"),
-            Output("sentiment-container", "children"),
-        ],
-        [Input("heatmap", "clickData"), Input("graph", "clickData")],
+        Output("selection", "data"),
+        Input("heatmap", "clickData"),
+        Input("graph", "clickData"),
+        Input("divergence-table", "active_cell"),
+        Input("annotator-table", "active_cell"),
+        State("divergence-table", "data"),
+        State("annotator-table", "data"),
+        State("heatmap-resolution", "value"),
+        State("heatmap-company", "data"),
         prevent_initial_call=True,
     )
-    def update_all_outputs(heatmap_click, graph_click):
+    @profiled("update_selection")
+    @timed_callback("update_selection")
+    def update_selection(
+        heatmap_click, graph_click, active_cell, annotator_cell, table_rows, annotator_rows, resolution, shown_company
+    ):
         triggered = callback_context.triggered[0]["prop_id"].split(".")[0]
 
         if triggered == "graph":
             company_name = graph_click["points"][0]["text"].split("Node: ")[1].split("<br>")[0]
-            horizontal_bar._prepare_plot_df(company_name, None)
-            stream_graph._prepare_plot_df(company_name, None)
-            return (
-                wordcloud.render_placeholder(),
-                horizontal_bar.generate_figure(),
-                stream_graph.generate_figure(),
-                sentiment_bar.render_placeholder(),
-            )
+            tag(company=company_name)
+            return {"trigger": "graph", "company": company_name}
 
         if triggered == "heatmap" and heatmap_click is not None:
             point = heatmap_click["points"][0]
             month = point["x"]
             source = point["y"]
-            source, month = heatmap.map_abbr_to_full(source, month)  # Pass abbreviation to full source and month
-            # Get company name from last clicked node on graph
-            if graph_click is not None:
-                company_name = graph_click["points"][0]["text"].split("Node: ")[1].split("<br>")[0]
-            else:
-                company_name = "Namorna Transit Ltd"  # fallback
-
-            articles = heatmap.get_articles(month, source)
-            horizontal_bar._prepare_plot_df(company_name, heatmap_filter=(month, source))
-            stream_graph._prepare_plot_df(company_name, heatmap_filter=(month, source))
-
-            return (
-                wordcloud.render_wordcloud(articles, company_name, month, source),
-                horizontal_bar.generate_figure(month, source),
-                stream_graph.generate_figure(month, source),
-                sentiment_bar.render(heatmap.get_sentiment_score(heatmap_click), articles, company_name, month, source),
-            )
-
-        return no_update, no_update, no_update, no_update
+            # Pass abbreviations to full source and period string
+            source, month = heatmap.map_abbr_to_full(source, month, resolution)
+            # The company shown in the heatmap: last clicked in the graph or the divergence table
+            company_name = shown_company or "Namorna Transit Ltd"
+            tag(company=company_name, month=month, source=source)
+
+            return {
+                "trigger": "heatmap",
+                "company": company_name,
+                "month": month,
+                "source": source,
+                "articles": heatmap.get_articles(month, source, company_name=company_name),
+                "triplet_score": heatmap.get_sentiment_score(
+                    heatmap_click, company_name=company_name, resolution=resolution
+                ),
+            }
+
+        if triggered == "divergence-table" and active_cell is not None:
+            row = table_rows[active_cell["row_id"]]
+            company_name, month, source = row["company"], row["period"], row["source"]
+            tag(company=company_name, month=month, source=source)
+            return {
+                "trigger": "heatmap",
+                "company": company_name,
+                "month": month,
+                "source": source,
+                "articles": heatmap.get_articles(month, source, company_name=company_name),
+                "triplet_score": row["catchnet"],
+            }
+
+        if triggered == "annotator-table" and annotator_cell is not None:
+            company_name = annotator_rows[annotator_cell["row_id"]].get("company")
+            if company_name is None:
+                return no_update
+            tag(company=company_name)
+            return {"trigger": "graph", "company": company_name}
+
+        return no_update
+
+    @app.callback(Output("divergence-table", "data"), Input("heatmap-resolution", "value"))
+    @profiled("update_divergence_table")
+    @timed_callback("update_divergence_table")
+    def update_divergence_table(resolution):
+        tag(resolution=resolution)
+        return divergence_rows(resolution)
+
+    @app.callback(
+        Output("annotator-table", "data"),
+        Output("annotator-table", "hidden_columns"),
+        Output("annotator-table", "active_cell"),
+        Input("annotator-table-level", "value"),
+    )
+    @profiled("update_annotator_table")
+    @timed_callback("update_annotator_table")
+    def update_annotator_table(level):
+        tag(level=level)
+        return annotator_rows(level), annotator_table.HIDDEN_COLUMNS[level], None
+
+    @app.callback(
+        Output("dropdown", "options"),
+        Input("edge-type-refresh", "n_intervals"),
+        State("dropdown", "options"),
+        prevent_initial_call=True,
+    )
+    @timed_callback("update_edge_type_options")
+    def update_edge_type_options(_, options):
+        edge_types = knowledge_graph.edge_types_available
+        return no_update if options == edge_types else edge_types
+
+    @app.callback(Output("horizontalbar", "figure"), Input("selection", "data"), prevent_initial_call=True)
+    @profiled("update_horizontal_bar")
+    @timed_callback("update_horizontal_bar")
+    def update_horizontal_bar(selection):
+        tag(company=selection["company"], month=selection.get("month"), source=selection.get("source"))
+        return horizontal_bar_figure(selection["company"], selection.get("month"), selection.get("source"))
+
+    @app.callback(Output("stream_graph", "figure"), Input("selection", "data"), prevent_initial_call=True)
+    @profiled("update_stream_graph")
+    @timed_callback("update_stream_graph")
+    def update_stream_graph(selection):
+        tag(company=selection["company"], month=selection.get("month"), source=selection.get("source"))
+        return stream_graph_figure(selection["company"], selection.get("month"), selection.get("source"))
+
+    @app.callback(
+        Output("algorithm-facts-container", "children"), Input("selection", "data"), prevent_initial_call=True
+    )
+    @profiled("update_algorithm_facts")
+    @timed_callback("update_algorithm_facts")
+    def update_algorithm_facts(selection):
+        tag(company=selection["company"], month=selection.get("month"), source=selection.get("source"))
+        return algorithm_panel.render(selection["company"], selection.get("month"), selection.get("source"))
+
+    @app.callback(
+        Output("wordcloud-container", "children"),
+        Input("selection", "data"),
+        State("session-id", "data"),
+        prevent_initial_call=True,
+    )
+    @profiled("update_wordcloud")
+    @timed_callback("update_wordcloud")
+    def update_wordcloud(selection, session_id):
+        if selection["trigger"] == "graph":
+            nlp_jobs.abandon(session_id, "wordcloud")
+            return wordcloud.render_placeholder()
+
+        company, month, source = selection["company"], selection["month"], selection["source"]
+        tag(company=company, month=month, source=source)
+        try:
+            phrases_with_sentiment = phrase_sentiments(company, month, source, selection["articles"], session_id)
+        except JobCancelled:
+            return no_update
+        return wordcloud.render_phrases(phrases_with_sentiment, company, month, source)
+
+    @app.callback(
+        Output("sentiment-container", "children"),
+        Input("selection", "data"),
+        State("session-id", "data"),
+        prevent_initial_call=True,
+    )
+    @profiled("update_sentiment")
+    @timed_callback("update_sentiment")
+    def update_sentiment(selection, session_id):
+        if selection["trigger"] == "graph":
+            nlp_jobs.abandon(session_id, "sentiment")
+            return sentiment_bar.render_placeholder()
+
+        company, month, source = selection["company"], selection["month"], selection["source"]
+        tag(company=company, month=month, source=source)
+        try:
+            sentiment_scores = aspect_sentiments(company, month, source, selection["articles"], session_id)
+        except JobCancelled:
+            return no_update
+        return sentiment_bar.render(
+            selection["triplet_score"],
+            selection["articles"],
+            company,
+            month,
+            source,
+            sentiment_scores=sentiment_scores,
+        )
@@ -0,0 +1,328 @@
+"""
+Cached panel computations shared by the Dash callbacks and the background cache warmer,
+and the handlers that apply live dataset deltas and invalidate the affected cache entries.
+
+Every computation here uses only explicit arguments and the non-mutating widget APIs, so it
+can be called from background threads without disturbing what an analyst is looking at.
+"""
+
+import pandas as pd
+
+from processing.rollups import DEFAULT_RESOLUTION, period_mask
+from widgets.layout import (
+    annotator_table,
+    corpus_index,
+    data_version,
+    divergence_table,
+    figure_cache,
+    heatmap,
+    horizontal_bar,
+    knowledge_graph,
+    nlp_jobs,
+    panel_cache,
+    sentiment_bar,
+    sentiment_index,
+    stream_graph,
+    wordcloud,
+)
+
+
+def heatmap_values(company, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+    """
+    Heatmap cell values, axis labels and title for a company at a time resolution and range
+    (see Heatmap.cell_values).
+    """
+    return figure_cache.get_or_compute(
+        ("heatmap", data_version, company, resolution, start, end),
+        lambda: heatmap.cell_values(company, resolution, start, end),
+    )
+
+
+def heatmap_figure(company, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+    """
+    Heatmap figure for a company, filled into the cached figure skeleton of its axes.
+    """
+    return heatmap.figure_from_values(heatmap_values(company, resolution, start, end))
+
+
+def divergence_rows(resolution=DEFAULT_RESOLUTION):
+    """
+    Rows of the most suspicious cells table at a time resolution (see DivergenceTable.compute_rows).
+
+    Cached until the data changes or the sentiment index grows.
+    """
+    return figure_cache.get_or_compute(
+        ("divergence", data_version, resolution, len(sentiment_index)),
+        lambda: divergence_table.compute_rows(resolution),
+    )
+
+
+def annotator_rows(level="annotator"):
+    """
+    Rows of the annotator agreement table at a level (see AnnotatorAgreementTable.compute_rows).
+
+    The statistics of all annotators and companies are computed once and shared by both levels,
+    cached until the links change.
+    """
+    agreement = figure_cache.get_or_compute(("annotator_agreement", data_version), annotator_table.compute)
+    return figure_cache.get_or_compute(
+        ("annotator_rows", data_version, level), lambda: annotator_table.compute_rows(agreement, level)
+    )
+
+
+def horizontal_bar_figure(company, month=None, source=None):
+    """
+    Edge type bar chart for a company, optionally restricted to one heatmap cell.
+    """
+
+    def compute():
+        heatmap_filter = (month, source) if month else None
+        df_plot = horizontal_bar._prepare_plot_df(company, heatmap_filter=heatmap_filter)
+        return horizontal_bar.generate_figure(month or "", source or "", df_plot=df_plot)
+
+    return figure_cache.get_or_compute(("horizontal_bar", data_version, company, month, source), compute)
+
+
+def stream_graph_figure(company, month=None, source=None):
+    """
+    Annotator PCP for a company, optionally restricted to one heatmap cell.
+    """
+
+    def compute():
+        heatmap_filter = (month, source) if month else None
+        df_plot = stream_graph._prepare_plot_df(company, heatmap_filter=heatmap_filter)
+        return stream_graph.generate_figure(month or "", source or "", df_plot=df_plot)
+
+    return figure_cache.get_or_compute(("stream_graph", data_version, company, month, source), compute)
+
+
+def phrase_sentiments(company, month, source, articles, session_id):
+    """
+    Word cloud phrases with their sentiment for a heatmap cell.
+
+    Raises:
+        JobCancelled: If a newer request from the same session superseded this one.
+    """
+    cache_key = ("wordcloud", data_version, company, month, source, wordcloud.model_version)
+    hit, phrases_with_sentiment = panel_cache.get(cache_key)
+    if hit:
+        nlp_jobs.abandon(session_id, "wordcloud")
+        return phrases_with_sentiment
+
+    phrases_with_sentiment = nlp_jobs.run(
+        "wordcloud",
+        (company, month, source),
+        session_id,
+        lambda token: wordcloud.compute_phrase_sentiments(articles, company, cancel_token=token),
+    )
+    panel_cache.set(cache_key, phrases_with_sentiment)
+    return phrases_with_sentiment
+
+
+def aspect_sentiments(company, month, source, articles, session_id):
+    """
+    Per-article aspect sentiment scores for a heatmap cell.
+
+    Raises:
+        JobCancelled: If a newer request from the same session superseded this one.
+    """
+    cache_key = ("sentiment", data_version, company, month, source, sentiment_bar.model_version)
+    hit, sentiment_scores = panel_cache.get(cache_key)
+    if hit:
+        nlp_jobs.abandon(session_id, "sentiment")
+        return sentiment_scores
+
+    sentiment_scores = nlp_jobs.run(
+        "sentiment",
+        (company, month, source),
+        session_id,
+        lambda token: sentiment_bar.classify_aspect_sentiment(list(articles), company, cancel_token=token),
+    )
+    panel_cache.set(cache_key, sentiment_scores)
+    return sentiment_scores
+
+
+def busiest_companies(top_n):
+    """
+    Companies ranked by the number of links attributed to them in the heatmap's link table.
+
+    Parameters:
+        top_n (int): Number of companies to return.
+
+    Returns:
+        List[str]: Company names, busiest first.
+    """
+    return heatmap.df_links["company"].value_counts().head(top_n).index.tolist()
+
+
+def non_empty_cells(company):
+    """
+    (month, source) cells of a company's default (monthly) heatmap that contain at least one link.
+    """
+    df = heatmap.df_links[heatmap.df_links["company"] == company].dropna(subset=["month", "_raw_source"])
+    return sorted({(str(month), str(source)) for month, source in zip(df["month"], df["_raw_source"])})
+
+
+def _cells_of(df, company_column):
+    """
+    Set of (company, day, source) for link rows, with day as "YYYY-MM-DD".
+    """
+    days = pd.to_datetime(df["_date_added"], errors="coerce").dt.strftime("%Y-%m-%d")
+    return {
+        (company, day, source)
+        for company, day, source in zip(df[company_column], days, df["_raw_source"])
+        if isinstance(day, str)
+    }
+
+
+def _cell_matcher(cells):
+    """
+    Test whether a (company, period, source) cell of any resolution contains one of some
+    (company, day, source) cells.
+    """
+    days = {}
+    for company, day, source in cells:
+        days.setdefault((company, source), set()).add(day)
+    days = {key: pd.Series(pd.to_datetime(sorted(values))) for key, values in days.items()}
+
+    def matches(company, period, source):
+        cell_days = days.get((company, source))
+        return cell_days is not None and isinstance(period, str) and bool(period_mask(cell_days, period).any())
+
+    return matches
+
+
+def invalidate_cells(companies, figure_cells, panel_cells, all_figures=False, all_heatmaps=False):
+    """
+    Drop cached results that depend on some companies and heatmap cells.
+
+    Parameters:
+        companies (set): Companies whose heatmap and company-level bar and PCP figures changed.
+        figure_cells (set): (company, day, source) cells whose bar and PCP figures changed.
+        panel_cells (set): (company, day, source) cells whose NLP panels changed.
+        all_figures (bool): Drop every bar and PCP figure, e.g. when a new edge type adds a bar.
+        all_heatmaps (bool): Drop every company's heatmap, e.g. when the data's time range changes,
+            since every heatmap's period columns span it.
+
+    Returns:
+        int: Number of entries removed.
+    """
+
+    figure_cell_affected = _cell_matcher(figure_cells)
+    panel_cell_affected = _cell_matcher(panel_cells)
+
+    def figure_affected(key):
+        kind = key[0]
+        if kind == "divergence":
+            return bool(companies or figure_cells or panel_cells)
+        if kind in ("annotator_agreement", "annotator_rows"):
+            return bool(companies or figure_cells or all_figures)
+        company = key[2]
+        if kind == "heatmap":
+            return all_heatmaps or company in companies
+        period, source = key[3], key[4]
+        return all_figures or (company in companies and period is None) or figure_cell_affected(company, period, source)
+
+    removed = figure_cache.invalidate(figure_affected)
+    removed += panel_cache.invalidate(lambda key: panel_cell_affected(key[2], key[3], key[4]))
+    return removed
+
+
+def apply_link_delta(new_nodes, new_links):
+    """
+    Apply links appended to the dataset to every widget and invalidate only the affected cached results.
+
+    The heatmap and NLP panels attribute each link to one company; the bar chart and PCP
+    select links by either endpoint, so both endpoints' figures are invalidated. Links that
+    extend the data's time range change every heatmap's period columns and labels, so then
+    all heatmaps are invalidated.
+
+    The delta is applied to all widgets or to none: if one widget fails, the ones already
+    updated are rolled back and the error is raised, so the dataset watcher retries it.
+
+    Parameters:
+        new_nodes (pd.DataFrame): Appended node rows.
+        new_links (pd.DataFrame): Appended link rows.
+    """
+    widgets = (knowledge_graph, corpus_index, horizontal_bar, stream_graph, heatmap)
+    saved = [vars(widget).copy() for widget in widgets]
+    time_range = heatmap.time_range()
+    try:
+        knowledge_graph.add_links(new_links, new_nodes)
+        corpus_index.catalog = corpus_index.catalog.with_links(new_links)
+        new_bar_types = horizontal_bar.add_links(new_links, new_nodes)
+        new_pcp_types = stream_graph.add_links(new_links, new_nodes)
+        attributed = heatmap.add_links(new_links, new_nodes)
+    except Exception:
+        # The widgets replace their attributes rather than modifying them, so the old references are the old state
+        for widget, state in zip(widgets, saved):
+            vars(widget).update(state)
+        raise
+
+    heatmap_cells = _cells_of(attributed, "company") if len(attributed) else set()
+    endpoint_cells = _cells_of(new_links, "source") | _cells_of(new_links, "target") if len(new_links) else set()
+    companies = {cell[0] for cell in heatmap_cells | endpoint_cells}
+    removed = invalidate_cells(
+        companies,
+        endpoint_cells,
+        heatmap_cells,
+        all_figures=new_bar_types or new_pcp_types,
+        all_heatmaps=heatmap.time_range() != time_range,
+    )
+    print(f"Applied {len(new_links)} new links for {len(companies)} companies, invalidated {removed} cache entries")
+
+
+def apply_article_delta(changed, removed):
+    """
+    Re-index added, rewritten or removed article files and invalidate the NLP panels of the cells that cite them.
+
+    Parameters:
+        changed (List[str]): Ids of added or rewritten articles.
+        removed (List[str]): Ids of deleted articles.
+    """
+    corpus_index.catalog = corpus_index.catalog.with_articles(changed, removed)
+    for article_id in changed:
+        if article_id in corpus_index.catalog:
+            corpus_index.add_article(article_id, corpus_index.catalog.read(article_id))
+    for article_id in removed:
+        corpus_index.remove_article(article_id)
+
+    links = heatmap.df_links
+    affected = links[links["_articleid"].isin(set(changed) | set(removed))]
+    cells = _cells_of(affected, "company")
+    count = invalidate_cells(set(), set(), cells)
+    print(f"Re-indexed {len(changed)} changed and {len(removed)} removed articles, invalidated {count} cache entries")
+
+
+# Session id the warmer uses in nlp_jobs; an analyst opening the same cell joins the running warmup job
+WARMUP_SESSION = "cache-warmer"
+
+
+def warmup_tasks(top_n):
+    """
+    Tasks for the CacheWarmer, cheapest first: all figures of the busiest companies, then their NLP panels.
+
+    Parameters:
+        top_n (int): Number of companies to warm.
+
+    Yields:
+        Tuple[str, Callable[[], Any]]: (description, task) pairs.
+    """
+    companies = busiest_companies(top_n)
+    for company in companies:
+        yield f"heatmap {company}", lambda company=company: heatmap_figure(company)
+        yield f"bar {company}", lambda company=company: horizontal_bar_figure(company)
+        yield f"pcp {company}", lambda company=company: stream_graph_figure(company)
+        for month, source in non_empty_cells(company):
+            yield f"bar {company} {month} {source}", lambda c=company, m=month, s=source: horizontal_bar_figure(c, m, s)
+            yield f"pcp {company} {month} {source}", lambda c=company, m=month, s=source: stream_graph_figure(c, m, s)
+
+    for company in companies:
+        for month, source in non_empty_cells(company):
+            articles = heatmap.get_articles(month, source, company_name=company)
+            yield f"wordcloud {company} {month} {source}", (
+                lambda c=company, m=month, s=source, a=articles: phrase_sentiments(c, m, s, a, WARMUP_SESSION)
+            )
+            yield f"sentiment {company} {month} {source}", (
+                lambda c=company, m=month, s=source, a=articles: aspect_sentiments(c, m, s, a, WARMUP_SESSION)
+            )
@@ -0,0 +1,404 @@
+"""
+Headless export of a static bias report per company.
+
+Each report holds the sentiment heatmap, the edge type bars by algorithm, the annotator PCP
+and, unless --no-nlp is given, the key phrases and the article vs CatchNet sentiment per
+source. The figures come from the same widget builders as the Dash app. Reports are
+rendered in a process pool and written as <slug>.html and <slug>.json next to an index
+page. A report's JSON is written last, so a rerun skips every company whose JSON matches
+the current data and options, and resumes an interrupted export.
+
+Usage:
+    python export_reports.py --output reports --workers 8
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.utils import PlotlyJSONEncoder
+
+from processing.article_catalog import ArticleCatalog
+from processing.corpus_index import CorpusIndex
+from processing.ingest import load_graph_tables
+from processing.rollups import DEFAULT_RESOLUTION, RESOLUTIONS
+from processing.snapshot import load_snapshot, snapshot_path
+from utils.metrics import stage
+from utils.result_cache import dataset_version
+from widgets.heatmap import Heatmap
+from widgets.horizontal_bar import HorizontalBarPlot
+from widgets.pcp import PCP
+
+# Bump when the report contents change, so resumed exports redo older reports
+REPORT_FORMAT = 1
+
+# Section headings of the report figures; the sentiment figures, one per source, are named "sentiment <source>"
+FIGURE_TITLES = {
+    "heatmap": "Sentiment over time",
+    "edge_types": "Edge types by algorithm",
+    "annotators": "Edge types by annotator",
+}
+
+# Widgets and indexes a worker needs, built once in the parent and handed to every worker
+_state = {}
+
+
+def report_slug(company):
+    """
+    File name stem of a company's report: a readable prefix and a short hash of the full name.
+    """
+    prefix = re.sub(r"[^A-Za-z0-9]+", "-", company).strip("-")[:60] or "company"
+    return f"{prefix}-{hashlib.sha1(company.encode()).hexdigest()[:8]}"
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_state(data_path, articles_dir, nlp):
+    """
+    Widgets and indexes the reports are built from, restored from the app's derived-state
+    snapshot when it matches the data and code, and built from mc1.json otherwise.
+    """
+    data_version = dataset_version(data_path, articles_dir)
+    state = load_snapshot(snapshot_path(), data_version) or {}
+    state = {key: state[key] for key in ("heatmap", "horizontal_bar", "stream_graph", "corpus_index") if key in state}
+    if "heatmap" not in state:
+        tables = load_graph_tables(data_path)
+        state = {
+            "heatmap": Heatmap(data=None, html_id="heatmap", tables=tables),
+            "horizontal_bar": HorizontalBarPlot(data=None, html_id="horizontalbar", tables=tables),
+            "stream_graph": PCP(data=None, html_id="stream_graph", tables=tables),
+        }
+        if nlp:
+            catalog = ArticleCatalog.from_directory(articles_dir, tables.links)
+            state["corpus_index"] = CorpusIndex(entities=tables.nodes["id"].tolist(), catalog=catalog)
+    if not nlp:
+        state.pop("corpus_index", None)
+    state["data_version"] = data_version
+    return state
+
+
+def _init_worker(state, threads_per_worker):
+    """
+    Pool initializer: keep the shared state and load the NLP widgets once per worker.
+
+    The models run in the worker, or in the shared inference server if BIAS_HUNTER_INFERENCE_SOCKET is set.
+    The worker's sentence sentiment index is never saved: every save replaces the whole file, so
+    workers would drop each other's entries. New entries go back to the parent with each report.
+    """
+    _state.update(state)
+    if "corpus_index" not in state:
+        return
+
+    import torch
+
+    from processing.inference import ABSA_MODEL, inference_backend
+    from processing.sentiment_index import SentimentIndex
+    from widgets.sentiment_comparison_bar import DivergingSentimentPlot
+    from widgets.wordcloud import WordCloudWidget
+
+    torch.set_num_threads(threads_per_worker)
+    corpus_index = state["corpus_index"]
+    inference = inference_backend()
+    _state["wordcloud"] = WordCloudWidget([], id="wordcloud", corpus_index=corpus_index, inference=inference)
+    _state["sentiment_bar"] = DivergingSentimentPlot(
+        "sentiment-bar",
+        corpus_index=corpus_index,
+        inference=inference,
+        sentiment_index=SentimentIndex(corpus_index, ABSA_MODEL, autosave=False),
+    )
+
+
+def build_report(company, resolution=DEFAULT_RESOLUTION):
+    """
+    Build one company's report from the worker's widgets.
+
+    Parameters:
+        company (str): Company name.
+        resolution (str): Time resolution of the heatmap.
+
+    Returns:
+        dict: "figures" (name to plotly Figure), "key_phrases" ((phrase, label, score, color) tuples)
+        and "article_sentiment" (source to CatchNet and per-article scores); the NLP parts are
+        empty without NLP widgets.
+    """
+    heatmap = _state["heatmap"]
+    horizontal_bar = _state["horizontal_bar"]
+    stream_graph = _state["stream_graph"]
+
+    figures = {"heatmap": heatmap.build_figure(company, resolution)}
+    figures["edge_types"] = horizontal_bar.generate_figure(df_plot=horizontal_bar._prepare_plot_df(company))
+    figures["annotators"] = stream_graph.generate_figure(df_plot=stream_graph._prepare_plot_df(company))
+    report = {"figures": figures, "key_phrases": [], "article_sentiment": {}}
+    if "wordcloud" not in _state:
+        return report
+
+    wordcloud = _state["wordcloud"]
+    sentiment_bar = _state["sentiment_bar"]
+    links = heatmap.df_links[heatmap.df_links["company"] == company]
+    articles = sorted(set(links["_articleid"].dropna()))
+    with stage("report_key_phrases"):
+        phrases = wordcloud.compute_phrase_sentiments(articles, company)
+    report["key_phrases"] = [
+        (phrase, label, score, wordcloud.sentiment_color(phrase, score)) for phrase, (label, score) in phrases
+    ]
+
+    first_day, last_day = heatmap.time_range()
+    totals = heatmap.rollup.totals(company)
+    for source, source_links in links.groupby("_raw_source", observed=True):
+        source_articles = sorted(set(source_links["_articleid"].dropna()))
+        catchnet = None if totals is None or source not in totals.index else round(float(totals[source]), 3)
+        with stage("report_article_sentiment"):
+            scores = sentiment_bar.classify_aspect_sentiment(source_articles, company)
+        figures[f"sentiment {source}"] = sentiment_bar.build_figure(
+            catchnet, source_articles, company, f"{first_day} to {last_day}", source, sentiment_scores=scores
+        )
+        report["article_sentiment"][source] = {"catchnet": catchnet, "articles": dict(zip(source_articles, scores))}
+    return report
+
+
+def render_report_html(company, report):
+    """
+    Static HTML page of a report. Plotly is loaded from plotly.min.js next to the page.
+    """
+    sections = [
+        f"<h2>{html.escape(FIGURE_TITLES.get(name, name.replace('sentiment ', 'Article vs CatchNet: ', 1)))}</h2>"
+        + pio.to_html(fig, full_html=False, include_plotlyjs=False, default_height="450px")
+        for name, fig in report["figures"].items()
+    ]
+    if report["key_phrases"]:
+        tags = "".join(
+            f'<span class="phrase" style="background:{color}" title="Sentiment: {score:+.2f}">'
+            f"{html.escape(phrase)}</span>"
+            for phrase, _, score, color in sorted(report["key_phrases"], key=lambda row: -abs(row[2]))
+        )
+        sections.insert(3, f"<h2>Key phrases</h2><div>{tags}</div>")
+    return (
+        "<!DOCTYPE html><html><head><meta charset='utf-8'>"
+        f"<title>Bias report: {html.escape(company)}</title>"
+        "<script src='plotly.min.js'></script>"
+        "<style>body{font-family:Arial,sans-serif;color:#083B6E;margin:24px}"
+        ".phrase{display:inline-block;color:white;font-weight:bold;padding:4px 8px;margin:3px;border-radius:12px}"
+        "</style></head><body>"
+        f"<p><a href='index.html'>All companies</a></p><h1>Bias report: {html.escape(company)}</h1>"
+        + "".join(sections)
+        + "</body></html>"
+    )
+
+
+def export_company(company, output_dir, options):
+    """
+    Build and write one company's report. Runs in a pool worker.
+
+    Returns:
+        Tuple[str, float, str or None, tuple or None]: (company, seconds taken, error message or
+        None, sentence sentiment entries classified since the last report or None), the entries
+        as returned by `SentimentIndex.take_unsaved`.
+    """
+    start = time.perf_counter()
+    try:
+        report = build_report(company, options["resolution"])
+        slug = report_slug(company)
+        _write_atomic(os.path.join(output_dir, f"{slug}.html"), render_report_html(company, report))
+        document = {
+            "company": company,
+            "data_version": _state["data_version"],
+            "options": options,
+            "figures": {name: fig.to_plotly_json() for name, fig in report["figures"].items()},
+            "key_phrases": report["key_phrases"],
+            "article_sentiment": report["article_sentiment"],
+        }
+        # Written last: an existing JSON marks the report as complete
+        _write_atomic(os.path.join(output_dir, f"{slug}.json"), json.dumps(document, cls=PlotlyJSONEncoder))
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    entries = _state["sentiment_bar"].sentiment_index.take_unsaved() if "sentiment_bar" in _state else None
+    return company, time.perf_counter() - start, error, entries
+
+
+def save_sentiment_entries(corpus_index, entries):
+    """
+    Merge the sentence sentiment entries classified by the workers into the index and save them as one shard.
+
+    Parameters:
+        corpus_index (CorpusIndex): Index of the article corpus.
+        entries (List[tuple]): Entries as returned by `SentimentIndex.take_unsaved`.
+    """
+    from processing.inference import ABSA_MODEL
+    from processing.sentiment_index import SentimentIndex
+
+    index = SentimentIndex(corpus_index, ABSA_MODEL, autosave=False)
+    for entities, hashes, probs in entries:
+        index.merge(entities, hashes, probs)
+    index.save()
+
+
+def is_complete(output_dir, company, data_version, options):
+    """
+    Whether a company's report exists and was built from the same data and options.
+    """
+    path = os.path.join(output_dir, f"{report_slug(company)}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return document.get("data_version") == data_version and document.get("options") == options
+
+
+def write_index(output_dir, companies, link_counts, data_version, options, run):
+    """
+    Write index.html and index.json listing every company with a current report.
+    """
+    done = [company for company in companies if is_complete(output_dir, company, data_version, options)]
+    done.sort(key=lambda company: (-link_counts.get(company, 0), company))
+    rows = "".join(
+        f"<tr><td><a href='{report_slug(company)}.html'>{html.escape(company)}</a></td>"
+        f"<td>{link_counts.get(company, 0)}</td></tr>"
+        for company in done
+    )
+    _write_atomic(
+        os.path.join(output_dir, "index.html"),
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Bias reports</title>"
+        "<style>body{font-family:Arial,sans-serif;color:#083B6E;margin:24px}td{padding:2px 12px}</style></head>"
+        f"<body><h1>Bias reports</h1><p>{len(done)} of {len(companies)} companies, "
+        f"dataset {data_version}</p><table><tr><th>Company</th><th>Links</th></tr>{rows}</table></body></html>",
+    )
+    index = {
+        "data_version": data_version,
+        "options": options,
+        "run": run,
+        "reports": {company: f"{report_slug(company)}.json" for company in done},
+    }
+    _write_atomic(os.path.join(output_dir, "index.json"), json.dumps(index, indent=1))
+    return done
+
+
+def export_reports(
+    data_path, articles_dir, output_dir, workers=None, companies=None, nlp=True, resolution=None, force=False
+):
+    """
+    Export the reports of many companies in a process pool, skipping reports that are already complete.
+
+    Parameters:
+        data_path (str): Path of mc1.json.
+        articles_dir (str): Directory containing the article files.
+        output_dir (str): Directory the reports and index are written to.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        companies (List[str], optional): Companies to export. Defaults to `Heatmap.valid_companies`
+            with at least one link.
+        nlp (bool): Include key phrases and article sentiment, which run the NLP models.
+        resolution (str, optional): Heatmap time resolution. Defaults to months.
+        force (bool): Rebuild reports that are already complete.
+
+    Returns:
+        dict: Run statistics: companies, exported, skipped, failed, seconds and reports per second.
+    """
+    workers = workers or os.cpu_count() or 1
+    options = {"format": REPORT_FORMAT, "nlp": nlp, "resolution": resolution or DEFAULT_RESOLUTION}
+    os.makedirs(output_dir, exist_ok=True)
+
+    state = build_state(data_path, articles_dir, nlp)
+    heatmap = state["heatmap"]
+    link_counts = heatmap.df_links["company"].value_counts().to_dict()
+    if companies is None:
+        companies = sorted(company for company in heatmap.valid_companies if company in link_counts)
+    todo = [
+        company
+        for company in companies
+        if force or not is_complete(output_dir, company, state["data_version"], options)
+    ]
+    print(f"{len(companies)} companies, {len(companies) - len(todo)} already exported, {len(todo)} to do")
+
+    plotly_js = os.path.join(output_dir, "plotly.min.js")
+    if not os.path.exists(plotly_js):
+        _write_atomic(plotly_js, get_plotlyjs())
+
+    failed = {}
+    exported = 0
+    sentiment_entries = []
+    start = time.perf_counter()
+    if todo:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(todo)), initializer=_init_worker, initargs=(state, threads_per_worker)
+            ) as executor:
+                futures = [executor.submit(export_company, company, output_dir, options) for company in todo]
+                try:
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        company, seconds, error, entries = future.result()
+                        elapsed = time.perf_counter() - start
+                        if error is None:
+                            exported += 1
+                        else:
+                            failed[company] = error
+                        if entries is not None and len(entries[0]):
+                            sentiment_entries.append(entries)
+                        status = "ok" if error is None else f"failed: {error}"
+                        print(
+                            f"[{done}/{len(todo)}] {company} {status} ({seconds:.1f}s); "
+                            f"{exported / elapsed:.2f} reports/s"
+                        )
+                except KeyboardInterrupt:
+                    print("Interrupted; finished reports are kept, run again to resume")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+        finally:
+            # Only this process writes the sentiment index, once, so no worker's entries are lost
+            if sentiment_entries:
+                save_sentiment_entries(state["corpus_index"], sentiment_entries)
+
+    elapsed = time.perf_counter() - start
+    run = {
+        "companies": len(companies),
+        "exported": exported,
+        "skipped": len(companies) - len(todo),
+        "failed": failed,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "reports_per_second": round(exported / elapsed, 3) if elapsed > 0 else None,
+    }
+    write_index(output_dir, companies, link_counts, state["data_version"], options, run)
+    print(
+        f"Exported {exported} reports ({run['skipped']} skipped, {len(failed)} failed) in {elapsed:.1f}s "
+        f"with {workers} workers: {run['reports_per_second']} reports/s"
+    )
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a static bias report per company.")
+    parser.add_argument("--data", default="data/mc1.json")
+    parser.add_argument("--articles", default="data/articles")
+    parser.add_argument("--output", default="reports", help="Directory to write the reports to")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--company", action="append", dest="companies", help="Only export this company (repeatable)")
+    parser.add_argument("--resolution", choices=list(RESOLUTIONS), default=DEFAULT_RESOLUTION)
+    parser.add_argument("--no-nlp", action="store_true", help="Skip key phrases and article sentiment")
+    parser.add_argument("--force", action="store_true", help="Rebuild reports that are already complete")
+    args = parser.parse_args()
+
+    run = export_reports(
+        args.data,
+        args.articles,
+        args.output,
+        workers=args.workers,
+        companies=args.companies,
+        nlp=not args.no_nlp,
+        resolution=args.resolution,
+        force=args.force,
+    )
+    raise SystemExit(1 if run["failed"] else 0)
@@ -1,7 +1,13 @@
 from dash import Dash
 import dash_bootstrap_components as dbc
 
+from utils.serialization import use_fast_json_engine
+
 # bootstrap theme
 # https://bootswatch.com/lux/
-app = Dash(__name__)
+
+# Responses are gzip-compressed and figures serialized with orjson; NumPy arrays in
+# figures are sent as base64 typed arrays by Plotly
+app = Dash(__name__, compress=True)
+use_fast_json_engine()
 app.title = "Bias Hunter"
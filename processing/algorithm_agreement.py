@@ -0,0 +1,210 @@
+"""
+Link-level agreement between the BassLine and ShadGPT extraction algorithms.
+
+A fact is a (source, target, article) triple. Each fact's edge types from both algorithms are
+joined in one pass: the triples are factorized (hashed) into integer fact codes, and every
+algorithm's edge types are OR-ed into one bitmask per fact. A fact is then agreed (both
+algorithms extracted it with the same edge types), conflicting (both extracted it, with
+different edge types) or extracted by only one algorithm.
+
+Facts are indexed by both endpoints, so the facts about a company are one slice of a sorted
+array and its status counts are precomputed.
+"""
+
+import numpy as np
+import pandas as pd
+
+from processing.rollups import period_mask
+from utils.metrics import stage
+
+ALGORITHMS = ("BassLine", "ShadGPT")
+STATUSES = ["agreed", "conflict", "bassline_only", "shadgpt_only"]
+STATUS_LABELS = {
+    "agreed": "Agreed",
+    "conflict": "Conflicting types",
+    "bassline_only": "BassLine only",
+    "shadgpt_only": "ShadGPT only",
+}
+
+# Edge types are bits of a uint64 mask
+MAX_TYPES = 64
+
+
+def _codes(*columns):
+    """
+    Hash-join key of several columns: one integer code per distinct row.
+    """
+    codes, _ = pd.factorize(columns[0])
+    for column in columns[1:]:
+        column_codes, uniques = pd.factorize(column)
+        codes, _ = pd.factorize(codes.astype(np.int64) * max(len(uniques), 1) + column_codes)
+    return codes
+
+
+class AlgorithmAgreementIndex:
+    """
+    Every fact extracted by BassLine or ShadGPT with its agreement status, indexed by company.
+
+    The index is never modified in place: `with_links` returns an extended copy, so readers
+    in other threads keep a consistent view.
+
+    Attributes:
+        types (List[str]): Edge types, in bit order of the masks.
+        facts (pd.DataFrame): One row per fact with columns source, target, article, news_source
+            (the article's _raw_source), date (first _date_added), bassline and shadgpt (edge type
+            bitmasks, 0 if the algorithm did not extract the fact) and status (one of STATUSES).
+        nodes (pd.Index): Every fact endpoint, in index order.
+        offsets (np.ndarray): Facts of nodes[i] are facts.iloc[order[offsets[i]:offsets[i + 1]]].
+        order (np.ndarray): Fact rows sorted by endpoint.
+        counts (np.ndarray): Number of facts per node (rows) and status (columns, as STATUSES).
+    """
+
+    def __init__(self, facts, types):
+        """
+        Parameters:
+            facts (pd.DataFrame): Facts as in the `facts` attribute, without the status column.
+            types (List[str]): Edge types, in bit order of the masks.
+        """
+        with stage("algorithm_agreement_index"):
+            self.types = list(types)
+            bassline, shadgpt = facts["bassline"].to_numpy(), facts["shadgpt"].to_numpy()
+            status = np.select(
+                [(bassline != 0) & (bassline == shadgpt), (bassline != 0) & (shadgpt != 0), bassline != 0],
+                [0, 1, 2],
+                default=3,
+            ).astype(np.int8)
+            self.facts = facts.assign(status=pd.Categorical.from_codes(status, STATUSES)).reset_index(drop=True)
+
+            # Both endpoints of every fact, a self-loop once
+            sources, targets = self.facts["source"].to_numpy(), self.facts["target"].to_numpy()
+            other_end = sources != targets
+            rows = np.concatenate([np.arange(len(self.facts)), np.flatnonzero(other_end)])
+            node_codes, self.nodes = pd.factorize(np.concatenate([sources, targets[other_end]]))
+            self.nodes = pd.Index(self.nodes)
+            by_node = np.argsort(node_codes, kind="stable")
+            self.order = rows[by_node]
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(node_codes, minlength=len(self.nodes)))])
+            self.counts = np.bincount(
+                node_codes * len(STATUSES) + status[rows], minlength=len(self.nodes) * len(STATUSES)
+            ).reshape(len(self.nodes), len(STATUSES))
+
+    @staticmethod
+    def _partial_facts(links, types):
+        """
+        One fact row per BassLine or ShadGPT link, with its edge type as a one-bit mask.
+
+        Returns:
+            Tuple[pd.DataFrame, List[str]]: The rows and the edge types, extending `types` with new ones.
+        """
+        links = links[links["_algorithm"].isin(ALGORITHMS)].dropna(subset=["source", "target", "_articleid", "type"])
+        type_index = pd.Index(types)
+        new_types = [t for t in pd.unique(links["type"].astype(str)) if t not in type_index]
+        types = list(types) + sorted(new_types)
+        if len(types) > MAX_TYPES:
+            raise ValueError(f"At most {MAX_TYPES} edge types can be compared, got {len(types)}")
+        bits = np.left_shift(np.uint64(1), pd.Index(types).get_indexer(links["type"].astype(str)).astype(np.uint64))
+        is_bassline = (links["_algorithm"] == ALGORITHMS[0]).to_numpy()
+        partial = pd.DataFrame(
+            {
+                "source": links["source"].to_numpy(),
+                "target": links["target"].to_numpy(),
+                "article": links["_articleid"].to_numpy(),
+                "news_source": links["_raw_source"].astype(str).to_numpy(),
+                "date": pd.to_datetime(links["_date_added"]).to_numpy(),
+                "bassline": np.where(is_bassline, bits, np.uint64(0)),
+                "shadgpt": np.where(is_bassline, np.uint64(0), bits),
+            }
+        )
+        return partial, types
+
+    @staticmethod
+    def _combine(partial):
+        """
+        Join fact rows on (source, target, article), OR-ing the edge type masks.
+        """
+        codes = _codes(partial["source"].to_numpy(), partial["target"].to_numpy(), partial["article"].to_numpy())
+        n_facts = codes.max() + 1 if len(codes) else 0
+        bassline = np.zeros(n_facts, dtype=np.uint64)
+        shadgpt = np.zeros(n_facts, dtype=np.uint64)
+        np.bitwise_or.at(bassline, codes, partial["bassline"].to_numpy())
+        np.bitwise_or.at(shadgpt, codes, partial["shadgpt"].to_numpy())
+        # factorize numbers facts in order of first appearance
+        _, first = np.unique(codes, return_index=True)
+        facts = partial.iloc[first][["source", "target", "article", "news_source"]].reset_index(drop=True)
+        facts["date"] = partial["date"].groupby(codes).min().to_numpy()
+        facts["bassline"] = bassline
+        facts["shadgpt"] = shadgpt
+        return facts
+
+    @classmethod
+    def from_links(cls, links):
+        """
+        Build the index from the link table.
+
+        Parameters:
+            links (pd.DataFrame): Links with source, target, type, _algorithm, _articleid,
+                _raw_source and _date_added columns. Links of other algorithms are ignored.
+
+        Returns:
+            AlgorithmAgreementIndex: The index.
+        """
+        partial, types = cls._partial_facts(links, [])
+        return cls(cls._combine(partial), types)
+
+    def with_links(self, links):
+        """
+        Return a copy of the index with more links joined in.
+
+        Parameters:
+            links (pd.DataFrame): Links as for `from_links`.
+
+        Returns:
+            AlgorithmAgreementIndex: The extended index.
+        """
+        partial, types = self._partial_facts(links, self.types)
+        facts = self.facts.drop(columns="status")
+        return AlgorithmAgreementIndex(self._combine(pd.concat([facts, partial], ignore_index=True)), types)
+
+    def summary(self, company):
+        """
+        Number of facts about a company per status.
+
+        Returns:
+            dict: Mapping of every status in STATUSES to its count.
+        """
+        i = self.nodes.get_indexer([company])[0]
+        counts = self.counts[i] if i >= 0 else np.zeros(len(STATUSES), dtype=np.int64)
+        return dict(zip(STATUSES, counts.tolist()))
+
+    def lookup(self, company, period=None, source=None):
+        """
+        Facts about a company, optionally restricted to one heatmap cell.
+
+        Parameters:
+            company (str): Node id; facts with the company at either end are returned.
+            period (str, optional): Period string of any resolution, see processing.rollups.parse_period.
+            source (str, optional): Full news source name (_raw_source).
+
+        Returns:
+            pd.DataFrame: Rows of `facts`.
+        """
+        i = self.nodes.get_indexer([company])[0]
+        if i < 0:
+            return self.facts.iloc[:0]
+        facts = self.facts.iloc[self.order[self.offsets[i] : self.offsets[i + 1]]]
+        if period is not None:
+            facts = facts[period_mask(facts["date"], period)]
+        if source is not None:
+            facts = facts[facts["news_source"] == source]
+        return facts
+
+    def type_names(self, masks):
+        """
+        Edge type names of bitmasks, e.g. "Event.Aid, Event.Invest".
+
+        Returns:
+            List[str]: One comma-separated string per mask, "" for 0.
+        """
+        return [
+            ", ".join(t for bit, t in enumerate(self.types) if int(mask) >> bit & 1) for mask in np.asarray(masks)
+        ]
@@ -0,0 +1,156 @@
+"""
+Annotator agreement and skew statistics for every annotator and company.
+
+Links are counted per (annotator, company, edge type), with each link counted for both of
+its endpoints as in the PCP view. Every annotator's edge type distribution is compared with
+the consensus of the other annotators, both per company and pooled over all companies.
+All statistics come from one pass of integer-coded bincounts and array arithmetic; only
+(annotator, company) pairs that occur are stored, so thousands of annotators and companies
+stay cheap.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import stage
+
+SENTIMENT_SIGN = {"negative": -1.0, "neutral": 0.0, "positive": 1.0}
+
+
+def _rates(counts):
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, counts / np.where(totals > 0, totals, 1), np.nan), totals[:, 0]
+
+
+def js_divergence(p, q):
+    """
+    Jensen-Shannon divergence in bits between the rows of two distribution matrices.
+
+    Returns:
+        np.ndarray: One value in [0, 1] per row, NaN where either row is undefined.
+    """
+    m = (p + q) / 2
+    jsd = np.zeros(len(p))
+    for dist in (p, q):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            terms = np.log2(dist / m, out=np.zeros_like(dist), where=dist > 0)
+        jsd += (dist * terms).sum(axis=1) / 2
+    jsd[np.isnan(p).any(axis=1) | np.isnan(q).any(axis=1)] = np.nan
+    return np.clip(jsd, 0.0, 1.0)
+
+
+class AnnotatorAgreement:
+    """
+    Agreement of every annotator with the consensus of the others.
+
+    For an annotator and a company, the consensus is the edge type distribution of all other
+    annotators' links about that company (leave-one-out), so an annotator never agrees with
+    themselves. Statistics per row:
+
+    - links: links by the annotator; consensus_links: links by the others.
+    - jsd: Jensen-Shannon divergence (bits) between the annotator's and the consensus distribution.
+    - sentiment_skew: share of positive minus share of negative edge types, annotator minus consensus.
+    - max_deviation, max_deviation_type: largest per-type rate difference (annotator minus consensus) and its type.
+
+    Attributes:
+        types (List[str]): Edge types, the columns of the count matrices.
+        pairs (pd.DataFrame): Statistics per (annotator, company) with at least one link.
+        annotators (pd.DataFrame): Statistics per annotator, pooled over all companies, plus
+            companies (number of companies annotated) and company_jsd (mean per-company jsd,
+            weighted by links).
+    """
+
+    def __init__(self, links, edge_type_sentiment, companies=None):
+        """
+        Parameters:
+            links (pd.DataFrame): Links with source, target, type and _last_edited_by columns.
+            edge_type_sentiment (dict): Mapping of edge type to "positive", "neutral" or "negative".
+            companies (Iterable[str], optional): Restrict to links about these nodes. Defaults to every endpoint.
+        """
+        with stage("annotator_agreement"):
+            links = links.dropna(subset=["_last_edited_by", "type"])
+            # One row per (link, endpoint); a self-loop is counted once
+            sources, targets = links["source"].to_numpy(), links["target"].to_numpy()
+            other_end = sources != targets
+            rows = np.concatenate([np.arange(len(links)), np.flatnonzero(other_end)])
+            endpoints = np.concatenate([sources, targets[other_end]])
+            if companies is not None:
+                about = pd.Index(list(companies)).get_indexer(endpoints) >= 0
+                rows, endpoints = rows[about], endpoints[about]
+
+            annotator_codes, annotators = pd.factorize(links["_last_edited_by"].astype(str).to_numpy()[rows])
+            company_codes, company_names = pd.factorize(endpoints)
+            type_codes, types = pd.factorize(links["type"].astype(str).to_numpy()[rows], sort=True)
+            n_types = len(types)
+            self.types = list(types)
+            sign = np.array([SENTIMENT_SIGN.get(edge_type_sentiment.get(t, "neutral"), 0.0) for t in self.types])
+
+            # Sparse (annotator, company) pairs, then dense counts per pair and type
+            pair_keys = annotator_codes.astype(np.int64) * max(len(company_names), 1) + company_codes
+            pair_keys, pair_codes = np.unique(pair_keys, return_inverse=True)
+            pair_annotator = pair_keys // max(len(company_names), 1)
+            pair_company = pair_keys % max(len(company_names), 1)
+            pair_counts = np.bincount(
+                pair_codes * n_types + type_codes, minlength=len(pair_keys) * n_types
+            ).reshape(len(pair_keys), n_types)
+            company_counts = np.bincount(
+                company_codes * n_types + type_codes, minlength=len(company_names) * n_types
+            ).reshape(len(company_names), n_types)
+            annotator_counts = np.bincount(
+                annotator_codes * n_types + type_codes, minlength=len(annotators) * n_types
+            ).reshape(len(annotators), n_types)
+
+            self.pairs = self._statistics(pair_counts, company_counts[pair_company] - pair_counts, sign)
+            self.pairs.insert(0, "annotator", annotators[pair_annotator])
+            self.pairs.insert(1, "company", company_names[pair_company])
+
+            self.annotators = self._statistics(annotator_counts, annotator_counts.sum(axis=0) - annotator_counts, sign)
+            self.annotators.insert(0, "annotator", annotators)
+            weights = np.where(np.isnan(self.pairs["jsd"]), 0, self.pairs["links"])
+            weighted = np.bincount(
+                pair_annotator, weights=weights * np.nan_to_num(self.pairs["jsd"]), minlength=len(annotators)
+            )
+            total = np.bincount(pair_annotator, weights=weights, minlength=len(annotators))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.annotators["company_jsd"] = np.where(total > 0, weighted / total, np.nan)
+            self.annotators["companies"] = np.bincount(pair_annotator, minlength=len(annotators))
+
+    def _statistics(self, counts, consensus_counts, sign):
+        rates, links = _rates(counts)
+        consensus, consensus_links = _rates(consensus_counts)
+        deviation = rates - consensus
+        defined = ~np.isnan(deviation).any(axis=1)
+        if counts.shape[1] == 0:
+            # No links with an edge type: nothing to take the argmax over, and no rows
+            largest = np.zeros(len(counts), dtype=np.int64)
+        else:
+            largest = np.argmax(np.where(defined[:, None], np.abs(np.nan_to_num(deviation)), -1), axis=1)
+        max_deviation = np.where(defined, deviation[np.arange(len(deviation)), largest], np.nan)
+        return pd.DataFrame(
+            {
+                "links": links,
+                "consensus_links": consensus_links,
+                "jsd": js_divergence(rates, consensus),
+                "sentiment_skew": rates @ sign - consensus @ sign,
+                "max_deviation": max_deviation,
+                "max_deviation_type": np.where(defined, np.array(self.types, dtype=object)[largest], None),
+            }
+        )
+
+    def ranked(self, level="annotator", by="jsd", min_links=1):
+        """
+        Rows with a consensus to compare with, most divergent first.
+
+        Parameters:
+            level (str): "annotator" for pooled statistics, "pair" for per (annotator, company).
+            by (str): Statistic to rank by; its absolute value is used.
+            min_links (int): Leave out rows with fewer links by the annotator.
+
+        Returns:
+            pd.DataFrame: The ranked rows.
+        """
+        frame = self.annotators if level == "annotator" else self.pairs
+        frame = frame[(frame["links"] >= min_links) & frame[by].notna()]
+        order = frame[by].abs().sort_values(ascending=False, kind="stable").index
+        return frame.loc[order].reset_index(drop=True)
@@ -0,0 +1,243 @@
+"""
+Catalog of the article files and the links that cite them.
+
+Article files are named `Company__i__j__Source[_Police].txt`. The catalog is built once from
+one directory scan and the link table. It holds each article's company, source, police flag,
+file size and number of citing links, plus the citing links themselves, grouped by article.
+Article reads, lookups by company or source, and the check for missing or orphaned files all
+go through it.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import stage
+
+ARTICLE_ID_PATTERN = r"^(?P<company>.+?)__(?P<number>\d+)__(?P<part>\d+)__(?P<source>.+?)(?P<police>_Police)?$"
+
+# Link columns kept per citing link
+LINK_COLUMNS = ["source", "target", "type", "_algorithm", "_raw_source", "_date_added"]
+
+
+def parse_article_ids(article_ids):
+    """
+    Split article ids (filenames without extension) into their parts.
+
+    Parameters:
+        article_ids (Iterable[str]): Article ids.
+
+    Returns:
+        pd.DataFrame: Indexed by article id, columns company, number, part, source and police
+        (bool). All parts are NaN for ids that do not follow the naming scheme.
+    """
+    ids = pd.Index(list(article_ids), dtype=object, name="article")
+    parts = pd.Series(ids, index=ids, dtype=object).str.extract(ARTICLE_ID_PATTERN)
+    parts["number"] = pd.to_numeric(parts["number"]).astype("Int64")
+    parts["part"] = pd.to_numeric(parts["part"]).astype("Int64")
+    parts["police"] = parts["police"].notna().where(parts["company"].notna())
+    return parts
+
+
+class ArticleCatalog:
+    """
+    Every article file with its metadata, and the links that cite each article.
+
+    The catalog is never modified in place: `with_articles` and `with_links` return updated
+    copies, so readers in other threads keep a consistent view.
+
+    Attributes:
+        articles_dir (str): Directory containing the article files.
+        articles (pd.DataFrame): One row per article file, indexed by article id, with the
+            parsed company, number, part, source and police columns, the file size in bytes
+            and the number of links citing it.
+        links (pd.DataFrame): Citing links with an "article" column, sorted by article.
+        missing (List[str]): Article ids cited by links that have no file.
+        orphaned (List[str]): Article files no link cites. Empty when built without links.
+        unparsed (List[str]): Article files whose name does not follow the naming scheme.
+        has_links (bool): Whether the catalog was built with the link table.
+    """
+
+    def __init__(self, articles_dir, files, links=None):
+        """
+        Parameters:
+            articles_dir (str): Directory containing the article files.
+            files (pd.Series): File size in bytes, indexed by article id.
+            links (pd.DataFrame, optional): Link rows with an _articleid column.
+        """
+        with stage("article_catalog"):
+            self.articles_dir = articles_dir
+            self.has_links = links is not None
+            self.articles = parse_article_ids(files.index).assign(size=files.to_numpy())
+
+            if links is None:
+                self.links = pd.DataFrame(columns=["article"] + LINK_COLUMNS)
+            else:
+                cited = links.dropna(subset=["_articleid"])
+                columns = [column for column in LINK_COLUMNS if column in cited.columns]
+                self.links = cited[columns].assign(article=cited["_articleid"].astype(str).to_numpy())
+                self.links = self.links.sort_values("article", kind="stable").reset_index(drop=True)
+            counts = self.links["article"].value_counts()
+            self.articles["links"] = counts.reindex(self.articles.index, fill_value=0).astype(int).to_numpy()
+            # Row range of every cited article's links
+            starts = np.searchsorted(self.links["article"].to_numpy(), counts.index.to_numpy(dtype=object))
+            self._link_ranges = dict(zip(counts.index, zip(starts.tolist(), (starts + counts.to_numpy()).tolist())))
+
+            self.missing = sorted(set(counts.index) - set(self.articles.index))
+            self.orphaned = [] if not self.has_links else self.articles.index[self.articles["links"] == 0].tolist()
+            self.unparsed = self.articles.index[self.articles["company"].isna()].tolist()
+            self._by_company = self.articles.groupby("company").groups
+            self._by_source = self.articles.groupby("source").groups
+
+    @staticmethod
+    def _scan(articles_dir, article_ids=None):
+        """
+        File sizes of the article files in a directory, or of some of them.
+
+        Returns:
+            pd.Series: Size in bytes indexed by article id, sorted; ids without a file are left out.
+        """
+        sizes = {}
+        if article_ids is None:
+            if os.path.isdir(articles_dir):
+                with os.scandir(articles_dir) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".txt") and entry.is_file():
+                            sizes[entry.name[:-4]] = entry.stat().st_size
+        else:
+            for article_id in article_ids:
+                try:
+                    sizes[article_id] = os.stat(os.path.join(articles_dir, f"{article_id}.txt")).st_size
+                except FileNotFoundError:
+                    pass
+        return pd.Series(sizes, dtype=np.int64).sort_index()
+
+    @classmethod
+    def from_directory(cls, articles_dir, links=None):
+        """
+        Build the catalog from one scan of the articles directory.
+
+        Parameters:
+            articles_dir (str): Directory containing `<article_id>.txt` files.
+            links (pd.DataFrame, optional): Link rows with an _articleid column, for the
+                article-to-link mapping and the missing and orphaned checks.
+
+        Returns:
+            ArticleCatalog: The catalog.
+        """
+        return cls(articles_dir, cls._scan(articles_dir), links)
+
+    def _citing_links(self):
+        if not self.has_links:
+            return None
+        return self.links.drop(columns="article").assign(_articleid=self.links["article"].to_numpy())
+
+    def with_articles(self, changed, removed):
+        """
+        Return a copy of the catalog with added or rewritten article files re-read and removed ones dropped.
+
+        Parameters:
+            changed (List[str]): Ids of added or rewritten articles.
+            removed (List[str]): Ids of deleted articles.
+
+        Returns:
+            ArticleCatalog: The updated catalog.
+        """
+        files = self.articles["size"].drop(index=list(changed) + list(removed), errors="ignore")
+        files = pd.concat([files, self._scan(self.articles_dir, changed)]).sort_index()
+        return ArticleCatalog(self.articles_dir, files, self._citing_links())
+
+    def with_links(self, links):
+        """
+        Return a copy of the catalog with more citing links.
+
+        Parameters:
+            links (pd.DataFrame): Appended link rows with an _articleid column.
+
+        Returns:
+            ArticleCatalog: The updated catalog.
+        """
+        if self.has_links:
+            links = pd.concat([self._citing_links(), links], ignore_index=True)
+        return ArticleCatalog(self.articles_dir, self.articles["size"], links)
+
+    def __contains__(self, article_id):
+        return article_id in self.articles.index
+
+    def __len__(self):
+        return len(self.articles)
+
+    @property
+    def ids(self):
+        """
+        Ids of all article files, sorted.
+        """
+        return self.articles.index.tolist()
+
+    def path(self, article_id):
+        """
+        Path of an article file.
+
+        Raises:
+            KeyError: If the article has no file.
+        """
+        if article_id not in self.articles.index:
+            raise KeyError(f"No article file for {article_id!r} in {self.articles_dir}")
+        return os.path.join(self.articles_dir, f"{article_id}.txt")
+
+    def read(self, article_id):
+        """
+        Read the raw text of an article.
+
+        Raises:
+            KeyError: If the article has no file.
+        """
+        with stage("article_io"), open(self.path(article_id), "r") as file:
+            return file.read()
+
+    def articles_of(self, company=None, source=None):
+        """
+        Ids of the article files of a company, a source or both, as named in the filenames.
+
+        Parameters:
+            company (str, optional): Company name.
+            source (str, optional): News source, without the "_Police" suffix.
+
+        Returns:
+            List[str]: Article ids, sorted.
+        """
+        ids = self.articles.index
+        if company is not None:
+            ids = ids.intersection(self._by_company.get(company, ids[:0]))
+        if source is not None:
+            ids = ids.intersection(self._by_source.get(source, ids[:0]))
+        return sorted(ids)
+
+    def links_of(self, article_id):
+        """
+        Links citing an article.
+
+        Returns:
+            pd.DataFrame: Rows of `links`, empty if no link cites the article.
+        """
+        start, end = self._link_ranges.get(article_id, (0, 0))
+        return self.links.iloc[start:end]
+
+    def check(self):
+        """
+        Describe missing, orphaned and unparsed article files.
+
+        Returns:
+            List[str]: One message per kind of problem found, with a few example ids.
+        """
+        messages = []
+        for ids, problem in (
+            (self.missing, "articles cited by links have no file"),
+            (self.orphaned, "article files are not cited by any link"),
+            (self.unparsed, "article files are not named Company__i__j__Source[_Police].txt"),
+        ):
+            if ids:
+                examples = ", ".join(ids[:3]) + (", ..." if len(ids) > 3 else "")
+                messages.append(f"{len(ids)} {problem} in {self.articles_dir}: {examples}")
+        return messages
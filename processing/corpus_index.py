@@ -0,0 +1,165 @@
+from nltk.tokenize import sent_tokenize
+
+from processing.article_catalog import ArticleCatalog
+from processing.entity_matcher import EntityMatcher
+from utils.metrics import stage
+
+
+def custom_sentence_split(text):
+    """
+    Splits text into sentences by first breaking into blocks (paragraphs),
+    then splitting each block into sentences.
+
+    Parameters:
+        text (str): Text to split.
+
+    Returns:
+        List[str]: List of sentence strings.
+    """
+    with stage("segmentation"):
+        blocks = text.split("\n\n")
+        sentences = []
+        for block in blocks:
+            block = block.strip()
+            if block:
+                sentences.extend(sent_tokenize(block))
+    return sentences
+
+
+class CorpusIndex:
+    """
+    Sentence-level index of entity mentions across the article corpus.
+
+    Every article is read and split into sentences once, and every sentence is scanned
+    once with an EntityMatcher compiled over all entity names, so looking up the sentences
+    that mention an entity is a dictionary access instead of a per-click file read and
+    substring scan.
+
+    Attributes:
+        matcher (EntityMatcher): Automaton over all known entity names.
+        catalog (ArticleCatalog): The article files; all reads go through it.
+        articles_dir (str): Directory containing the article text files.
+        sentences (dict): Mapping of article id to its list of sentences.
+        mentions (dict): Mapping of entity to a list of (article_id, sentence_idx, start, end) hits.
+    """
+
+    def __init__(self, entities, articles_dir="data/articles", catalog=None):
+        """
+        Build the index over all articles in a directory.
+
+        Parameters:
+            entities (Iterable[str]): Entity names to index, typically the graph's node ids.
+            articles_dir (str): Directory containing `<article_id>.txt` files.
+            catalog (ArticleCatalog, optional): Catalog of the articles, used instead of scanning `articles_dir`.
+        """
+        self.matcher = EntityMatcher(entities)
+        self.catalog = ArticleCatalog.from_directory(articles_dir) if catalog is None else catalog
+        self.articles_dir = self.catalog.articles_dir
+        self.sentences = {}
+        self.mentions = {}
+        self._article_mentions = {}
+
+        for article_id in self._list_articles():
+            self.add_article(article_id, self._read_article(article_id))
+
+    def _list_articles(self):
+        """
+        Return the ids of all article files in the catalog.
+        """
+        return self.catalog.ids
+
+    def _read_article(self, article_id):
+        """
+        Read the raw text of an article.
+        """
+        return self.catalog.read(article_id)
+
+    def add_article(self, article_id, text):
+        """
+        Split an article into sentences and record every entity mention in it.
+
+        Re-adding an article replaces its previous sentences and mentions.
+
+        Parameters:
+            article_id (str): Article id (filename without extension).
+            text (str): Raw article text.
+        """
+        if article_id in self.sentences:
+            self.remove_article(article_id)
+
+        sentences = custom_sentence_split(text)
+        article_mentions = {}
+        for sentence_idx, sentence in enumerate(sentences):
+            for entity, start, end in self.matcher.find_all(sentence):
+                self.mentions.setdefault(entity, []).append((article_id, sentence_idx, start, end))
+                sentence_idxs = article_mentions.setdefault(entity, [])
+                if not sentence_idxs or sentence_idxs[-1] != sentence_idx:
+                    sentence_idxs.append(sentence_idx)
+
+        self.sentences[article_id] = sentences
+        self._article_mentions[article_id] = article_mentions
+
+    def remove_article(self, article_id):
+        """
+        Drop an article and its mentions from the index.
+
+        Parameters:
+            article_id (str): Article id to remove.
+        """
+        self.sentences.pop(article_id, None)
+        for entity in self._article_mentions.pop(article_id, {}):
+            hits = [hit for hit in self.mentions.get(entity, []) if hit[0] != article_id]
+            if hits:
+                self.mentions[entity] = hits
+            else:
+                self.mentions.pop(entity, None)
+
+    def entity_sentences(self, article_id, entity):
+        """
+        Return the sentences of an article that mention an entity.
+
+        Articles that are not indexed yet are read and indexed on first access; articles without
+        a file in the catalog have no sentences. Entities outside the automaton fall back to a
+        case-insensitive substring scan.
+
+        Parameters:
+            article_id (str): Article id (filename without extension).
+            entity (str): Entity name.
+
+        Returns:
+            List[str]: Sentences mentioning the entity, in article order.
+        """
+        if article_id not in self.sentences:
+            if article_id not in self.catalog:
+                return []
+            self.add_article(article_id, self._read_article(article_id))
+
+        sentences = self.sentences[article_id]
+        if entity in self.matcher:
+            return [sentences[i] for i in self._article_mentions[article_id].get(entity, [])]
+
+        entity_lower = entity.lower()
+        return [s for s in sentences if entity_lower in s.lower()]
+
+    def articles_mentioning(self, entity):
+        """
+        Return the ids of all indexed articles that mention an entity.
+
+        Parameters:
+            entity (str): Entity name.
+
+        Returns:
+            List[str]: Sorted article ids.
+        """
+        return sorted({article_id for article_id, _, _, _ in self.mentions.get(entity, [])})
+
+    def hits(self):
+        """
+        Iterate over every recorded mention in the corpus.
+
+        Yields:
+            Tuple[str, str, int, int, int]: (entity, article_id, sentence_idx, start, end).
+        """
+        for entity, entity_hits in self.mentions.items():
+            for article_id, sentence_idx, start, end in entity_hits:
+                yield entity, article_id, sentence_idx, start, end
@@ -0,0 +1,74 @@
+"""
+Divergence between CatchNet's extracted triplet sentiment and what the articles say.
+
+For every (company, source, period) heatmap cell, the CatchNet score (mean triplet
+sentiment, from the heatmap's sentiment rollup) is compared with the mean article sentiment
+towards the company (from the sentence sentiment index) over the articles the cell's links
+cite. All cells are computed in one pass of joins and groupbys over the whole dataset.
+"""
+
+import pandas as pd
+
+from processing.rollups import DEFAULT_RESOLUTION, RESOLUTIONS
+from utils.metrics import stage
+
+DIVERGENCE_COLUMNS = ["company", "source", "period", "catchnet", "article_score", "gap", "links", "articles", "scored"]
+
+
+def article_scores(sentiment_index, companies=None):
+    """
+    Precomputed sentiment of every indexed article towards every company it mentions.
+
+    Only sentences already in the index count; fill it with `python -m processing.sentiment_index`.
+
+    Parameters:
+        sentiment_index (SentimentIndex): The sentence sentiment index.
+        companies (Iterable[str], optional): Restrict to these companies.
+
+    Returns:
+        pd.DataFrame: Columns company, article and score (mean sentence score, as in the diverging bar chart).
+    """
+    scores = sentiment_index.aggregate(["entity", "article"], entities=companies)
+    return scores[["entity", "article", "score"]].rename(columns={"entity": "company"})
+
+
+def divergence_cells(rollup, links, scores, resolution=DEFAULT_RESOLUTION):
+    """
+    CatchNet vs article sentiment gap of every heatmap cell, most divergent first.
+
+    Parameters:
+        rollup (SentimentRollup): The heatmap's sentiment rollup (CatchNet scores).
+        links (pd.DataFrame): The heatmap's enriched links, with company, _raw_source, _date_added
+            and _articleid columns; they decide which articles belong to a cell.
+        scores (pd.DataFrame): Output of `article_scores`.
+        resolution (str): Cell period: "day", "week", "month" or "quarter".
+
+    Returns:
+        pd.DataFrame: One row per cell with at least one scored article, columns DIVERGENCE_COLUMNS:
+        the CatchNet and mean article score, their gap (article minus CatchNet), the number of
+        links behind the CatchNet score and the number of cited and scored articles. Sorted by
+        absolute gap, then by the number of scored articles.
+    """
+    with stage("divergence"):
+        cited = pd.DataFrame(
+            {
+                "company": links["company"],
+                "source": links["_raw_source"],
+                "period": pd.to_datetime(links["_date_added"]).dt.to_period(RESOLUTIONS[resolution]),
+                "article": links["_articleid"],
+            }
+        ).dropna()
+        cited = cited.assign(source=cited["source"].astype(str)).drop_duplicates()
+        cited = cited.merge(scores, on=["company", "article"], how="left")
+        cells = cited.groupby(["company", "source", "period"]).agg(
+            article_score=("score", "mean"), articles=("article", "size"), scored=("score", "count")
+        )
+
+        table = rollup.tables[resolution]
+        catchnet = pd.DataFrame({"catchnet": table["sum"] / table["count"], "links": table["count"]})
+        cells = cells[cells["scored"] > 0].join(catchnet, how="inner")
+        cells["gap"] = cells["article_score"] - cells["catchnet"]
+        cells = cells.reset_index().assign(abs_gap=cells["gap"].abs().to_numpy())
+        cells["period"] = cells["period"].astype(str)
+        cells = cells.sort_values(["abs_gap", "scored"], ascending=False, kind="stable")
+    return cells[DIVERGENCE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,109 @@
+from collections import deque
+
+
+class EntityMatcher:
+    """
+    Multi-pattern matcher (Aho–Corasick automaton) over a fixed set of entity names.
+
+    All entity names are compiled once into a single automaton, so scanning a text
+    for every entity is a single linear pass over the text instead of one substring
+    search per entity. Matching is case-insensitive and follows the same substring
+    semantics as `entity.lower() in text.lower()`.
+
+    Attributes:
+        entities (list): Entity names, indexed by pattern id.
+    """
+
+    def __init__(self, entities):
+        """
+        Build the automaton for the given entity names.
+
+        Parameters:
+            entities (Iterable[str]): Entity names to match. Empty names and duplicates are ignored.
+        """
+        self.entities = []
+        self._pattern_ids = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+
+        for entity in entities:
+            if not isinstance(entity, str) or not entity or entity in self._pattern_ids:
+                continue
+            self._pattern_ids[entity] = len(self.entities)
+            self.entities.append(entity)
+            self._insert(entity.lower(), self._pattern_ids[entity])
+
+        self._build_failure_links()
+
+    def __contains__(self, entity):
+        return entity in self._pattern_ids
+
+    def __len__(self):
+        return len(self.entities)
+
+    def _insert(self, pattern, pattern_id):
+        """
+        Add one lowercased pattern to the trie.
+        """
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] = self._out[state] + ((pattern_id, len(pattern)),)
+
+    def _build_failure_links(self):
+        """
+        Compute failure links breadth-first and merge outputs along them.
+        """
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find_all(self, text):
+        """
+        Find every occurrence of every entity in a text.
+
+        Parameters:
+            text (str): Text to scan.
+
+        Returns:
+            List[Tuple[str, int, int]]: (entity, start, end) for each hit, with offsets into
+            the lowercased text, ordered by end offset.
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = []
+        state = 0
+        for i, char in enumerate(text.lower()):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_id, length in out[state]:
+                hits.append((self.entities[pattern_id], i + 1 - length, i + 1))
+        return hits
+
+    def entities_in(self, text):
+        """
+        Return the set of entities mentioned at least once in a text.
+
+        Parameters:
+            text (str): Text to scan.
+
+        Returns:
+            Set[str]: Entities found in the text.
+        """
+        return {entity for entity, _, _ in self.find_all(text)}
@@ -0,0 +1,426 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.metrics import stage
+
+# Fixed seed of community detection, so the same edge type selection always gets the same communities
+LOUVAIN_SEED = 42
+
+
+def coo_to_csr(rows, cols, weights, n):
+    """
+    Build a CSR matrix from coordinate triplets, summing duplicate entries.
+
+    Parameters:
+        rows (np.ndarray): Row index of every entry.
+        cols (np.ndarray): Column index of every entry.
+        weights (np.ndarray): Value of every entry.
+        n (int): Number of rows (and columns).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (indptr, indices, data) with sorted column indices per row.
+    """
+    if len(rows) == 0:
+        return np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+    keys = rows.astype(np.int64) * n + cols
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    data = np.add.reduceat(weights[order].astype(np.float64), starts)
+    unique_keys = keys[starts]
+    indices = (unique_keys % n).astype(np.int32)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(unique_keys // n, minlength=n), out=indptr[1:])
+    return indptr, indices, data
+
+
+def modularity(indptr, indices, data, community, resolution=1.0):
+    """
+    Modularity of a partition of a symmetric weighted adjacency matrix.
+
+    Parameters:
+        indptr, indices, data (np.ndarray): The adjacency matrix, see `coo_to_csr`.
+        community (np.ndarray): Community of every node.
+        resolution (float): Modularity resolution.
+
+    Returns:
+        float: The modularity, 0 for a matrix without entries.
+    """
+    total_weight = data.sum()
+    if total_weight == 0:
+        return 0.0
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    internal = data[community[rows] == community[indices]].sum()
+    totals = np.bincount(community, weights=np.bincount(rows, weights=data, minlength=len(community)))
+    return internal / total_weight - resolution * (totals**2).sum() / total_weight**2
+
+
+def _local_moving(indptr, indices, data, total_weight, rng, resolution, min_gain, max_rounds, patience):
+    """
+    Louvain's local moving phase, vectorised: every round computes each node's modularity gain
+    for all neighbouring communities at once, and a random share of the nodes that can improve
+    move together. A round that does not raise modularity is discarded and halves the share,
+    since simultaneous moves can cancel out; a round that does doubles it again, up to all
+    nodes. Ends when no node can improve, after `patience` failed rounds in a row, or after
+    `max_rounds` rounds.
+
+    Returns:
+        np.ndarray: Community of every node, numbered 0 to the number of communities - 1.
+    """
+    size = len(indptr) - 1
+    rows = np.repeat(np.arange(size), np.diff(indptr))
+    degree = np.bincount(rows, weights=data, minlength=size)
+    off_diagonal = rows != indices
+    rows, neighbours, weights = rows[off_diagonal], indices[off_diagonal], data[off_diagonal]
+    community = np.arange(size)
+    if not len(rows):
+        # Only self-loops: no node has anywhere to move
+        return community
+    quality = modularity(indptr, indices, data, community, resolution)
+
+    failures = 0
+    share = 1.0
+    for _ in range(max_rounds):
+        # Summed weight from every node to every neighbouring community
+        keys, inverse = np.unique(rows.astype(np.int64) * size + community[neighbours], return_inverse=True)
+        links = np.bincount(inverse, weights=weights)
+        nodes, candidates = keys // size, keys % size
+        own = community[nodes] == candidates
+
+        totals = np.bincount(community, weights=degree, minlength=size)
+        # Community totals without the node itself, whose move is being evaluated
+        others = totals[candidates] - np.where(own, degree[nodes], 0)
+        gains = links - resolution * others * degree[nodes] / total_weight
+        stay = np.zeros(size)
+        stay[nodes[own]] = links[own]
+        stay -= resolution * (totals[community] - degree) * degree / total_weight
+
+        # Best candidate per node: highest gain, ties to the lowest community number. The keys are
+        # sorted by node, then community, so each node's candidates are one run
+        starts = np.flatnonzero(np.r_[True, nodes[1:] != nodes[:-1]])
+        best_gains = np.maximum.reduceat(gains, starts)
+        is_best = np.flatnonzero(gains == np.repeat(best_gains, np.diff(np.r_[starts, len(nodes)])))
+        first = is_best[np.r_[True, nodes[is_best][1:] != nodes[is_best][:-1]]]
+        movers, targets = nodes[first], candidates[first]
+        improves = best_gains > stay[movers] + min_gain
+        # Two lone nodes would swap places; only the one with the higher number moves
+        counts = np.bincount(community, minlength=size)
+        improves &= ~((counts[community[movers]] == 1) & (counts[targets] == 1) & (targets > community[movers]))
+        if not improves.any():
+            break
+        improves &= rng.random(len(movers)) < share
+
+        moved = community.copy()
+        moved[movers[improves]] = targets[improves]
+        moved_quality = modularity(indptr, indices, data, moved, resolution)
+        if moved_quality > quality + min_gain:
+            community, quality, failures = moved, moved_quality, 0
+            share = min(1.0, share * 2)
+        else:
+            failures += 1
+            share /= 2
+            if failures >= patience:
+                break
+    return np.unique(community, return_inverse=True)[1]
+
+
+def louvain(indptr, indices, data, seed=LOUVAIN_SEED, resolution=1.0, min_gain=1e-9, max_rounds=64, patience=5):
+    """
+    Louvain community detection on a symmetric weighted adjacency matrix in CSR form.
+
+    Each level runs the vectorised local moving phase (see `_local_moving`), then merges every
+    community into one node by summing the matrix entries between communities, and repeats on
+    the smaller matrix until no communities merge. Random choices come from `seed`, so the
+    result is deterministic.
+
+    Parameters:
+        indptr, indices, data (np.ndarray): The adjacency matrix, see `coo_to_csr`. Every
+            undirected edge is stored in both directions.
+        seed (int): Seed of the choice of moving nodes.
+        resolution (float): Modularity resolution; higher values give smaller communities.
+        min_gain (float): Smallest modularity gain that counts as an improvement.
+        max_rounds (int): Most moving rounds per level.
+        patience (int): Rounds in a row without improvement after which a level ends.
+
+    Returns:
+        np.ndarray: Community of every node, numbered by first appearance in node order.
+    """
+    membership = np.arange(len(indptr) - 1)
+    total_weight = data.sum()
+    if total_weight == 0:
+        return membership
+
+    rng = np.random.default_rng(seed)
+    while True:
+        size = len(indptr) - 1
+        community = _local_moving(indptr, indices, data, total_weight, rng, resolution, min_gain, max_rounds, patience)
+        n_communities = community.max() + 1
+        if n_communities == size:
+            break
+        membership = community[membership]
+        # Merge each community into one node: entry (a, b) sums the weights between communities a and b
+        rows = np.repeat(np.arange(size), np.diff(indptr))
+        indptr, indices, data = coo_to_csr(community[rows], community[indices], data, n_communities)
+
+    # Number communities by first appearance so the same partition always gets the same labels
+    _, first = np.unique(membership, return_index=True)
+    relabel = np.empty(len(first), dtype=np.int64)
+    relabel[np.argsort(np.argsort(first))] = np.arange(len(first))
+    return relabel[membership]
+
+
+class AdjacencyIndex:
+    """
+    Undirected adjacency of the knowledge graph, one sparse matrix per edge type.
+
+    Edges are stored per type as a symmetric CSR matrix over a fixed node numbering, with
+    parallel edges summed into the weight. The neighbours of a node under a set of edge types
+    are read from the rows of those types' matrices. Community detection runs on the sum of
+    the selected types' matrices, which is cached per type set.
+
+    The index is never modified in place: `with_edges` returns an extended copy, so readers
+    in other threads keep a consistent view.
+
+    Attributes:
+        nodes (List[str]): Node ids, in matrix order.
+        node_index (dict): Mapping of node id to matrix row.
+        csr_by_type (dict): Mapping of edge type to its (indptr, indices, data) matrix, see `coo_to_csr`.
+    """
+
+    # Number of edge type selections whose summed matrix is kept
+    MAX_CACHED = 16
+
+    def __init__(self, nodes, csr_by_type, cache=None):
+        """
+        Parameters:
+            nodes (List[str]): Node ids, in matrix order.
+            csr_by_type (dict): Mapping of edge type to its (indptr, indices, data) matrix.
+            cache (OrderedDict, optional): Summed matrices per frozenset of edge types, still valid for these matrices.
+        """
+        self.nodes = list(nodes)
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.csr_by_type = csr_by_type
+        self._cache = OrderedDict() if cache is None else cache
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _symmetric_csr(sources, targets, n):
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        rows, cols = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+        return coo_to_csr(rows, cols, np.ones(len(rows)), n)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Build the index from a NetworkX graph whose edges have a "type" attribute.
+
+        Parameters:
+            graph (networkx.MultiDiGraph): The knowledge graph.
+
+        Returns:
+            AdjacencyIndex: The index.
+        """
+        nodes = list(graph.nodes)
+        node_index = {node: i for i, node in enumerate(nodes)}
+        pairs_by_type = {}
+        with stage("adjacency_build"):
+            for u, v, etype in graph.edges(data="type"):
+                sources, targets = pairs_by_type.setdefault(etype, ([], []))
+                sources.append(node_index[u])
+                targets.append(node_index[v])
+            csr_by_type = {
+                etype: cls._symmetric_csr(sources, targets, len(nodes))
+                for etype, (sources, targets) in pairs_by_type.items()
+            }
+            return cls(nodes, csr_by_type)
+
+    def with_edges(self, edges, new_nodes=()):
+        """
+        Return a copy of the index with extra nodes and edges.
+
+        Parameters:
+            edges (Iterable[Tuple[str, str, str]]): (source, target, type) of the new edges.
+            new_nodes (Iterable[str]): Ids of new nodes. Edge endpoints that are not known yet are added too.
+
+        Returns:
+            AdjacencyIndex: The extended index. Only the matrices of the new edges' types are rebuilt.
+        """
+        nodes = list(self.nodes)
+        node_index = dict(self.node_index)
+        for node in new_nodes:
+            if node not in node_index:
+                node_index[node] = len(nodes)
+                nodes.append(node)
+
+        pairs_by_type = {}
+        for u, v, etype in edges:
+            for node in (u, v):
+                if node not in node_index:
+                    node_index[node] = len(nodes)
+                    nodes.append(node)
+            sources, targets = pairs_by_type.setdefault(etype, ([], []))
+            sources.append(node_index[u])
+            targets.append(node_index[v])
+
+        n, added = len(nodes), len(nodes) - len(self.nodes)
+
+        def pad(csr):
+            # New nodes are empty rows at the end
+            indptr, indices, data = csr
+            return np.r_[indptr, np.full(added, indptr[-1])], indices, data
+
+        csr_by_type = {}
+        for etype, csr in self.csr_by_type.items():
+            if etype not in pairs_by_type:
+                csr_by_type[etype] = pad(csr)
+        for etype, (sources, targets) in pairs_by_type.items():
+            csr = self._symmetric_csr(sources, targets, n)
+            if etype in self.csr_by_type:
+                # The old entries are already symmetric: stack them with the new ones and sum duplicates
+                indptr, indices, data = self.csr_by_type[etype]
+                new_indptr, new_indices, new_data = csr
+                rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+                new_rows = np.repeat(np.arange(n), np.diff(new_indptr))
+                csr = coo_to_csr(
+                    np.concatenate([rows, new_rows]),
+                    np.concatenate([indices, new_indices]),
+                    np.concatenate([data, new_data]),
+                    n,
+                )
+            csr_by_type[etype] = csr
+
+        with self._lock:
+            cache = OrderedDict((key, pad(csr)) for key, csr in self._cache.items() if not key & pairs_by_type.keys())
+        return AdjacencyIndex(nodes, csr_by_type, cache)
+
+    def adjacency(self, selected_types):
+        """
+        Summed matrix of some edge types, over all nodes. Cached per type set.
+
+        Parameters:
+            selected_types (Iterable[str]): Edge types to include.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (indptr, indices, data), see `coo_to_csr`.
+        """
+        key = frozenset(selected_types)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        parts = [self.csr_by_type[etype] for etype in key if etype in self.csr_by_type]
+        with stage("adjacency_sum"):
+            if len(parts) == 1:
+                csr = parts[0]
+            else:
+                rows = [np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)) for indptr, _, _ in parts]
+                csr = coo_to_csr(
+                    np.concatenate([np.zeros(0, dtype=np.int64)] + rows),
+                    np.concatenate([np.zeros(0, dtype=np.int32)] + [indices for _, indices, _ in parts]),
+                    np.concatenate([np.zeros(0)] + [data for _, _, data in parts]),
+                    len(self.nodes),
+                )
+
+        with self._lock:
+            self._cache[key] = csr
+            while len(self._cache) > self.MAX_CACHED:
+                self._cache.popitem(last=False)
+        return csr
+
+    def partition(self, selected_types, seed=LOUVAIN_SEED):
+        """
+        Louvain communities of the graph restricted to some edge types, see `louvain`.
+
+        Only nodes with at least one edge of the selected types are partitioned, as in the
+        filtered graph the knowledge graph view draws.
+
+        Parameters:
+            selected_types (Iterable[str]): Edge types to include.
+            seed (int): Seed of the community detection.
+
+        Returns:
+            dict: Mapping of node id to community number.
+        """
+        indptr, indices, data = self.adjacency(selected_types)
+        active = np.flatnonzero(np.diff(indptr))
+        if not len(active):
+            return {}
+
+        # Drop the empty rows of inactive nodes; the entries stay as they are, only columns are renumbered
+        position = np.full(len(self.nodes), -1, dtype=np.int32)
+        position[active] = np.arange(len(active), dtype=np.int32)
+        with stage("louvain"):
+            communities = louvain(np.r_[indptr[active], indptr[-1]], position[indices], data, seed=seed)
+        return {self.nodes[node]: int(community) for node, community in zip(active.tolist(), communities.tolist())}
+
+    def neighbours(self, node, selected_types):
+        """
+        Neighbours of a node over some edge types, with the number of edges to each.
+
+        Parameters:
+            node (int): Matrix row of the node.
+            selected_types (Iterable[str]): Edge types to follow.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Neighbour rows, sorted, and their summed edge weights.
+        """
+        parts = []
+        for etype in selected_types:
+            if etype in self.csr_by_type:
+                indptr, indices, data = self.csr_by_type[etype]
+                parts.append((indices[indptr[node] : indptr[node + 1]], data[indptr[node] : indptr[node + 1]]))
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+        neighbours, inverse = np.unique(np.concatenate([indices for indices, _ in parts]), return_inverse=True)
+        return neighbours, np.bincount(inverse, weights=np.concatenate([data for _, data in parts]))
+
+    def ego(self, center, selected_types, hops, max_degree=None):
+        """
+        Nodes within `hops` edges of a node, by breadth-first search over the selected types.
+
+        Parameters:
+            center (str): Node id to start from.
+            selected_types (Iterable[str]): Edge types to follow.
+            hops (int): Maximum distance from the center.
+            max_degree (int, optional): Follow at most this many edges per node, strongest (most
+                parallel edges) first, so hubs do not pull in most of the graph.
+
+        Returns:
+            List[str]: Node ids, the center first, then by distance. Empty if the center is unknown.
+        """
+        if center not in self.node_index:
+            return []
+        selected_types = set(selected_types)
+        start = self.node_index[center]
+        seen = np.zeros(len(self.nodes), dtype=bool)
+        seen[start] = True
+        order = [start]
+        frontier = [start]
+        with stage("ego_bfs"):
+            for _ in range(hops):
+                reached = []
+                for node in frontier:
+                    neighbours, weights = self.neighbours(node, selected_types)
+                    if max_degree is not None and len(neighbours) > max_degree:
+                        neighbours = neighbours[np.argsort(-weights, kind="stable")[:max_degree]]
+                    neighbours = neighbours[~seen[neighbours]]
+                    seen[neighbours] = True
+                    reached.extend(neighbours.tolist())
+                if not reached:
+                    break
+                order.extend(reached)
+                frontier = reached
+        return [self.nodes[node] for node in order]
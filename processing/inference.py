@@ -0,0 +1,544 @@
+"""
+Model inference for the NLP panels: DeBERTa aspect-based sentiment and distilbert keyphrase extraction.
+
+The models can run in the Dash process (`BatchedInference`) or in one shared local server
+process (`serve`, reached through `InferenceClient` over a Unix socket). In both cases,
+concurrent requests are grouped into micro-batches: a batch is run as soon as it holds
+`max_batch` items or the oldest request has waited `max_wait` seconds.
+
+Run a server with:
+    python -m processing.inference --socket /tmp/bias-hunter-inference.sock
+"""
+
+import argparse
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import (
+    AutoModelForSequenceClassification,
+    AutoModelForTokenClassification,
+    AutoTokenizer,
+    TokenClassificationPipeline,
+)
+from transformers.pipelines import AggregationStrategy
+
+from processing.corpus_index import custom_sentence_split
+from processing.tokenization import TokenCache, concatenation_parity, load_absa_tokenizer, tokenizer_parity
+from utils.metrics import REGISTRY, stage
+
+ABSA_MODEL = "yangheng/deberta-v3-base-absa-v1.1"
+KEYPHRASE_MODEL = "ml6team/keyphrase-extraction-distilbert-inspec"
+
+# Inference configuration, overridable through the environment
+INFERENCE_SOCKET_ENV = "BIAS_HUNTER_INFERENCE_SOCKET"
+INFERENCE_SPAWN_ENV = "BIAS_HUNTER_INFERENCE_SPAWN"
+INFERENCE_AUTHKEY_ENV = "BIAS_HUNTER_INFERENCE_AUTHKEY"
+INFERENCE_MAX_BATCH_ENV = "BIAS_HUNTER_INFERENCE_MAX_BATCH"
+INFERENCE_MAX_WAIT_MS_ENV = "BIAS_HUNTER_INFERENCE_MAX_WAIT_MS"
+KEYPHRASE_BATCH_ENV = "BIAS_HUNTER_KEYPHRASE_BATCH"
+KEYPHRASE_STRIDE_ENV = "BIAS_HUNTER_KEYPHRASE_STRIDE"
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 10
+DEFAULT_KEYPHRASE_BATCH = 16
+DEFAULT_KEYPHRASE_STRIDE = 64
+
+BATCH_SIZE = REGISTRY.histogram(
+    "bias_hunter_inference_batch_size",
+    "Items per inference micro-batch.",
+    ("model",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+
+class KeyphraseExtractionPipeline(TokenClassificationPipeline):
+    """
+    Custom pipeline for keyphrase extraction using a token classification model.
+
+    Extends the Hugging Face TokenClassificationPipeline and applies
+    first-token aggregation strategy to extract unique keyphrases from text.
+    """
+
+    def __init__(self, model, *args, **kwargs):
+        """
+        Initializes the pipeline with a pretrained model and tokenizer.
+
+        Parameters:
+            model (str): The model name or path to load.
+            *args: Additional positional arguments.
+            **kwargs: Additional keyword arguments.
+        """
+        super().__init__(
+            model=AutoModelForTokenClassification.from_pretrained(model),
+            tokenizer=AutoTokenizer.from_pretrained(model),
+            *args,
+            **kwargs,
+        )
+
+    def postprocess(self, all_outputs, **kwargs):
+        """
+        Postprocesses the raw token classification outputs.
+
+        Applies aggregation strategy and returns unique keyphrases.
+
+        Parameters:
+            all_outputs (List): Raw model outputs from token classification.
+
+        Returns:
+            np.ndarray: Array of unique extracted keyphrases as strings.
+        """
+        results = super().postprocess(
+            all_outputs=all_outputs,
+            aggregation_strategy=AggregationStrategy.FIRST,
+        )
+        return np.unique([result.get("word").strip() for result in results])
+
+
+class InferenceModels:
+    """
+    Owns the ABSA and keyphrase models and runs them on lists of inputs.
+
+    Attributes:
+        absa_model_name (str): Hugging Face id of the ABSA model.
+        keyphrase_model_name (str): Hugging Face id of the keyphrase model.
+        keyphrase_batch_size (int): Texts per keyphrase forward pass.
+        keyphrase_stride (int): Tokens of overlap between the windows a long text is split into.
+            0 disables windowing, in which case texts longer than the model's maximum length fail.
+        tokenizer: ABSA tokenizer, the fast one if it matches the slow one (see load_absa_tokenizer).
+        token_cache (TokenCache): Token ids of the sentences and phrases classified so far.
+    """
+
+    def __init__(
+        self,
+        absa_model_name=ABSA_MODEL,
+        keyphrase_model_name=KEYPHRASE_MODEL,
+        keyphrase_batch_size=None,
+        keyphrase_stride=None,
+    ):
+        self.absa_model_name = absa_model_name
+        self.keyphrase_model_name = keyphrase_model_name
+        self.keyphrase_batch_size = keyphrase_batch_size or int(
+            os.environ.get(KEYPHRASE_BATCH_ENV, DEFAULT_KEYPHRASE_BATCH)
+        )
+        if keyphrase_stride is None:
+            keyphrase_stride = int(os.environ.get(KEYPHRASE_STRIDE_ENV, DEFAULT_KEYPHRASE_STRIDE))
+        self.keyphrase_stride = keyphrase_stride
+        self.tokenizer = load_absa_tokenizer(absa_model_name)
+        self.token_cache = TokenCache(self.tokenizer)
+        self.polarity_model = AutoModelForSequenceClassification.from_pretrained(absa_model_name)
+        self.polarity_model.eval()
+        self.keyphrase_extractor = KeyphraseExtractionPipeline(model=keyphrase_model_name)
+
+    def absa_probs(self, pairs, batch_size=DEFAULT_MAX_BATCH):
+        """
+        Aspect sentiment probabilities for (text, aspect) pairs.
+
+        A text is either a string or a list of sentences, which is classified as the sentences
+        joined by spaces. Texts are tokenized through the token cache, then pairs are sorted by
+        length and run in padded batches, and returned in input order.
+
+        Parameters:
+            pairs (List[Tuple[str or List[str], str]]): (text, aspect) pairs.
+            batch_size (int): Pairs per forward pass.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(pairs), 3) with negative, neutral and positive probabilities.
+        """
+        probs = np.zeros((len(pairs), 3), dtype=np.float32)
+        encoded = self.token_cache.encode_pairs(pairs)
+        pad_id = self.tokenizer.pad_token_id
+        order = sorted(range(len(pairs)), key=lambda i: len(encoded[i][0]))
+        for start in range(0, len(order), batch_size):
+            idx = order[start : start + batch_size]
+            width = max(len(encoded[i][0]) for i in idx)
+            input_ids = torch.full((len(idx), width), pad_id, dtype=torch.long)
+            token_type_ids = torch.zeros((len(idx), width), dtype=torch.long)
+            attention_mask = torch.zeros((len(idx), width), dtype=torch.long)
+            for row, i in enumerate(idx):
+                ids, type_ids = encoded[i]
+                input_ids[row, : len(ids)] = torch.tensor(ids)
+                token_type_ids[row, : len(ids)] = torch.tensor(type_ids)
+                attention_mask[row, : len(ids)] = 1
+            with stage("absa"):
+                with torch.no_grad():
+                    logits = self.polarity_model(
+                        input_ids=input_ids, token_type_ids=token_type_ids, attention_mask=attention_mask
+                    ).logits
+            probs[idx] = F.softmax(logits, dim=1).numpy()
+        return probs
+
+    def keyphrases(self, texts):
+        """
+        Keyphrases of each text.
+
+        All texts go through the pipeline in one call, in batches of `keyphrase_batch_size`.
+        Texts longer than the model's maximum length are split into overlapping windows
+        (`keyphrase_stride` tokens of overlap) whose phrases are merged back per text.
+        Any number of texts can be passed, from one heatmap cell up to the whole corpus.
+
+        Parameters:
+            texts (List[str]): Texts to extract from.
+
+        Returns:
+            List[List[str]]: Unique keyphrases per text, in input order.
+        """
+        texts = list(texts)
+        keyphrases = [[] for _ in texts]
+        non_empty = [i for i, text in enumerate(texts) if text.strip()]
+        if not non_empty:
+            return keyphrases
+
+        options = {"batch_size": self.keyphrase_batch_size}
+        if self.keyphrase_stride:
+            options["stride"] = self.keyphrase_stride
+        with stage("keyphrase_model"):
+            results = self.keyphrase_extractor([texts[i] for i in non_empty], **options)
+        for i, phrases in zip(non_empty, results):
+            keyphrases[i] = [str(phrase) for phrase in np.asarray(phrases).tolist()]
+        return keyphrases
+
+
+class MicroBatcher:
+    """
+    Groups list-valued requests from many threads into batches for one function.
+
+    Each `submit(items)` is queued; a worker thread takes requests until the batch holds
+    `max_batch` items or the oldest request has waited `max_wait` seconds, calls
+    `fn(all_items)` once, and hands each caller its slice of the results.
+    """
+
+    def __init__(self, name, fn, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT_MS / 1000):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._worker.start()
+
+    def submit(self, items):
+        """
+        Queue a request.
+
+        Parameters:
+            items (list): Inputs of this request.
+
+        Returns:
+            Future: Resolves to the list of results for `items`.
+        """
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+        self._queue.put((list(items), future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+
+            batch = [(items, future) for items, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            BATCH_SIZE.observe(size, self.name)
+            try:
+                results = self.fn([item for items, _ in batch for item in items])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for items, future in batch:
+                future.set_result(results[offset : offset + len(items)])
+                offset += len(items)
+
+
+class BatchedInference:
+    """
+    In-process inference with micro-batching across the Dash worker's request threads.
+    """
+
+    def __init__(self, models=None, max_batch=None, max_wait=None):
+        """
+        Parameters:
+            models (InferenceModels, optional): Models to run. Loaded on construction if omitted.
+            max_batch (int, optional): Defaults to BIAS_HUNTER_INFERENCE_MAX_BATCH or 32.
+            max_wait (float, optional): Seconds. Defaults to BIAS_HUNTER_INFERENCE_MAX_WAIT_MS or 10 ms.
+        """
+        self.models = models or InferenceModels()
+        max_batch = max_batch or int(os.environ.get(INFERENCE_MAX_BATCH_ENV, DEFAULT_MAX_BATCH))
+        if max_wait is None:
+            max_wait = float(os.environ.get(INFERENCE_MAX_WAIT_MS_ENV, DEFAULT_MAX_WAIT_MS)) / 1000
+        self._batchers = {
+            "absa": MicroBatcher("absa", lambda pairs: list(self.models.absa_probs(pairs)), max_batch, max_wait),
+            "keyphrases": MicroBatcher("keyphrases", self.models.keyphrases, max_batch, max_wait),
+        }
+
+    def call(self, method, items):
+        if method not in self._batchers:
+            raise ValueError(f"Unknown inference method {method!r}")
+        return self._batchers[method].submit(items)
+
+    def absa_probs(self, pairs):
+        """
+        See InferenceModels.absa_probs.
+        """
+        return np.array(self.call("absa", pairs).result(), dtype=np.float32).reshape(-1, 3)
+
+    def keyphrases(self, texts):
+        """
+        See InferenceModels.keyphrases.
+        """
+        return self.call("keyphrases", texts).result()
+
+
+def _authkey():
+    """
+    Shared secret of the inference server and its clients, from BIAS_HUNTER_INFERENCE_AUTHKEY.
+
+    Raises:
+        RuntimeError: If BIAS_HUNTER_INFERENCE_AUTHKEY is not set.
+    """
+    authkey = os.environ.get(INFERENCE_AUTHKEY_ENV)
+    if not authkey:
+        raise RuntimeError(f"Set {INFERENCE_AUTHKEY_ENV} to a secret shared by the inference server and its clients")
+    return authkey.encode()
+
+
+class InferenceClient:
+    """
+    Thin client for a shared inference server, with the same interface as BatchedInference.
+
+    One connection is shared by all threads of the process; requests carry ids, and a reader
+    thread resolves the matching futures, so concurrent requests are in flight together and
+    can land in the same server-side batch.
+    """
+
+    # Seconds to wait for a spawned server to start listening
+    CONNECT_TIMEOUT = 300
+
+    def __init__(self, socket_path, spawn=False):
+        """
+        Parameters:
+            socket_path (str): Unix socket of the server.
+            spawn (bool): Start a server process if none is listening. Without
+                BIAS_HUNTER_INFERENCE_AUTHKEY, a random key is generated and handed to that server,
+                so only this client can connect to it.
+
+        Raises:
+            RuntimeError: If BIAS_HUNTER_INFERENCE_AUTHKEY is not set and spawn is False.
+        """
+        self.socket_path = socket_path
+        self.spawn = spawn
+        if spawn and not os.environ.get(INFERENCE_AUTHKEY_ENV):
+            self._authkey = secrets.token_hex(32).encode()
+        else:
+            self._authkey = _authkey()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pending = {}
+        self._next_id = 0
+
+    def _connect(self):
+        deadline = time.monotonic() + self.CONNECT_TIMEOUT
+        spawned = False
+        while True:
+            try:
+                return Client(self.socket_path, family="AF_UNIX", authkey=self._authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.spawn or time.monotonic() > deadline:
+                    raise
+                if not spawned:
+                    # The key goes through the environment, which other users cannot read, not argv
+                    subprocess.Popen(
+                        [sys.executable, "-m", "processing.inference", "--socket", self.socket_path],
+                        env={**os.environ, INFERENCE_AUTHKEY_ENV: self._authkey.decode()},
+                        start_new_session=True,
+                    )
+                    spawned = True
+                time.sleep(0.5)
+
+    def _read(self, conn):
+        try:
+            while True:
+                request_id, ok, result = conn.recv()
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None:
+                    future.set_result(result) if ok else future.set_exception(RuntimeError(result))
+        except (EOFError, OSError) as e:
+            with self._lock:
+                if self._conn is conn:
+                    self._conn = None
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError(f"Inference server connection lost: {e}"))
+
+    def call(self, method, items):
+        future = Future()
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+                threading.Thread(target=self._read, args=(self._conn,), name="inference-client", daemon=True).start()
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = future
+            self._conn.send((request_id, method, list(items)))
+        return future
+
+    def absa_probs(self, pairs):
+        """
+        See InferenceModels.absa_probs.
+        """
+        return np.array(self.call("absa", pairs).result(), dtype=np.float32).reshape(-1, 3)
+
+    def keyphrases(self, texts):
+        """
+        See InferenceModels.keyphrases.
+        """
+        return self.call("keyphrases", texts).result()
+
+
+def serve(socket_path, inference=None):
+    """
+    Serve inference requests on a Unix socket until the process is killed.
+
+    Every connection gets a reader thread; requests from all connections share the micro-batchers.
+    Clients must authenticate with BIAS_HUNTER_INFERENCE_AUTHKEY.
+
+    Parameters:
+        socket_path (str): Unix socket path. A stale socket file left by a dead server is replaced.
+        inference (BatchedInference, optional): Defaults to loading the models.
+
+    Raises:
+        RuntimeError: If BIAS_HUNTER_INFERENCE_AUTHKEY is not set.
+    """
+    authkey = _authkey()
+    if os.path.exists(socket_path):
+        try:
+            Client(socket_path, family="AF_UNIX", authkey=authkey).close()
+            print(f"An inference server is already listening on {socket_path}")
+            return
+        except AuthenticationError:
+            print(f"An inference server with a different {INFERENCE_AUTHKEY_ENV} is listening on {socket_path}")
+            return
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(socket_path)
+
+    inference = inference or BatchedInference()
+    listener = Listener(socket_path, family="AF_UNIX", authkey=authkey)
+    os.chmod(socket_path, 0o600)
+    print(f"Inference server listening on {socket_path}")
+
+    def handle(conn):
+        send_lock = threading.Lock()
+
+        def reply(request_id, future):
+            error = future.exception()
+            result = (request_id, False, str(error)) if error else (request_id, True, future.result())
+            with send_lock:
+                try:
+                    conn.send(result)
+                except OSError:
+                    pass
+
+        try:
+            while True:
+                request_id, method, items = conn.recv()
+                try:
+                    future = inference.call(method, items)
+                except ValueError as e:
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(lambda f, request_id=request_id: reply(request_id, f))
+        except (EOFError, OSError):
+            conn.close()
+
+    while True:
+        try:
+            conn = listener.accept()
+        except (AuthenticationError, OSError) as e:
+            # A client with the wrong key must not stop the server
+            print(f"Could not accept inference client: {e}")
+            continue
+        threading.Thread(target=handle, args=(conn,), name="inference-conn", daemon=True).start()
+
+
+def inference_backend():
+    """
+    Choose the inference backend for this process.
+
+    Returns an InferenceClient when BIAS_HUNTER_INFERENCE_SOCKET is set (spawning the server on
+    first use if BIAS_HUNTER_INFERENCE_SPAWN is set), otherwise in-process BatchedInference.
+    """
+    socket_path = os.environ.get(INFERENCE_SOCKET_ENV)
+    if socket_path:
+        spawn = os.environ.get(INFERENCE_SPAWN_ENV, "").strip().lower() in {"1", "true", "yes", "on"}
+        return InferenceClient(socket_path, spawn=spawn)
+    return BatchedInference()
+
+
+def check_tokenizer(articles_dir, model_name=ABSA_MODEL):
+    """
+    Check that the fast ABSA tokenizer matches the slow one, and that concatenating the fast
+    tokenizer's ids of separate sentences matches tokenizing them joined, on every sentence of
+    the corpus, each paired with its article's first sentence as a stand-in aspect.
+
+    Returns:
+        Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]: (text, aspect) pairs where the fast
+        and slow tokenizers differ, and pairs where the concatenated ids differ.
+    """
+    slow_tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
+    fast_tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    pairs = []
+    for name in sorted(os.listdir(articles_dir)):
+        if name.endswith(".txt"):
+            with open(os.path.join(articles_dir, name), "r") as f:
+                sentences = custom_sentence_split(f.read())
+            if not sentences:
+                continue
+            pairs.extend((sentence, sentences[0][:40]) for sentence in sentences)
+            pairs.append((sentences, name[:-4]))
+    return tokenizer_parity(slow_tokenizer, fast_tokenizer, pairs), concatenation_parity(fast_tokenizer, pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared inference server for the NLP panels.")
+    parser.add_argument("--socket", default=os.environ.get(INFERENCE_SOCKET_ENV, "/tmp/bias-hunter-inference.sock"))
+    parser.add_argument(
+        "--check-tokenizer",
+        metavar="ARTICLES_DIR",
+        help="Check the fast ABSA tokenizer and sentence concatenation on every sentence of the corpus and exit.",
+    )
+    args = parser.parse_args()
+    if args.check_tokenizer:
+        fast_mismatches, concatenation_mismatches = check_tokenizer(args.check_tokenizer)
+        for kind, mismatches in (("Fast vs slow", fast_mismatches), ("Concatenated", concatenation_mismatches)):
+            for text, aspect in mismatches[:20]:
+                print(f"{kind} mismatch: {aspect!r} / {text[:100]!r}")
+            print(f"{len(mismatches)} pairs where {kind.lower()} tokens differ")
+        sys.exit(1 if fast_mismatches or concatenation_mismatches else 0)
+    serve(args.socket)
@@ -0,0 +1,418 @@
+import json
+import os
+import re
+import shutil
+from array import array
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from utils.metrics import stage
+from utils.result_cache import file_sha256
+
+# Ingest configuration, overridable through the environment
+INGEST_DIR_ENV = "BIAS_HUNTER_INGEST_DIR"
+INGEST_STREAM_MB_ENV = "BIAS_HUNTER_INGEST_STREAM_MB"
+
+DEFAULT_INGEST_DIR = ".cache/ingest"
+DEFAULT_INGEST_STREAM_MB = 64
+
+# Bump when the on-disk layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+
+TABLES = ("nodes", "links")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JsonStream:
+    """
+    Incremental reader for one JSON document, decoding one value at a time from a
+    fixed-size window so arrays can be consumed element by element.
+    """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or "" at the end of the input.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r} while parsing node-link JSON")
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number ending exactly at the window edge may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def iter_node_link(f, chunk_size=1 << 20):
+    """
+    Stream a node-link JSON document without loading it into memory.
+
+    Parameters:
+        f (TextIO): Open text file positioned at the start of the document.
+        chunk_size (int): Characters read per refill.
+
+    Yields:
+        Tuple[str, Any]: ("nodes", record) and ("links", record) for every array element, and
+        (key, value) for any other top-level key such as "directed" or "multigraph".
+    """
+    stream = _JsonStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key in TABLES and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield key, stream.value()
+                    if stream.peek() == ",":
+                        stream.pos += 1
+                        continue
+                    stream.expect("]")
+                    break
+        else:
+            yield key, stream.value()
+
+        if stream.peek() == ",":
+            stream.pos += 1
+            continue
+        stream.expect("}")
+        return
+
+
+def _dictionary_key(value):
+    """
+    Hashable key for a JSON value that keeps 1, 1.0 and True apart.
+    """
+    if type(value) is str:
+        return value
+    if isinstance(value, (dict, list)):
+        return ("json", json.dumps(value, sort_keys=True))
+    return (type(value).__name__, value)
+
+
+def _dictionary_value(key):
+    """
+    Inverse of _dictionary_key.
+    """
+    if type(key) is str:
+        return key
+    return json.loads(key[1]) if key[0] == "json" else key[1]
+
+
+class _ColumnBuilder:
+    """
+    Accumulates records into dictionary-encoded columns: one int32 code per row plus the
+    distinct values, so memory grows with the number of rows, not the size of the JSON.
+    """
+
+    def __init__(self):
+        self.n_rows = 0
+        self.columns = {}
+
+    def append(self, record):
+        for name in record:
+            if name not in self.columns:
+                self.columns[name] = ({}, array("i", [-1]) * self.n_rows)
+
+        for name, (dictionary, codes) in self.columns.items():
+            value = record.get(name)
+            if value is None:
+                codes.append(-1)
+                continue
+            key = _dictionary_key(value)
+            code = dictionary.get(key)
+            if code is None:
+                code = dictionary[key] = len(dictionary)
+            codes.append(code)
+        self.n_rows += 1
+
+    def write(self, directory, table):
+        """
+        Save every column as `<table>.<i>.codes.npy` plus its distinct values, and return the column metadata.
+        """
+        columns = []
+        for i, (name, (dictionary, codes)) in enumerate(self.columns.items()):
+            base = os.path.join(directory, f"{table}.{i}")
+            codes = np.frombuffer(codes, dtype=np.int32) if len(codes) else np.empty(0, np.int32)
+
+            keys = list(dictionary)
+            if all(type(key) is str for key in keys):
+                kind = "str"
+                # Sorted, so the categorical groups and sorts like the plain strings would
+                order = sorted(range(len(keys)), key=keys.__getitem__)
+                rank = np.empty(len(keys) + 1, dtype=np.int32)
+                rank[order] = np.arange(len(keys), dtype=np.int32)
+                rank[-1] = -1
+                codes = rank[codes]
+                keys = [keys[j] for j in order]
+                np.save(f"{base}.categories.npy", np.array(keys, dtype=str) if keys else np.empty(0, dtype="<U1"))
+            elif all(type(key) is tuple and key[0] == "int" for key in keys):
+                kind = "int"
+                np.save(f"{base}.categories.npy", np.array([key[1] for key in keys], dtype=np.int64))
+            elif all(type(key) is tuple and key[0] in ("int", "float") for key in keys):
+                kind = "float"
+                np.save(f"{base}.categories.npy", np.array([key[1] for key in keys], dtype=np.float64))
+            else:
+                kind = "json"
+                values = [_dictionary_value(key) for key in keys]
+                with open(f"{base}.categories.json", "w") as f:
+                    json.dump(values, f)
+            np.save(f"{base}.codes.npy", codes)
+            columns.append({"name": name, "kind": kind})
+        return {"rows": self.n_rows, "columns": columns}
+
+
+def _read_column(base, kind):
+    """
+    Load one stored column; missing values (code -1) become NaN.
+
+    The int32 codes are memory-mapped. String columns become a pd.Categorical over them, so
+    rows share the distinct strings instead of holding one Python object each; pandas keeps
+    the mapped codes as they are for columns with many distinct values and narrows them to
+    int8 or int16 otherwise. Numeric columns are decoded into plain arrays, and "json" columns
+    (lists, objects or mixed types) into object arrays, since their values cannot be categories.
+    """
+    codes = np.load(f"{base}.codes.npy", mmap_mode="r")
+    if kind == "json":
+        with open(f"{base}.categories.json") as f:
+            values = json.load(f)
+        categories = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            categories[i] = value
+        # Index -1 picks the trailing NaN
+        return np.append(categories, np.nan)[codes]
+
+    categories = np.load(f"{base}.categories.npy")
+    if kind == "str":
+        return pd.Categorical.from_codes(codes, categories=categories.astype(object))
+    if len(codes) == 0 or codes.min() >= 0:
+        return categories[codes]
+    return np.append(categories.astype(np.float64), np.nan)[codes]
+
+
+class GraphTables:
+    """
+    Node and link tables of a node-link graph, loaded from a columnar snapshot.
+
+    Attributes:
+        nodes (pd.DataFrame): One row per node, one column per node attribute.
+        links (pd.DataFrame): One row per link, one column per link attribute.
+        graph_attrs (dict): Top-level keys other than nodes and links ("directed", "multigraph", "graph").
+        source_hash (str): SHA-256 of the JSON file the tables were built from.
+    """
+
+    def __init__(self, nodes, links, graph_attrs, source_hash):
+        self.nodes = nodes
+        self.links = links
+        self.graph_attrs = graph_attrs
+        self.source_hash = source_hash
+
+    def to_networkx(self):
+        """
+        Build the NetworkX graph that `nx.node_link_graph(data, edges="links")` would build.
+
+        Returns:
+            networkx.Graph: Graph of the class given by the "directed" and "multigraph" flags.
+        """
+        directed = self.graph_attrs.get("directed", False)
+        multigraph = self.graph_attrs.get("multigraph", False)
+        graph_class = {
+            (True, True): nx.MultiDiGraph,
+            (False, True): nx.MultiGraph,
+            (True, False): nx.DiGraph,
+            (False, False): nx.Graph,
+        }[(bool(directed), bool(multigraph))]
+        G = graph_class()
+        G.graph.update(self.graph_attrs.get("graph") or {})
+        add_records_to_graph(G, self.nodes, self.links)
+        return G
+
+
+def add_records_to_graph(G, nodes, links):
+    """
+    Add node and link rows to a NetworkX graph the way `nx.node_link_graph` would.
+
+    Missing (NaN) attributes are left out.
+
+    Parameters:
+        G (networkx.Graph): Graph to extend in place.
+        nodes (pd.DataFrame or None): Node rows with an "id" column.
+        links (pd.DataFrame): Link rows with "source" and "target" (and "key" for multigraphs) columns.
+    """
+
+    def present(record, exclude):
+        return {k: v for k, v in record.items() if k not in exclude and v is not None and v == v}
+
+    for record in [] if nodes is None else nodes.to_dict("records"):
+        G.add_node(record["id"], **present(record, ("id",)))
+
+    for record in links.to_dict("records"):
+        attrs = present(record, ("source", "target", "key"))
+        if G.is_multigraph():
+            key = record.get("key")
+            key = None if key is None or key != key else int(key) if isinstance(key, float) else key
+            G.add_edge(record["source"], record["target"], key=key, **attrs)
+        else:
+            G.add_edge(record["source"], record["target"], **attrs)
+
+
+def _build_snapshot(data_path, directory, stream):
+    """
+    Parse a node-link JSON file into column files under `directory`. meta.json records the
+    absolute path of the file, so that only snapshots of the same file are replaced later.
+    """
+    builders = {table: _ColumnBuilder() for table in TABLES}
+    graph_attrs = {}
+    with open(data_path, "r", encoding="utf-8") as f:
+        if stream:
+            items = iter_node_link(f)
+        else:
+            data = json.load(f)
+            items = ((table, record) for table in TABLES for record in data.get(table, []))
+            graph_attrs = {key: value for key, value in data.items() if key not in TABLES}
+        for key, value in items:
+            if key in builders:
+                builders[key].append(value)
+            else:
+                graph_attrs[key] = value
+
+    meta = {"format": SNAPSHOT_FORMAT, "source": os.path.abspath(data_path), "graph_attrs": graph_attrs}
+    for table, builder in builders.items():
+        meta[table] = builder.write(directory, table)
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def _snapshot_source(directory):
+    """
+    Absolute path of the JSON file a snapshot was built from, or None if it is unknown.
+    """
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f).get("source")
+    except (OSError, ValueError):
+        return None
+
+
+def _read_snapshot(directory, source_hash):
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Snapshot format {meta.get('format')} != {SNAPSHOT_FORMAT}")
+
+    frames = {}
+    for table in TABLES:
+        table_meta = meta[table]
+        frames[table] = pd.DataFrame(
+            {
+                column["name"]: _read_column(os.path.join(directory, f"{table}.{i}"), column["kind"])
+                for i, column in enumerate(table_meta["columns"])
+            },
+            index=pd.RangeIndex(table_meta["rows"]),
+        )
+    return GraphTables(frames["nodes"], frames["links"], meta["graph_attrs"], source_hash)
+
+
+def load_graph_tables(data_path, ingest_dir=None, stream=None):
+    """
+    Load a node-link JSON file as node and link DataFrames, via a columnar snapshot.
+
+    The first load parses the JSON and writes one `.npy` file of int32 codes plus one file of
+    distinct values per column into `<ingest_dir>/<hash of the file>/`. Later loads of the same
+    file memory-map those codes instead of parsing JSON; string columns are categoricals over
+    them (see _read_column). Files larger than BIAS_HUNTER_INGEST_STREAM_MB (default 64) are
+    parsed incrementally, so ingest memory is bounded by the encoded columns rather than the
+    Python objects of the whole document.
+
+    Parameters:
+        data_path (str): Path of mc1.json.
+        ingest_dir (str, optional): Snapshot root. Defaults to BIAS_HUNTER_INGEST_DIR or .cache/ingest.
+        stream (bool, optional): Force or disable the streaming parser. Defaults to choosing by file size.
+
+    Returns:
+        GraphTables: The node and link tables.
+    """
+    ingest_dir = ingest_dir or os.environ.get(INGEST_DIR_ENV, DEFAULT_INGEST_DIR)
+    with stage("ingest_hash"):
+        source_hash = file_sha256(data_path)
+    directory = os.path.join(ingest_dir, source_hash[:16])
+
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        try:
+            with stage("ingest_load"):
+                return _read_snapshot(directory, source_hash)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Rebuilding unreadable ingest snapshot {directory}: {e}")
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if stream is None:
+        threshold = float(os.environ.get(INGEST_STREAM_MB_ENV, DEFAULT_INGEST_STREAM_MB)) * 1e6
+        stream = os.path.getsize(data_path) > threshold
+
+    os.makedirs(ingest_dir, exist_ok=True)
+    tmp_directory = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+    with stage("ingest_build"):
+        _build_snapshot(data_path, tmp_directory, stream)
+    try:
+        os.replace(tmp_directory, directory)
+    except OSError:
+        # Another process finished the same snapshot first
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    # Snapshots of earlier versions of the same file are no longer needed; other files' snapshots are kept
+    source = os.path.abspath(data_path)
+    for entry in os.scandir(ingest_dir):
+        if entry.is_dir() and entry.path != directory and ".tmp-" not in entry.name:
+            if _snapshot_source(entry.path) == source:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    with stage("ingest_load"):
+        return _read_snapshot(directory, source_hash)
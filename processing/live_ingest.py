@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+from processing.ingest import load_graph_tables
+from utils.metrics import REGISTRY
+
+# Polling interval in seconds, overridable through the environment; 0 disables the watcher
+WATCH_INTERVAL_ENV = "BIAS_HUNTER_WATCH_INTERVAL"
+DEFAULT_WATCH_INTERVAL = 5.0
+
+# Link columns compared to check that earlier links were left untouched
+IDENTITY_COLUMNS = ("source", "target", "type", "_date_added", "_articleid")
+
+LIVE_UPDATES = REGISTRY.counter(
+    "bias_hunter_live_updates_total", "Deltas applied by the dataset watcher.", ("kind",)
+)
+
+
+def watch_interval():
+    """
+    Seconds between dataset polls, from BIAS_HUNTER_WATCH_INTERVAL.
+    """
+    return float(os.environ.get(WATCH_INTERVAL_ENV, DEFAULT_WATCH_INTERVAL))
+
+
+def _row_hashes(df):
+    columns = [column for column in IDENTITY_COLUMNS if column in df.columns]
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False).to_numpy()
+
+
+class DatasetWatcher(threading.Thread):
+    """
+    Background thread that picks up links appended to mc1.json and article files added,
+    rewritten or removed in the articles directory, and hands them over as deltas.
+
+    Only appends to the link and node lists are applied. If earlier links change or
+    disappear, the watcher reports it and leaves the running state alone; a restart
+    rebuilds everything. If `on_links` raises, the appended links count as not applied yet
+    and are handed over again on the next poll.
+    """
+
+    def __init__(self, data_path, articles_dir, nodes, links, known_articles, on_links, on_articles, interval=None):
+        """
+        Parameters:
+            data_path (str): Path of mc1.json.
+            articles_dir (str): Directory containing the article files.
+            nodes (pd.DataFrame): Raw node rows the running state was built from.
+            links (pd.DataFrame): Raw link rows the running state was built from.
+            known_articles (Iterable[str]): Article ids already indexed.
+            on_links (Callable[[pd.DataFrame, pd.DataFrame], None]): Called with (new_nodes, new_links).
+                Must apply them all or, by raising, none.
+            on_articles (Callable[[List[str], List[str]], None]): Called with (changed_ids, removed_ids).
+            interval (float, optional): Seconds between polls. Defaults to BIAS_HUNTER_WATCH_INTERVAL or 5.
+        """
+        super().__init__(name="dataset-watcher", daemon=True)
+        self.data_path = data_path
+        self.articles_dir = articles_dir
+        self.on_links = on_links
+        self.on_articles = on_articles
+        self.interval = watch_interval() if interval is None else interval
+
+        self._n_nodes = len(nodes)
+        self._link_hashes = _row_hashes(links)
+        self._data_stat = None  # Compare on the first poll, in case the file changed since startup
+        known = set(known_articles)
+        self._article_stats = {
+            article_id: stat for article_id, stat in self._scan_articles().items() if article_id in known
+        }
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _scan_articles(self):
+        if not os.path.isdir(self.articles_dir):
+            return {}
+        return {
+            entry.name[:-4]: (entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(self.articles_dir)
+            if entry.name.endswith(".txt")
+        }
+
+    def stop(self):
+        self._stop_event.set()
+
+    def poll_links(self):
+        """
+        Apply links and nodes appended to the data file since the last poll.
+        """
+        stat = self._stat(self.data_path)
+        if stat is None or stat == self._data_stat:
+            return
+
+        try:
+            tables = load_graph_tables(self.data_path)
+        except (ValueError, json.JSONDecodeError) as e:
+            # Most likely caught mid-write; retry on the next poll
+            print(f"Skipping unreadable {self.data_path}: {e}")
+            return
+
+        n_links = len(self._link_hashes)
+        link_hashes = _row_hashes(tables.links)
+        if len(link_hashes) < n_links or not (link_hashes[:n_links] == self._link_hashes).all():
+            print(f"{self.data_path} changed other than by appending links; restart to pick up the changes")
+            self._data_stat = stat
+            return
+        if len(tables.nodes) < self._n_nodes:
+            print(f"{self.data_path} lost nodes; restart to pick up the changes")
+            self._data_stat = stat
+            return
+
+        new_nodes = tables.nodes.iloc[self._n_nodes :]
+        new_links = tables.links.iloc[n_links:]
+        if len(new_nodes) or len(new_links):
+            # If this raises, nothing below is updated and the next poll hands over the same rows again
+            self.on_links(new_nodes, new_links)
+            LIVE_UPDATES.inc("links", amount=len(new_links))
+        self._data_stat = stat
+        self._n_nodes = len(tables.nodes)
+        self._link_hashes = link_hashes
+
+    def poll_articles(self):
+        """
+        Apply article files added, rewritten or removed since the last poll.
+        """
+        stats = self._scan_articles()
+        changed = sorted(
+            article_id for article_id, stat in stats.items() if self._article_stats.get(article_id) != stat
+        )
+        removed = sorted(set(self._article_stats) - set(stats))
+        if changed or removed:
+            self.on_articles(changed, removed)
+            LIVE_UPDATES.inc("articles", amount=len(changed) + len(removed))
+        self._article_stats = stats
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for poll in (self.poll_links, self.poll_articles):
+                try:
+                    poll()
+                except Exception as e:
+                    print(f"Dataset watcher {poll.__name__} failed: {e}")
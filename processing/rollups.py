@@ -0,0 +1,191 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import stage
+
+# Heatmap time resolutions, finest first, with their pandas period frequency
+RESOLUTIONS = {"day": "D", "week": "W", "month": "M", "quarter": "Q"}
+DEFAULT_RESOLUTION = "month"
+
+# Period strings as pandas prints them, e.g. "2035-02-14", "2035-02-12/2035-02-18", "2035-02", "2035Q1"
+PERIOD_FORMATS = [
+    (re.compile(r"^\d{4}-\d{2}-\d{2}/\d{4}-\d{2}-\d{2}$"), "W"),
+    (re.compile(r"^\d{4}-\d{2}-\d{2}$"), "D"),
+    (re.compile(r"^\d{4}-\d{2}$"), "M"),
+    (re.compile(r"^\d{4}Q[1-4]$"), "Q"),
+]
+
+
+def parse_period(period):
+    """
+    Parse a period string of any resolution, e.g. "2035-02" or "2035Q1".
+
+    Raises:
+        ValueError: If the string is not a day, week, month or quarter period.
+    """
+    for pattern, freq in PERIOD_FORMATS:
+        if pattern.match(period):
+            return pd.Period(period, freq=freq)
+    raise ValueError(f"Not a day, week, month or quarter period: {period!r}")
+
+
+def period_mask(dates, period):
+    """
+    Boolean mask of the dates that fall within a period.
+
+    Parameters:
+        dates (pd.Series): Datetime values.
+        period (str): Period string, see `parse_period`.
+
+    Returns:
+        pd.Series: True where the date lies in the period.
+    """
+    period = parse_period(period)
+    return (dates >= period.start_time) & (dates <= period.end_time)
+
+
+class SentimentRollup:
+    """
+    Sentiment score sums and link counts per (company, source, period) at every resolution.
+
+    The day table is aggregated from the links once; week, month and quarter tables are
+    summed from it, so showing another resolution or time range is a lookup into a small
+    table instead of a groupby over all links. Means are sum / count per cell.
+
+    The rollup is never modified in place: `with_scores` returns an extended copy, so
+    callbacks running concurrently keep a consistent view.
+
+    Attributes:
+        tables (dict): Mapping of resolution to a DataFrame with "sum" and "count" columns,
+            indexed by (company, source, period) and sorted.
+        first_day, last_day (pd.Period or None): Data-driven time range, None without data.
+    """
+
+    def __init__(self, day_table):
+        """
+        Parameters:
+            day_table (pd.DataFrame): "sum" and "count" columns indexed by (company, source, day period).
+        """
+        with stage("rollup_build"):
+            self.tables = {"day": day_table.sort_index()}
+            days = day_table.index.get_level_values(2)
+            for resolution, freq in RESOLUTIONS.items():
+                if resolution != "day":
+                    coarse = day_table.groupby(
+                        [day_table.index.get_level_values(0), day_table.index.get_level_values(1), days.asfreq(freq)]
+                    ).sum()
+                    self.tables[resolution] = coarse.sort_index()
+        self.first_day = days.min() if len(days) else None
+        self.last_day = days.max() if len(days) else None
+
+    @staticmethod
+    def _day_table(scores):
+        scores = scores.dropna(subset=["company", "source", "date", "score"])
+        days = pd.PeriodIndex(pd.to_datetime(scores["date"]).dt.to_period("D"))
+        grouped = scores.groupby([scores["company"].to_numpy(), scores["source"].astype(str).to_numpy(), days])
+        table = grouped["score"].agg(["sum", "count"])
+        table.index.names = ["company", "source", "period"]
+        return table
+
+    @classmethod
+    def from_scores(cls, scores):
+        """
+        Build the rollup from scored links.
+
+        Parameters:
+            scores (pd.DataFrame): One row per link with "company", "source", "date" and numeric "score" columns.
+
+        Returns:
+            SentimentRollup: The rollup.
+        """
+        return cls(cls._day_table(scores))
+
+    def with_scores(self, scores):
+        """
+        Return a copy of the rollup with more scored links added.
+
+        Parameters:
+            scores (pd.DataFrame): Rows as for `from_scores`.
+
+        Returns:
+            SentimentRollup: The extended rollup.
+        """
+        day_table = pd.concat([self.tables["day"], self._day_table(scores)])
+        return SentimentRollup(day_table.groupby(level=[0, 1, 2]).sum())
+
+    def periods(self, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+        """
+        Every period of a resolution in the data's time range, optionally clipped to [start, end].
+
+        Parameters:
+            resolution (str): One of RESOLUTIONS.
+            start, end (str or datetime-like, optional): Dates to clip the range to.
+
+        Returns:
+            pd.PeriodIndex: The periods, oldest first; empty without data.
+        """
+        freq = RESOLUTIONS[resolution]
+        if self.first_day is None:
+            return pd.PeriodIndex([], freq=freq)
+        first = self.first_day.start_time if start is None else max(pd.Timestamp(start), self.first_day.start_time)
+        last = self.last_day.start_time if end is None else min(pd.Timestamp(end), self.last_day.start_time)
+        if first > last:
+            return pd.PeriodIndex([], freq=freq)
+        return pd.period_range(start=first.to_period(freq), end=last.to_period(freq), freq=freq)
+
+    def cells(self, company, resolution=DEFAULT_RESOLUTION, periods=None):
+        """
+        Mean score of a company per source and period.
+
+        Parameters:
+            company (str): Company name.
+            resolution (str): One of RESOLUTIONS.
+            periods (pd.PeriodIndex, optional): Columns to return. Defaults to the whole time range.
+
+        Returns:
+            pd.DataFrame or None: Sources (rows) by period strings (columns), NaN where a cell has
+            no links; None if the company has no links at all.
+        """
+        table = self.tables[resolution]
+        if company not in table.index.get_level_values(0):
+            return None
+        periods = self.periods(resolution) if periods is None else periods
+        with stage("rollup_lookup"):
+            company_table = table.loc[company]
+            means = (company_table["sum"] / company_table["count"]).unstack("period")
+            means = means.reindex(columns=periods)
+        means.columns = means.columns.astype(str)
+        means.index.name = "_raw_source"
+        return means
+
+    def totals(self, company):
+        """
+        Mean score of a company per source over the whole time range.
+
+        Returns:
+            pd.Series or None: Mean score indexed by source; None if the company has no links.
+        """
+        table = self.tables["quarter"]
+        if company not in table.index.get_level_values(0):
+            return None
+        sums = table.loc[company].groupby(level="source").sum()
+        return sums["sum"] / sums["count"]
+
+    def score(self, company, source, period):
+        """
+        Mean score of one cell, or None if it has no links.
+
+        Parameters:
+            company (str): Company name.
+            source (str): Full source name.
+            period (str): Period string of any resolution, see `parse_period`.
+        """
+        period = parse_period(period)
+        resolution = next(name for name, freq in RESOLUTIONS.items() if period.freqstr.startswith(freq))
+        try:
+            total, count = self.tables[resolution].loc[(company, source, period), ["sum", "count"]]
+        except KeyError:
+            return None
+        return None if not count else float(np.float64(total) / count)
@@ -0,0 +1,555 @@
+"""
+Sentence-level aspect sentiment index.
+
+Stores the ABSA probabilities of every (entity, sentence) mention in the corpus, so article,
+source, month or company sentiment is an aggregation over stored arrays instead of a model call.
+
+Precompute the whole index with:
+    python -m processing.sentiment_index
+"""
+
+import argparse
+import atexit
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import REGISTRY, stage
+
+# Index location, overridable through the environment; an empty value keeps the index in memory only
+SENTIMENT_INDEX_DIR_ENV = "BIAS_HUNTER_SENTIMENT_INDEX_DIR"
+
+DEFAULT_SENTIMENT_INDEX_DIR = ".cache/sentiment"
+
+# Seconds the background saver waits after new entries, so one shard holds the entries of many requests
+SAVE_DELAY_ENV = "BIAS_HUNTER_SENTIMENT_INDEX_SAVE_DELAY"
+
+DEFAULT_SAVE_DELAY = 10
+
+# Shard files folded into the main index file when an index is loaded
+MAX_SHARDS = 16
+
+# Seconds after which a compaction lock left behind by a crashed process is ignored
+COMPACT_LOCK_TIMEOUT = 600
+
+# Pairs classified per model request while filling the index
+DEFAULT_FILL_CHUNK = 512
+
+PROB_COLUMNS = ["negative", "neutral", "positive"]
+
+SENTIMENT_INDEX = REGISTRY.counter(
+    "bias_hunter_sentiment_index_total", "Sentence sentiment index lookups.", ("result",)
+)
+
+
+def sentence_hash(sentence):
+    """
+    64-bit fingerprint of a sentence's text.
+    """
+    return int.from_bytes(hashlib.blake2b(sentence.encode(), digest_size=8).digest(), "little")
+
+
+class SentimentIndex:
+    """
+    ABSA probabilities per (entity, sentence), keyed by the sentence's text fingerprint so
+    entries stay valid when articles are re-indexed and are shared by identical sentences.
+
+    Probabilities are stored as float16 arrays in .npz files per model version: a main file
+    plus shard files. Each process only ever writes new shards holding the entries it added,
+    so processes sharing the index never overwrite each other's entries; loading merges the
+    main file and all shards, and folds them together once there are more than MAX_SHARDS.
+    Entries missing from the index are classified on demand and added, so the index also
+    fills up from normal use; `python -m processing.sentiment_index` fills it for the whole corpus.
+
+    Attributes:
+        corpus_index (CorpusIndex): Sentences and entity mentions of the corpus.
+        model_version (str): Version of the ABSA model the probabilities come from.
+        path (str or None): Main index file, or None to keep the index in memory.
+        autosave (bool): Whether `fill` schedules a background save after adding entries.
+        save_delay (float): Seconds between new entries and the background save.
+        entities (List[str]): Entity names, indexed by entity code.
+        entity_codes (np.ndarray): int32 entity code of every entry.
+        sentence_hashes (np.ndarray): uint64 sentence fingerprint of every entry.
+        probs (np.ndarray): float16 array of shape (entries, 3) with negative, neutral and positive probabilities.
+    """
+
+    def __init__(self, corpus_index, model_version, index_dir=None, autosave=True):
+        """
+        Parameters:
+            corpus_index (CorpusIndex): Index of the article corpus.
+            model_version (str): ABSA model version; each version has its own index file.
+            index_dir (str, optional): Directory of the index files. Defaults to
+                BIAS_HUNTER_SENTIMENT_INDEX_DIR or .cache/sentiment.
+            autosave (bool): Save entries added by `fill` from a background thread. Worker
+                processes whose entries another process saves, handed over with `take_unsaved`,
+                turn this off.
+        """
+        self.corpus_index = corpus_index
+        self.model_version = model_version
+        self.autosave = autosave
+        self.save_delay = float(os.environ.get(SAVE_DELAY_ENV, DEFAULT_SAVE_DELAY))
+        if index_dir is None:
+            index_dir = os.environ.get(SENTIMENT_INDEX_DIR_ENV, DEFAULT_SENTIMENT_INDEX_DIR)
+        self.model_key = hashlib.sha256(model_version.encode()).hexdigest()[:16]
+        self.path = os.path.join(index_dir, f"{self.model_key}.npz") if index_dir else None
+
+        self.entities = []
+        self.entity_codes = np.zeros(0, dtype=np.int32)
+        self.sentence_hashes = np.zeros(0, dtype=np.uint64)
+        self.probs = np.zeros((0, 3), dtype=np.float16)
+        self._entity_code = {}
+        self._rows = {}
+        self._saved_rows = 0  # Entries before this row are in the index files
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Serialises this index's saves and compactions
+        self._save_wanted = threading.Event()
+        self._saver = None
+        self._shard_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # Names this instance's shards
+        self._shard_seq = 0
+        self._load()
+
+    def __len__(self):
+        return len(self.probs)
+
+    def _shard_paths(self):
+        """
+        Shard files of this model version next to the main index file.
+        """
+        directory = os.path.dirname(self.path) or "."
+        main = os.path.basename(self.path)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        prefix = f"{self.model_key}."
+        return sorted(
+            os.path.join(directory, name)
+            for name in names
+            if name.startswith(prefix) and name.endswith(".npz") and name != main
+        )
+
+    def _merge_file(self, path):
+        """
+        Merge the entries of one index file; files of other model versions are skipped.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["model_version"]) != self.model_version:
+                    return
+                entities = data["entities"][data["entity_codes"]].tolist()
+                hashes = data["sentence_hashes"]
+                probs = data["probs"]
+        except FileNotFoundError:
+            # Not written yet, or a shard another process has just folded into the main file
+            return
+        except (OSError, KeyError, IndexError, ValueError) as e:
+            print(f"Ignoring unreadable sentiment index {path}: {e}")
+            return
+        self.merge(entities, hashes.tolist(), probs)
+
+    def _load(self):
+        if not self.path:
+            return
+        shards = self._shard_paths()
+        with stage("sentiment_index_load"):
+            for path in [self.path] + shards:
+                self._merge_file(path)
+        self._saved_rows = len(self.probs)
+        if len(shards) > MAX_SHARDS:
+            self.compact(shards)
+
+    def _arrays(self, start, end):
+        """
+        Entries start to end as the arrays of an index file. Call with `_lock` held.
+        """
+        used, codes = np.unique(self.entity_codes[start:end], return_inverse=True)
+        return {
+            "model_version": np.array(self.model_version),
+            "entities": np.array([self.entities[code] for code in used.tolist()], dtype=str),
+            "entity_codes": codes.astype(np.int32),
+            "sentence_hashes": self.sentence_hashes[start:end],
+            "probs": self.probs[start:end],
+        }
+
+    def _write(self, path, arrays):
+        """
+        Write an index file through a temporary file in the same directory, so readers never
+        see a partial file.
+
+        Returns:
+            bool: Whether the file was written.
+        """
+        tmp_path = None
+        try:
+            directory = os.path.dirname(path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{self.model_key}.", suffix=".tmp", dir=directory)
+            with stage("sentiment_index_save"), os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            print(f"Could not write sentiment index {path}: {e}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def save(self):
+        """
+        Write the entries added since the last save as a new shard file. Files are never
+        rewritten, so saves of other processes sharing the index cannot drop these entries.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                start, end = self._saved_rows, len(self.probs)
+                if start >= end:
+                    return
+                arrays = self._arrays(start, end)
+            self._shard_seq += 1
+            name = f"{self.model_key}.{self._shard_id}-{self._shard_seq:06d}.npz"
+            if self._write(os.path.join(os.path.dirname(self.path), name), arrays):
+                with self._lock:
+                    self._saved_rows = max(self._saved_rows, end)
+
+    def schedule_save(self):
+        """
+        Save new entries from a background thread `save_delay` seconds from now, so requests
+        do not wait for the write and entries added meanwhile share one shard. Pending entries
+        are also saved when the interpreter exits.
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if self._saver is None:
+                self._saver = threading.Thread(target=self._save_loop, name="sentiment-index-saver", daemon=True)
+                self._saver.start()
+                atexit.register(self.save)
+        self._save_wanted.set()
+
+    def _save_loop(self):
+        while True:
+            self._save_wanted.wait()
+            time.sleep(self.save_delay)
+            self._save_wanted.clear()
+            self.save()
+
+    def compact(self, merged=None):
+        """
+        Fold all shard files into the main index file and delete them.
+
+        One process compacts at a time, guarded by a lock file; shards written meanwhile are
+        kept for the next compaction.
+
+        Parameters:
+            merged (List[str], optional): Shard files whose entries are already in this index.
+                Defaults to reading all shards.
+        """
+        if not self.path:
+            return
+        lock_path = f"{self.path}.lock"
+        try:
+            if time.time() - os.path.getmtime(lock_path) > COMPACT_LOCK_TIMEOUT:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except OSError:
+            # Another process is compacting
+            return
+        try:
+            with stage("sentiment_index_compact"):
+                if merged is None:
+                    merged = self._shard_paths()
+                    for path in merged:
+                        self._merge_file(path)
+                with self._save_lock:
+                    with self._lock:
+                        end = len(self.probs)
+                        arrays = self._arrays(0, end)
+                    if not self._write(self.path, arrays):
+                        return
+                    with self._lock:
+                        self._saved_rows = max(self._saved_rows, end)
+            for path in merged:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+    def _key(self, entity, sentence):
+        return self._entity_code.get(entity), sentence_hash(sentence)
+
+    def lookup(self, pairs):
+        """
+        Stored probabilities for (sentence, entity) pairs.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(pairs), 3), NaN where the pair is not indexed.
+        """
+        probs = np.full((len(pairs), 3), np.nan, dtype=np.float32)
+        with self._lock:
+            rows = [self._rows.get(self._key(entity, sentence)) for sentence, entity in pairs]
+            stored = self.probs
+        found = [i for i, row in enumerate(rows) if row is not None]
+        if found:
+            probs[found] = stored[[rows[i] for i in found]]
+        SENTIMENT_INDEX.inc("hit", amount=len(found))
+        SENTIMENT_INDEX.inc("miss", amount=len(pairs) - len(found))
+        return probs
+
+    def add(self, pairs, probs):
+        """
+        Add classified (sentence, entity) pairs to the index. Pairs already indexed are skipped.
+
+        Parameters:
+            pairs (List[Tuple[str, str]]): (sentence, entity) pairs.
+            probs (np.ndarray): Their probabilities, shape (len(pairs), 3).
+        """
+        self.merge([entity for _, entity in pairs], [sentence_hash(sentence) for sentence, _ in pairs], probs)
+
+    def merge(self, entities, hashes, probs):
+        """
+        Add entries by sentence fingerprint, e.g. ones taken from another process's index with
+        `take_unsaved`. Entries already indexed are skipped.
+
+        Parameters:
+            entities (List[str]): Entity of every entry.
+            hashes (Iterable[int]): Sentence fingerprint of every entry, see `sentence_hash`.
+            probs (np.ndarray): Their probabilities, shape (len(entities), 3).
+        """
+        with self._lock:
+            codes, new_hashes, rows = [], [], []
+            for entity, fingerprint, row in zip(entities, hashes, probs):
+                if entity not in self._entity_code:
+                    self._entity_code[entity] = len(self.entities)
+                    self.entities.append(entity)
+                key = (self._entity_code[entity], int(fingerprint))
+                if key in self._rows:
+                    continue
+                self._rows[key] = len(self.probs) + len(rows)
+                codes.append(key[0])
+                new_hashes.append(key[1])
+                rows.append(row)
+            if not rows:
+                return
+            # Arrays are replaced rather than resized, so concurrent readers keep a consistent view
+            self.entity_codes = np.concatenate([self.entity_codes, np.array(codes, dtype=np.int32)])
+            self.sentence_hashes = np.concatenate([self.sentence_hashes, np.array(new_hashes, dtype=np.uint64)])
+            self.probs = np.concatenate([self.probs, np.asarray(rows, dtype=np.float16)])
+
+    def take_unsaved(self):
+        """
+        Entries added since the index was loaded, saved or last taken, so another process can
+        merge them in and save them. They count as saved afterwards.
+
+        Returns:
+            Tuple[List[str], np.ndarray, np.ndarray]: Entity of every entry, uint64 sentence
+            fingerprints and float16 probabilities, the arguments of `merge`.
+        """
+        with self._lock:
+            start, self._saved_rows = self._saved_rows, len(self.probs)
+            entities = [self.entities[code] for code in self.entity_codes[start:].tolist()]
+            return entities, self.sentence_hashes[start:], self.probs[start:]
+
+    def fill(self, pairs, inference, cancel_token=None, chunk_size=DEFAULT_FILL_CHUNK, save=None):
+        """
+        Probabilities for (sentence, entity) pairs, classifying and indexing the ones not indexed yet.
+
+        Parameters:
+            pairs (List[Tuple[str, str]]): (sentence, entity) pairs.
+            inference (BatchedInference or InferenceClient): Runs the ABSA model for missing pairs.
+            cancel_token (CancelToken, optional): Checked before every model request.
+            chunk_size (int): Missing pairs per model request.
+            save (bool, optional): True saves new entries before returning, False leaves them
+                unsaved. Defaults to a background save if `autosave` is set.
+
+        Returns:
+            np.ndarray: float32 array of shape (len(pairs), 3).
+        """
+        probs = self.lookup(pairs)
+        missing = np.flatnonzero(np.isnan(probs[:, 0])).tolist()
+        for start in range(0, len(missing), chunk_size):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            idx = missing[start : start + chunk_size]
+            chunk = [pairs[i] for i in idx]
+            probs[idx] = inference.absa_probs(chunk)
+            self.add(chunk, probs[idx])
+        if missing and save:
+            self.save()
+        elif missing and save is None and self.autosave:
+            self.schedule_save()
+        return probs
+
+    def article_scores(self, articles, entity, inference, cancel_token=None):
+        """
+        Sentiment of each article towards an entity: the mean of positive minus negative
+        probability over the article's sentences that mention the entity.
+
+        Parameters:
+            articles (List[str]): Article ids.
+            entity (str): Entity name.
+            inference (BatchedInference or InferenceClient): Classifies sentences not indexed yet.
+            cancel_token (CancelToken, optional): Checked between articles and before model requests.
+
+        Returns:
+            List[float or None]: Score per article between -1 and 1, None if the article does not mention the entity.
+        """
+        pairs, owners = [], []
+        for i, article_id in enumerate(articles):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            for sentence in self.corpus_index.entity_sentences(article_id, entity):
+                pairs.append((sentence, entity))
+                owners.append(i)
+
+        scores = [None] * len(articles)
+        if not pairs:
+            return scores
+        probs = self.fill(pairs, inference, cancel_token=cancel_token)
+        sentence_scores = pd.Series(probs[:, 2] - probs[:, 0]).groupby(np.array(owners)).mean()
+        for i, score in sentence_scores.items():
+            scores[i] = float(score)
+        return scores
+
+    def mention_pairs(self, entities=None):
+        """
+        Distinct (sentence, entity) pairs of all indexed mentions, e.g. to fill the whole index.
+
+        Parameters:
+            entities (Iterable[str], optional): Restrict to these entities.
+
+        Returns:
+            List[Tuple[str, str]]: (sentence, entity) pairs.
+        """
+        frame = self.mentions(entities)
+        sentences = self.corpus_index.sentences
+        return list(
+            dict.fromkeys(
+                (sentences[article_id][idx], entity)
+                for entity, article_id, idx in frame[["entity", "article", "sentence"]].itertuples(index=False)
+            )
+        )
+
+    def mentions(self, entities=None):
+        """
+        Distinct (entity, article, sentence) mentions recorded in the corpus index.
+
+        Returns:
+            pd.DataFrame: Columns entity, article, sentence (index within the article) and sentence_hash.
+        """
+        wanted = None if entities is None else set(entities)
+        rows = {
+            (entity, article_id, sentence_idx)
+            for entity, article_id, sentence_idx, _, _ in self.corpus_index.hits()
+            if wanted is None or entity in wanted
+        }
+        frame = pd.DataFrame(sorted(rows), columns=["entity", "article", "sentence"])
+        hashes = {
+            (article_id, idx): sentence_hash(self.corpus_index.sentences[article_id][idx])
+            for article_id, idx in set(zip(frame["article"], frame["sentence"]))
+        }
+        frame["sentence_hash"] = np.array(
+            [hashes[key] for key in zip(frame["article"], frame["sentence"])], dtype=np.uint64
+        )
+        return frame
+
+    def frame(self, entities=None):
+        """
+        Indexed probabilities joined to the corpus mentions. Mentions not indexed yet are left out.
+
+        Returns:
+            pd.DataFrame: Columns entity, article, sentence, negative, neutral, positive and score
+                (positive minus negative probability).
+        """
+        with self._lock:
+            entities_by_code = np.array(self.entities, dtype=object)
+            stored = pd.DataFrame(self.probs.astype(np.float32), columns=PROB_COLUMNS)
+            stored["entity"] = entities_by_code[self.entity_codes] if len(self.entities) else []
+            stored["sentence_hash"] = self.sentence_hashes
+        with stage("sentiment_index_frame"):
+            frame = self.mentions(entities).merge(stored, on=["entity", "sentence_hash"], how="inner")
+            frame["score"] = frame["positive"] - frame["negative"]
+        return frame.drop(columns="sentence_hash")
+
+    def aggregate(self, by, article_meta=None, entities=None):
+        """
+        Mean article sentiment per group.
+
+        Sentence scores are first averaged per (entity, article), as shown in the diverging
+        bar chart, and article scores are then averaged per group.
+
+        Parameters:
+            by (List[str]): Grouping columns, any of entity, article and the columns of `article_meta`.
+            article_meta (pd.DataFrame, optional): Per-article attributes with an "article" column,
+                e.g. source and month, joined before grouping.
+            entities (Iterable[str], optional): Restrict to these entities.
+
+        Returns:
+            pd.DataFrame: The grouping columns, the mean score and the number of articles per group.
+        """
+        articles = self.frame(entities).groupby(["entity", "article"], as_index=False)["score"].mean()
+        if article_meta is not None:
+            articles = articles.merge(article_meta.drop_duplicates(), on="article", how="inner")
+        # Source comes from the link table, where it is categorical; keep only combinations that occur
+        grouped = articles.groupby(list(by), as_index=False, observed=True)
+        return grouped.agg(score=("score", "mean"), articles=("article", "size"))
+
+
+def article_meta(df_links):
+    """
+    Source and month of every article, from the heatmap's enriched link table.
+
+    Per-company sentiment is grouped by the index's own entity column, so companies are not
+    taken from the links.
+
+    Parameters:
+        df_links (pd.DataFrame): Links with _articleid, _raw_source and month columns.
+
+    Returns:
+        pd.DataFrame: Columns article, source and month, one row per distinct combination.
+    """
+    meta = df_links[["_articleid", "_raw_source", "month"]].rename(
+        columns={"_articleid": "article", "_raw_source": "source"}
+    )
+    return meta.assign(month=meta["month"].astype(str)).drop_duplicates()
+
+
+if __name__ == "__main__":
+    from processing.corpus_index import CorpusIndex
+    from processing.inference import ABSA_MODEL, inference_backend
+    from processing.ingest import load_graph_tables
+
+    parser = argparse.ArgumentParser(description="Precompute the sentence sentiment index for the whole corpus.")
+    parser.add_argument("--data", default="data/mc1.json")
+    parser.add_argument("--articles", default="data/articles")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_FILL_CHUNK)
+    args = parser.parse_args()
+
+    tables = load_graph_tables(args.data)
+    corpus_index = CorpusIndex(entities=tables.nodes["id"].tolist(), articles_dir=args.articles)
+    index = SentimentIndex(corpus_index, ABSA_MODEL)
+    inference = inference_backend()
+    pairs = index.mention_pairs()
+    print(f"{len(pairs)} mentions, {len(index)} already indexed")
+    step = args.chunk_size * 8
+    for start in range(0, len(pairs), step):
+        # Save every few chunks so an interrupted run resumes where it stopped
+        index.fill(pairs[start : start + step], inference, chunk_size=args.chunk_size, save=True)
+        print(f"{min(start + step, len(pairs))}/{len(pairs)} mentions done")
+    index.compact()
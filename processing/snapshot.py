@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+import time
+
+from utils.metrics import stage
+
+# Snapshot configuration, overridable through the environment
+SNAPSHOT_PATH_ENV = "BIAS_HUNTER_SNAPSHOT"
+
+DEFAULT_SNAPSHOT_PATH = ".cache/snapshot.pkl"
+
+# Bump when the snapshot layout changes
+SNAPSHOT_FORMAT = 1
+
+# Packages whose classes end up in the snapshot; any change to them invalidates it
+CODE_PACKAGES = ("processing", "widgets")
+
+
+def snapshot_path():
+    """
+    Path of the derived-state snapshot, from BIAS_HUNTER_SNAPSHOT. An empty value disables snapshots.
+    """
+    return os.environ.get(SNAPSHOT_PATH_ENV, DEFAULT_SNAPSHOT_PATH)
+
+
+def code_version(packages=CODE_PACKAGES):
+    """
+    Fingerprint the source of the packages whose objects are pickled into the snapshot.
+
+    Parameters:
+        packages (Iterable[str]): Package directories, relative to the repository root.
+
+    Returns:
+        str: Short hex fingerprint.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha256()
+    for package in packages:
+        directory = os.path.join(root, package)
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py"):
+                digest.update(name.encode())
+                with open(os.path.join(directory, name), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_snapshot(path, data_version):
+    """
+    Load derived state saved by `save_snapshot`, if it was built from the same data and code.
+
+    Parameters:
+        path (str): Snapshot file.
+        data_version (str): Current dataset fingerprint (see utils.result_cache.dataset_version).
+
+    Returns:
+        dict or None: The saved state, or None if the file is missing, unreadable or stale.
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    expected = {"format": SNAPSHOT_FORMAT, "data_version": data_version, "code_version": code_version()}
+    try:
+        with stage("snapshot_load"), open(path, "rb") as f:
+            header = pickle.load(f)
+            stale = {key: header.get(key) for key, value in expected.items() if header.get(key) != value}
+            if stale:
+                print(f"Ignoring stale snapshot {path}: {stale}")
+                return None
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError) as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+
+def save_snapshot(path, data_version, state):
+    """
+    Save derived state with the data and code versions it was built from.
+
+    The file is written to a temporary name and renamed, so concurrent readers never see a partial snapshot.
+
+    Parameters:
+        path (str): Snapshot file.
+        data_version (str): Dataset fingerprint the state was built from.
+        state (dict): Picklable objects to save, e.g. widgets and indexes.
+    """
+    if not path:
+        return
+
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "data_version": data_version,
+        "code_version": code_version(),
+        "created": time.time(),
+        "contents": sorted(state),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with stage("snapshot_save"), open(tmp_path, "wb") as f:
+            pickle.dump(header, f)
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+        print(f"Could not write snapshot {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,212 @@
+import os
+import threading
+from collections import OrderedDict
+
+from transformers import AutoTokenizer
+
+from utils.metrics import REGISTRY, stage
+
+# Tokenizer configuration, overridable through the environment
+FAST_TOKENIZER_ENV = "BIAS_HUNTER_FAST_TOKENIZER"
+TOKEN_CACHE_ITEMS_ENV = "BIAS_HUNTER_TOKEN_CACHE_ITEMS"
+
+DEFAULT_TOKEN_CACHE_ITEMS = 100_000
+
+# Pairs checked before the fast tokenizer and the concatenation of pre-tokenized sentences are
+# used. Texts given as lists are article sentences, classified as the sentences joined by spaces.
+PARITY_SAMPLES = [
+    ("Namorna Transit Ltd was fined for overfishing off the coast of Oceanus.", "Namorna Transit Ltd"),
+    ("The News Buoy reports that catches fell by 12% in 2035-03.", "The News Buoy"),
+    (
+        ["Haacklee Herald praised the co-op's sustainable nets.", "Critics called it greenwashing!"],
+        "Haacklee Herald",
+    ),
+    (
+        ["  Lomark Daily:  “unprecedented” seizures…", "Ünïcödé names & símbolos — e.g. Søren's boat."],
+        "Søren",
+    ),
+    ("", "StichtingMarine"),
+]
+
+TOKEN_CACHE = REGISTRY.counter("bias_hunter_token_cache_total", "Pre-tokenized text cache lookups.", ("result",))
+
+
+def _segments(text):
+    return [text] if isinstance(text, str) else list(text)
+
+
+def encode_pair(tokenizer, text_ids, aspect_ids):
+    """
+    Assemble model inputs from already tokenized text and aspect ids, adding special tokens.
+
+    Returns:
+        Tuple[List[int], List[int]]: Input ids and token type ids.
+    """
+    return (
+        tokenizer.build_inputs_with_special_tokens(text_ids, aspect_ids),
+        tokenizer.create_token_type_ids_from_sequences(text_ids, aspect_ids),
+    )
+
+
+def tokenizer_parity(reference, candidate, pairs=PARITY_SAMPLES):
+    """
+    Compare the inputs two tokenizers produce for the same (joined text, aspect) pairs.
+
+    Parameters:
+        reference: Tokenizer whose output is taken as correct (the slow tokenizer).
+        candidate: Tokenizer to check (the fast tokenizer).
+        pairs (List[Tuple[str or List[str], str]]): (text or sentences, aspect) pairs.
+
+    Returns:
+        List[Tuple[str, str]]: The (joined text, aspect) pairs whose input ids differ.
+    """
+    mismatches = []
+    for text, aspect in pairs:
+        joined = " ".join(_segments(text))
+        if candidate(joined, aspect)["input_ids"] != reference(joined, aspect)["input_ids"]:
+            mismatches.append((joined, aspect))
+    return mismatches
+
+
+def concatenation_parity(tokenizer, pairs=PARITY_SAMPLES):
+    """
+    Compare the inputs assembled from separately tokenized sentences and aspect (the TokenCache
+    path) with what the tokenizer produces for the joined text and the aspect.
+
+    Parameters:
+        tokenizer: Tokenizer to check.
+        pairs (List[Tuple[str or List[str], str]]): (text or sentences, aspect) pairs.
+
+    Returns:
+        List[Tuple[str, str]]: The (joined text, aspect) pairs whose input ids differ.
+    """
+    mismatches = []
+    for text, aspect in pairs:
+        segments = _segments(text)
+        joined = " ".join(segments)
+        text_ids = [i for ids in tokenizer(segments, add_special_tokens=False)["input_ids"] for i in ids]
+        aspect_ids = tokenizer(aspect, add_special_tokens=False)["input_ids"]
+        if encode_pair(tokenizer, text_ids, aspect_ids)[0] != tokenizer(joined, aspect)["input_ids"]:
+            mismatches.append((joined, aspect))
+    return mismatches
+
+
+def load_absa_tokenizer(model_name, fast=None, parity_pairs=PARITY_SAMPLES):
+    """
+    Load the ABSA tokenizer, preferring the fast (Rust) implementation.
+
+    The fast tokenizer is only used if it passes `tokenizer_parity` against the slow one;
+    otherwise the slow tokenizer is returned and the mismatches are reported.
+
+    Parameters:
+        model_name (str): Hugging Face id of the model.
+        fast (bool, optional): Try the fast tokenizer. Defaults to BIAS_HUNTER_FAST_TOKENIZER (on).
+        parity_pairs (List[Tuple[str or List[str], str]]): Pairs to check parity on.
+
+    Returns:
+        PreTrainedTokenizerBase: The tokenizer to use.
+    """
+    if fast is None:
+        fast = os.environ.get(FAST_TOKENIZER_ENV, "1").strip().lower() not in {"0", "false", "no", "off"}
+    slow_tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
+    if not fast:
+        return slow_tokenizer
+
+    try:
+        fast_tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    except (ValueError, OSError, ImportError) as e:
+        print(f"Fast tokenizer for {model_name} unavailable, using the slow one: {e}")
+        return slow_tokenizer
+    if not fast_tokenizer.is_fast:
+        return slow_tokenizer
+
+    mismatches = tokenizer_parity(slow_tokenizer, fast_tokenizer, parity_pairs)
+    if mismatches:
+        print(f"Fast tokenizer for {model_name} differs from the slow one on {mismatches}; using the slow one")
+        return slow_tokenizer
+    return fast_tokenizer
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of token ids (without special tokens) per text, usually one article
+    sentence or one keyphrase.
+
+    The same sentences are classified for every company, month and source they appear
+    under, so caching their ids avoids re-tokenizing them on every click. Model inputs are
+    assembled from the cached ids with `encode_pair`.
+
+    Attributes:
+        tokenizer: Tokenizer used for cache misses.
+        max_items (int): Maximum number of cached texts.
+        concatenate (bool): Whether the ids of a list of sentences are the concatenated ids of
+            each sentence. If not, the joined text is tokenized (and cached) as a whole.
+    """
+
+    def __init__(self, tokenizer, max_items=None, concatenate=None):
+        """
+        Parameters:
+            tokenizer: Tokenizer used for cache misses.
+            max_items (int, optional): Defaults to BIAS_HUNTER_TOKEN_CACHE_ITEMS or 100000.
+            concatenate (bool, optional): Defaults to whether the tokenizer passes `concatenation_parity`.
+        """
+        self.tokenizer = tokenizer
+        self.max_items = max_items or int(os.environ.get(TOKEN_CACHE_ITEMS_ENV, DEFAULT_TOKEN_CACHE_ITEMS))
+        if concatenate is None:
+            mismatches = concatenation_parity(tokenizer)
+            if mismatches:
+                print(f"Concatenated sentence tokens differ from the joined text on {mismatches}; tokenizing it whole")
+            concatenate = not mismatches
+        self.concatenate = concatenate
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ids(self, texts):
+        """
+        Token ids of each text, tokenizing the uncached ones in one batch.
+
+        Parameters:
+            texts (List[str]): Texts to look up.
+
+        Returns:
+            List[List[int]]: Token ids per text, in input order.
+        """
+        found = {}
+        with self._lock:
+            for text in texts:
+                if text in self._ids:
+                    self._ids.move_to_end(text)
+                    found[text] = self._ids[text]
+        misses = list(dict.fromkeys(text for text in texts if text not in found))
+        TOKEN_CACHE.inc("hit", amount=len(texts) - len(misses))
+        if misses:
+            TOKEN_CACHE.inc("miss", amount=len(misses))
+            with stage("tokenize"):
+                encoded = self.tokenizer(misses, add_special_tokens=False)["input_ids"]
+            found.update(zip(misses, encoded))
+            with self._lock:
+                self._ids.update(zip(misses, encoded))
+                while len(self._ids) > self.max_items:
+                    self._ids.popitem(last=False)
+        return [found[text] for text in texts]
+
+    def encode_pairs(self, pairs):
+        """
+        Model inputs for (text, aspect) pairs, where a text is either a string or a list of
+        sentences. Sentences are tokenized separately and concatenated, or joined by spaces
+        first if `concatenate` is off.
+
+        Returns:
+            List[Tuple[List[int], List[int]]]: Input ids and token type ids per pair.
+        """
+        if self.concatenate:
+            segments = [_segments(text) for text, _ in pairs]
+        else:
+            segments = [[" ".join(_segments(text))] for text, _ in pairs]
+        flat = [segment for text_segments in segments for segment in text_segments]
+        ids = iter(self.ids(flat + [aspect for _, aspect in pairs]))
+        text_ids = [[i for _ in text_segments for i in next(ids)] for text_segments in segments]
+        return [encode_pair(self.tokenizer, text, next(ids)) for text in text_ids]
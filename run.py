@@ -26,6 +26,12 @@ except OSError:
 
 from widgets.layout import *
 from callbacks.callbacks import register_callbacks
+from utils.metrics import register_metrics_endpoint
+from utils.serialization import register_payload_report
+from utils.warmup import CacheWarmer, warmup_top_n
+from callbacks.panels import apply_article_delta, apply_link_delta, warmup_tasks
+from processing.live_ingest import DatasetWatcher, watch_interval
+import os
 
 if __name__ == "__main__":
 
@@ -35,5 +41,24 @@ if __name__ == "__main__":
     """
     app.layout = create_layout()
     register_callbacks(app)
+    register_metrics_endpoint(app)
+    register_payload_report(app)
+
+    # With debug=True the reloader runs the app in a child process; only warm the caches there
+    top_n = warmup_top_n()
+    if top_n > 0 and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        CacheWarmer(warmup_tasks(top_n)).start()
+
+    # Apply links appended to mc1.json and new article files without a restart
+    if watch_interval() > 0 and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        DatasetWatcher(
+            "data/mc1.json",
+            "data/articles",
+            nodes=horizontal_bar.df_nodes,
+            links=horizontal_bar.df_links,
+            known_articles=corpus_index.sentences,
+            on_links=apply_link_delta,
+            on_articles=apply_article_delta,
+        ).start()
 
     app.run(debug=True, dev_tools_ui=True)
@@ -0,0 +1,144 @@
+import threading
+
+
+class JobCancelled(Exception):
+    """
+    Raised when a job is cancelled or its result is no longer wanted by the caller.
+    """
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag checked by long-running work between steps.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """
+        Raise JobCancelled if the token has been cancelled.
+        """
+        if self._event.is_set():
+            raise JobCancelled()
+
+
+class _Job:
+    def __init__(self, key):
+        self.key = key
+        self.token = CancelToken()
+        self.done = threading.Event()
+        self.subscribers = set()
+        self.result = None
+        self.error = None
+
+
+class CoalescingExecutor:
+    """
+    Runs expensive per-click jobs so that identical concurrent requests share one computation
+    and requests superseded by a newer click from the same session are dropped.
+
+    Each caller is identified by a (session, kind) slot. When a session starts a new job of a
+    kind, its previous job of that kind is abandoned; a job nobody waits for anymore is
+    cancelled through its CancelToken. Requests for a key that is already running attach to
+    the running job instead of starting a new one.
+    """
+
+    # How often waiting callers check whether they have been superseded, in seconds
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._session_jobs = {}
+        self._tickets = {}
+
+    def _unsubscribe(self, job, slot):
+        job.subscribers.discard(slot)
+        if not job.subscribers and not job.done.is_set():
+            job.token.cancel()
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def run(self, kind, key, session_id, fn):
+        """
+        Run `fn` for a key, or join an identical job that is already running.
+
+        Parameters:
+            kind (str): Job kind, e.g. "wordcloud" or "sentiment". A session has at most one live job per kind.
+            key (Hashable): Identifies identical work, e.g. (company, month, source).
+            session_id (str): Browser session issuing the request.
+            fn (Callable[[CancelToken], Any]): Work to run; should call `token.raise_if_cancelled()` between steps.
+
+        Returns:
+            Any: The result of `fn`.
+
+        Raises:
+            JobCancelled: If a newer request from the same session superseded this one.
+        """
+        slot = (session_id, kind)
+        job_key = (kind, key)
+        ticket = object()
+
+        with self._lock:
+            self._tickets[slot] = ticket
+            previous = self._session_jobs.get(slot)
+            if previous is not None and previous.key != job_key:
+                self._unsubscribe(previous, slot)
+
+            job = self._jobs.get(job_key)
+            is_leader = job is None
+            if is_leader:
+                job = self._jobs[job_key] = _Job(job_key)
+            job.subscribers.add(slot)
+            self._session_jobs[slot] = job
+
+        if is_leader:
+            try:
+                job.result = fn(job.token)
+            except BaseException as error:
+                job.error = error
+            finally:
+                with self._lock:
+                    if self._jobs.get(job_key) is job:
+                        del self._jobs[job_key]
+                job.done.set()
+        else:
+            while not job.done.wait(self.POLL_INTERVAL):
+                if self._tickets.get(slot) is not ticket:
+                    raise JobCancelled()
+
+        with self._lock:
+            superseded = self._tickets.get(slot) is not ticket
+            if not superseded:
+                job.subscribers.discard(slot)
+                del self._tickets[slot]
+                del self._session_jobs[slot]
+
+        if superseded:
+            raise JobCancelled()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def abandon(self, session_id, kind):
+        """
+        Drop a session's pending job of a kind, e.g. when the panel switches back to its placeholder.
+
+        Parameters:
+            session_id (str): Browser session.
+            kind (str): Job kind.
+        """
+        slot = (session_id, kind)
+        with self._lock:
+            self._tickets.pop(slot, None)
+            job = self._session_jobs.pop(slot, None)
+            if job is not None:
+                self._unsubscribe(job, slot)
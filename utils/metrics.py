@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Latency buckets in seconds, from fast pandas filters up to multi-second NLP runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in Prometheus text format.
+    """
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """
+        Increase the counter for the given label values.
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """
+    Labelled value that can go up and down.
+    """
+
+    def dec(self, *label_values, amount=1):
+        """
+        Decrease the gauge for the given label values.
+        """
+        self.inc(*label_values, amount=-amount)
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with labels, rendered in Prometheus text format.
+
+    Observing a value is a bisect and three additions under a lock; all formatting
+    is deferred to `render`, which only runs when the endpoint is scraped.
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Record one observation for the given label values.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.label_names, label_values, extra=(("le", le),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics exposed together on the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def render(self):
+        """
+        Render all metrics in Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+CALLBACK_LATENCY = REGISTRY.histogram(
+    "bias_hunter_callback_duration_seconds", "Latency of Dash callbacks.", ("callback",)
+)
+CALLBACK_ERRORS = REGISTRY.counter("bias_hunter_callback_errors_total", "Dash callbacks that raised.", ("callback",))
+CALLBACKS_IN_FLIGHT = REGISTRY.gauge("bias_hunter_callbacks_in_flight", "Dash callbacks currently running.")
+STAGE_LATENCY = REGISTRY.histogram(
+    "bias_hunter_stage_duration_seconds", "Latency of internal processing stages.", ("stage",)
+)
+CACHE_REQUESTS = REGISTRY.counter("bias_hunter_cache_requests_total", "Cache lookups by outcome.", ("cache", "result"))
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a block of code as an internal processing stage.
+
+    Parameters:
+        name (str): Stage name, e.g. "graph_build", "louvain" or "absa".
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def timed_callback(name):
+    """
+    Decorator recording the latency, errors and concurrency of a Dash callback.
+
+    Parameters:
+        name (str): Callback name used as the metric label.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            CALLBACKS_IN_FLIGHT.inc()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                CALLBACK_ERRORS.inc(name)
+                raise
+            finally:
+                CALLBACK_LATENCY.observe(time.perf_counter() - start, name)
+                CALLBACKS_IN_FLIGHT.dec()
+
+        return wrapper
+
+    return decorator
+
+
+def record_cache(cache, hit):
+    """
+    Count one cache lookup.
+
+    Parameters:
+        cache (str): Cache name.
+        hit (bool): Whether the lookup was a hit.
+    """
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def register_metrics_endpoint(app, path="/metrics"):
+    """
+    Expose all metrics in Prometheus text format on the Dash app's Flask server.
+
+    Parameters:
+        app (dash.Dash): The Dash app instance.
+        path (str): URL path of the endpoint.
+    """
+    from flask import Response
+
+    @app.server.route(path)
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,140 @@
+import contextvars
+import cProfile
+import json
+import os
+import re
+import time
+from datetime import datetime
+from functools import wraps
+
+# Profiling is off unless enabled for the whole process or requested per request
+PROFILE_ENV = "BIAS_HUNTER_PROFILE"
+PROFILE_DIR_ENV = "BIAS_HUNTER_PROFILE_DIR"
+PROFILE_KEEP_ENV = "BIAS_HUNTER_PROFILE_KEEP"
+PROFILE_HEADER = "X-Bias-Hunter-Profile"
+
+DEFAULT_PROFILE_DIR = "profiles"
+DEFAULT_PROFILE_KEEP = 200
+
+_current_tags = contextvars.ContextVar("profile_tags", default=None)
+
+
+def _truthy(value):
+    return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+def profiling_requested():
+    """
+    Check whether the current callback should be profiled.
+
+    Profiling is requested either for every callback through the BIAS_HUNTER_PROFILE
+    environment variable, or for a single request through the X-Bias-Hunter-Profile header.
+
+    Returns:
+        bool: True if the callback should run under the profiler.
+    """
+    if _truthy(os.environ.get(PROFILE_ENV, "")):
+        return True
+
+    from flask import has_request_context, request
+
+    return has_request_context() and _truthy(request.headers.get(PROFILE_HEADER, ""))
+
+
+def tag(**tags):
+    """
+    Attach tags (e.g. company, month, source) to the profile of the running callback.
+
+    Does nothing when the callback is not being profiled, so callbacks can call it unconditionally.
+    """
+    current = _current_tags.get()
+    if current is not None:
+        current.update({key: value for key, value in tags.items() if value is not None})
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9]+", "-", str(value)).strip("-")[:40]
+
+
+def _rotate(profile_dir, keep):
+    """
+    Delete the oldest profiles so at most `keep` remain.
+    """
+    profiles = sorted(
+        (entry for entry in os.scandir(profile_dir) if entry.name.endswith(".prof")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in profiles[: max(0, len(profiles) - keep)]:
+        for path in (entry.path, entry.path[: -len(".prof")] + ".json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _write_profile(profiler, callback_name, tags, duration):
+    """
+    Write one pstats profile plus a JSON sidecar with its tags, then rotate old profiles.
+    """
+    profile_dir = os.environ.get(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+    keep = int(os.environ.get(PROFILE_KEEP_ENV, DEFAULT_PROFILE_KEEP))
+    os.makedirs(profile_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    parts = [timestamp, callback_name] + [_slug(tags[key]) for key in ("company", "month", "source") if key in tags]
+    base = os.path.join(profile_dir, "_".join(part for part in parts if part))
+
+    profiler.dump_stats(f"{base}.prof")
+    with open(f"{base}.json", "w") as f:
+        json.dump(
+            {"callback": callback_name, "tags": tags, "duration_s": duration, "timestamp": timestamp},
+            f,
+            indent=2,
+            default=str,
+        )
+    _rotate(profile_dir, keep)
+
+
+def profiled(callback_name):
+    """
+    Decorator running a Dash callback under cProfile when profiling is requested.
+
+    Each profiled call writes `<timestamp>_<callback>_<company>_<month>_<source>.prof`
+    (pstats format, viewable with snakeviz or flameprof) and a `.json` sidecar holding
+    the tags, into BIAS_HUNTER_PROFILE_DIR. Only the newest BIAS_HUNTER_PROFILE_KEEP
+    profiles are kept. When profiling is not requested the callback runs unchanged.
+
+    Parameters:
+        callback_name (str): Callback name used to tag the profile.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiling_requested():
+                return func(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active (e.g. a concurrent profiled callback)
+                return func(*args, **kwargs)
+
+            tags = {}
+            token = _current_tags.set(tags)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.disable()
+                _current_tags.reset(token)
+                # A failed write must not replace the callback's result or exception
+                try:
+                    _write_profile(profiler, callback_name, tags, time.perf_counter() - start)
+                except OSError as e:
+                    print(f"Could not write profile of {callback_name}: {e}")
+
+        return wrapper
+
+    return decorator
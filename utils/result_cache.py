@@ -0,0 +1,260 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import record_cache
+
+# Cache configuration, overridable through the environment
+CACHE_DIR_ENV = "BIAS_HUNTER_CACHE_DIR"
+CACHE_ITEMS_ENV = "BIAS_HUNTER_CACHE_ITEMS"
+CACHE_DISK_MB_ENV = "BIAS_HUNTER_CACHE_DISK_MB"
+CACHE_TTL_ENV = "BIAS_HUNTER_CACHE_TTL"
+
+DEFAULT_CACHE_DIR = ".cache/results"
+DEFAULT_CACHE_ITEMS = 512
+DEFAULT_CACHE_DISK_MB = 512
+DEFAULT_CACHE_TTL = 7 * 24 * 3600
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """
+    Hash a file's contents without reading it into memory at once.
+
+    Parameters:
+        path (str): File to hash.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_version(data_path, articles_dir):
+    """
+    Fingerprint the graph data file and the article directory.
+
+    The graph file is hashed by content; articles are fingerprinted by name, size and
+    modification time, which is enough to notice added, removed or rewritten files.
+
+    Parameters:
+        data_path (str): Path of mc1.json.
+        articles_dir (str): Directory containing the article files.
+
+    Returns:
+        str: Short hex fingerprint.
+    """
+    digest = hashlib.sha256(file_sha256(data_path).encode())
+    if os.path.isdir(articles_dir):
+        for entry in sorted(os.scandir(articles_dir), key=lambda entry: entry.name):
+            stat = entry.stat()
+            digest.update(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Two-tier cache for deterministic, expensive results such as the NLP panels.
+
+    The memory tier is an LRU bounded by item count; the disk tier holds pickled entries
+    bounded by total size, evicting the least recently written files first. Entries older
+    than the TTL are treated as misses in both tiers. Keys must be tuples of plain values;
+    include everything the result depends on (dataset version, model version, inputs).
+
+    Attributes:
+        name (str): Cache name used in metrics.
+        hits (int): Number of lookups answered from either tier.
+        misses (int): Number of lookups that had to compute.
+    """
+
+    def __init__(self, name, max_items=None, disk_dir=None, max_disk_bytes=None, ttl=None):
+        """
+        Parameters:
+            name (str): Cache name, also the subdirectory of the disk tier.
+            max_items (int, optional): Memory tier size. Defaults to BIAS_HUNTER_CACHE_ITEMS or 512.
+            disk_dir (str, optional): Root of the disk tier. Defaults to BIAS_HUNTER_CACHE_DIR or
+                .cache/results. Pass an empty string to disable the disk tier.
+            max_disk_bytes (int, optional): Disk tier size. Defaults to BIAS_HUNTER_CACHE_DISK_MB or 512 MB.
+            ttl (float, optional): Entry lifetime in seconds. Defaults to BIAS_HUNTER_CACHE_TTL or 7 days.
+        """
+        self.name = name
+        self.max_items = int(max_items or os.environ.get(CACHE_ITEMS_ENV, DEFAULT_CACHE_ITEMS))
+        disk_mb = float(os.environ.get(CACHE_DISK_MB_ENV, DEFAULT_CACHE_DISK_MB))
+        self.max_disk_bytes = int(max_disk_bytes or disk_mb * 1e6)
+        self.ttl = float(ttl or os.environ.get(CACHE_TTL_ENV, DEFAULT_CACHE_TTL))
+        disk_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR) if disk_dir is None else disk_dir
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(self.disk_dir))
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha256(repr(key).encode()).hexdigest() + ".pkl")
+
+    def _expired(self, created):
+        return time.time() - created > self.ttl
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                stored_key, created = pickle.load(f)
+                if stored_key != key or self._expired(created):
+                    return None
+                return created, pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError) as e:
+            print(f"Ignoring unreadable cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key, created, value):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((key, created), f)
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print(f"Could not write cache entry {path}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """
+        Delete the oldest disk entries until the disk tier fits its size budget.
+        """
+        entries = sorted(os.scandir(self.disk_dir), key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+    def _remember(self, key, created, value):
+        with self._lock:
+            self._memory[key] = (created, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Look up a key in the memory tier, then the disk tier.
+
+        Parameters:
+            key (tuple): Cache key.
+
+        Returns:
+            Tuple[bool, Any]: (hit, value); value is None on a miss.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, *entry)
+
+        hit = entry is not None
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache(self.name, hit)
+        return hit, entry[1] if hit else None
+
+    def set(self, key, value):
+        """
+        Store a value in both tiers.
+        """
+        created = time.time()
+        self._remember(key, created, value)
+        self._write_disk(key, created, value)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for a key, computing and storing it on a miss.
+
+        Parameters:
+            key (tuple): Cache key.
+            compute (Callable[[], Any]): Produces the value on a miss. Exceptions propagate and nothing is stored.
+
+        Returns:
+            Any: The cached or computed value.
+        """
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, predicate):
+        """
+        Remove every entry whose key matches a predicate from both tiers.
+
+        Parameters:
+            predicate (Callable[[tuple], bool]): Returns True for keys to remove.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        removed = 0
+        with self._lock:
+            for key in [key for key in self._memory if predicate(key)]:
+                del self._memory[key]
+                removed += 1
+
+        if self.disk_dir:
+            for entry in os.scandir(self.disk_dir):
+                if not entry.name.endswith(".pkl"):
+                    continue
+                try:
+                    with open(entry.path, "rb") as f:
+                        stored_key, _ = pickle.load(f)
+                    if predicate(stored_key):
+                        size = entry.stat().st_size
+                        os.remove(entry.path)
+                        with self._lock:
+                            self._disk_bytes -= size
+                        removed += 1
+                except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+                    continue
+        return removed
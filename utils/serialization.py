@@ -0,0 +1,104 @@
+import base64
+import gzip
+import json
+import os
+
+import numpy as np
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from utils.metrics import REGISTRY
+
+# Set to also measure the gzip size of every callback response (costs one extra compression)
+PAYLOAD_REPORT_ENV = "BIAS_HUNTER_PAYLOAD_REPORT"
+
+BYTE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 5e7)
+
+PAYLOAD_BYTES = REGISTRY.histogram(
+    "bias_hunter_callback_payload_bytes",
+    "Size of Dash callback responses, uncompressed (json) and gzip-compressed (gzip).",
+    ("output", "encoding"),
+    buckets=BYTE_BUCKETS,
+)
+
+
+def use_fast_json_engine():
+    """
+    Serialize figures with orjson instead of the standard library encoder when it is installed.
+
+    Returns:
+        str: The JSON engine in use.
+    """
+    try:
+        import orjson  # noqa: F401
+
+        pio.json.config.default_engine = "orjson"
+    except ImportError:
+        pio.json.config.default_engine = "json"
+    return pio.json.config.default_engine
+
+
+def _typed_arrays_to_lists(obj):
+    """
+    Replace base64 typed arrays ({"dtype", "bdata"}) in a figure dict with plain lists.
+    """
+    if isinstance(obj, dict):
+        if "bdata" in obj and "dtype" in obj:
+            values = np.frombuffer(base64.b64decode(obj["bdata"]), dtype=np.dtype(obj["dtype"]))
+            if "shape" in obj:
+                values = values.reshape([int(n) for n in str(obj["shape"]).split(",")])
+            return values.tolist()
+        return {key: _typed_arrays_to_lists(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_typed_arrays_to_lists(value) for value in obj]
+    return obj
+
+
+def figure_payload_sizes(fig):
+    """
+    Measure the serialized size of a figure with and without binary typed arrays.
+
+    Parameters:
+        fig (plotly.graph_objects.Figure): The figure to measure.
+
+    Returns:
+        dict: Byte counts for plain JSON lists ("json_lists"), base64 typed arrays
+        ("typed_arrays") and the typed-array payload after gzip ("typed_arrays_gzip").
+    """
+    fig_dict = fig.to_plotly_json()
+    typed = pio.json.to_json_plotly(fig_dict).encode()
+    lists = json.dumps(_typed_arrays_to_lists(fig_dict), cls=PlotlyJSONEncoder).encode()
+    return {
+        "json_lists": len(lists),
+        "typed_arrays": len(typed),
+        "typed_arrays_gzip": len(gzip.compress(typed)),
+    }
+
+
+def register_payload_report(app):
+    """
+    Record the response size of every Dash callback in the metrics registry.
+
+    The uncompressed size is always recorded; the gzip size is only measured when
+    BIAS_HUNTER_PAYLOAD_REPORT is set. The hook is registered after Dash's own
+    compression hook, so Flask runs it first and it sees the uncompressed body.
+
+    Parameters:
+        app (dash.Dash): The Dash app instance.
+    """
+    from flask import request
+
+    report_compressed = os.environ.get(PAYLOAD_REPORT_ENV, "").strip().lower() in {"1", "true", "yes", "on"}
+
+    @app.server.after_request
+    def record_payload(response):
+        if not request.path.endswith("_dash-update-component") or response.direct_passthrough:
+            return response
+
+        body = response.get_data()
+        payload = request.get_json(silent=True) or {}
+        output = str(payload.get("output", "unknown"))
+        PAYLOAD_BYTES.observe(len(body), output, "json")
+        if report_compressed:
+            PAYLOAD_BYTES.observe(len(gzip.compress(body)), output, "gzip")
+        return response
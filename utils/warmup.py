@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+
+from utils.metrics import CALLBACKS_IN_FLIGHT, REGISTRY
+
+# Warmup configuration, overridable through the environment
+WARMUP_TOP_N_ENV = "BIAS_HUNTER_WARMUP_TOP_N"
+WARMUP_CPU_ENV = "BIAS_HUNTER_WARMUP_CPU"
+WARMUP_DELAY_ENV = "BIAS_HUNTER_WARMUP_DELAY"
+
+DEFAULT_WARMUP_TOP_N = 10
+DEFAULT_WARMUP_CPU = 0.25
+DEFAULT_WARMUP_DELAY = 10.0
+
+WARMUP_TASKS = REGISTRY.counter("bias_hunter_warmup_tasks_total", "Cache warmup tasks by outcome.", ("result",))
+
+
+class CacheWarmer(threading.Thread):
+    """
+    Background thread that precomputes cached results at low priority after startup.
+
+    Tasks run one at a time. Before each task the warmer waits until no Dash callback is
+    in flight, so interactive requests always go first, and after each task it sleeps long
+    enough that warmup uses at most `cpu_budget` of the wall clock. A task that is already
+    running is not interrupted, so tasks should be small (one figure or one heatmap cell).
+
+    Attributes:
+        completed (int): Number of tasks that finished.
+        failed (int): Number of tasks that raised.
+    """
+
+    # How often to check whether interactive callbacks have finished, in seconds
+    IDLE_POLL_INTERVAL = 0.25
+
+    def __init__(self, tasks, cpu_budget=None, start_delay=None):
+        """
+        Parameters:
+            tasks (Iterable[Tuple[str, Callable[[], Any]]]): (description, task) pairs, run in order.
+                May be a generator; it is consumed from the warmer thread.
+            cpu_budget (float, optional): Fraction of wall time warmup may use, between 0 and 1.
+                Defaults to BIAS_HUNTER_WARMUP_CPU or 0.25.
+            start_delay (float, optional): Seconds to wait after startup before the first task.
+                Defaults to BIAS_HUNTER_WARMUP_DELAY or 10.
+        """
+        super().__init__(name="cache-warmer", daemon=True)
+        self.tasks = tasks
+        budget = cpu_budget or float(os.environ.get(WARMUP_CPU_ENV, DEFAULT_WARMUP_CPU))
+        self.cpu_budget = min(max(budget, 0.01), 1.0)
+        if start_delay is None:
+            start_delay = os.environ.get(WARMUP_DELAY_ENV, DEFAULT_WARMUP_DELAY)
+        self.start_delay = float(start_delay)
+        self.completed = 0
+        self.failed = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Ask the warmer to stop before its next task.
+        """
+        self._stop_event.set()
+
+    def _wait_until_idle(self):
+        while CALLBACKS_IN_FLIGHT.value() > 0 and not self._stop_event.is_set():
+            self._stop_event.wait(self.IDLE_POLL_INTERVAL)
+
+    def run(self):
+        if self._stop_event.wait(self.start_delay):
+            return
+
+        start = time.perf_counter()
+        for description, task in self.tasks:
+            self._wait_until_idle()
+            if self._stop_event.is_set():
+                return
+
+            task_start = time.perf_counter()
+            try:
+                task()
+                self.completed += 1
+                WARMUP_TASKS.inc("completed")
+            except Exception as e:
+                self.failed += 1
+                WARMUP_TASKS.inc("failed")
+                print(f"Cache warmup task {description!r} failed: {e}")
+            elapsed = time.perf_counter() - task_start
+
+            # Sleep so that busy time / total time stays within the budget
+            if self._stop_event.wait(elapsed * (1 - self.cpu_budget) / self.cpu_budget):
+                return
+
+        print(
+            f"Cache warmup finished: {self.completed} tasks, {self.failed} failed, "
+            f"{time.perf_counter() - start:.0f}s"
+        )
+
+
+def warmup_top_n():
+    """
+    Number of companies to warm, from BIAS_HUNTER_WARMUP_TOP_N. Zero disables warmup.
+    """
+    return int(os.environ.get(WARMUP_TOP_N_ENV, DEFAULT_WARMUP_TOP_N))
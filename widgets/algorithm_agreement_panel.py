@@ -0,0 +1,131 @@
+from dash import dash_table, html
+
+from processing.algorithm_agreement import STATUS_LABELS, STATUSES
+
+# Status colours: agreement green, conflict red, one-sided in the bar chart's algorithm colours
+STATUS_COLORS = {"agreed": "#81c784", "conflict": "#e57373", "bassline_only": "blue", "shadgpt_only": "orange"}
+
+
+class AlgorithmAgreementPanel:
+    """
+    Drill-down of the facts (source, target, article) behind the BassLine vs ShadGPT bar chart:
+    which ones both algorithms extracted with the same edge types, which ones with different
+    edge types, and which ones only one algorithm extracted. Looked up in the bar chart's
+    AlgorithmAgreementIndex for a company or one of its heatmap cells.
+
+    Attributes:
+        html_id (str): The HTML id of the Dash DataTable.
+        horizontal_bar (HorizontalBarPlot): Provides the agreement index.
+    """
+
+    # Rows sent to the browser, disagreements first; the table is sorted and filtered client-side
+    MAX_ROWS = 500
+
+    def __init__(self, html_id, horizontal_bar):
+        self.html_id = html_id
+        self.horizontal_bar = horizontal_bar
+
+    def compute(self, company, month=None, source=None):
+        """
+        Status counts and fact rows of a company, or of one heatmap cell of it.
+
+        Parameters:
+            company (str): Company name; facts with the company at either end count.
+            month (str, optional): Heatmap period string of any resolution.
+            source (str, optional): Full news source name.
+
+        Returns:
+            Tuple[dict, List[dict]]: Count per status, and at most MAX_ROWS rows with the
+            source, target, article, date, status label and both algorithms' edge types.
+        """
+        index = self.horizontal_bar.agreement
+        if month is None and source is None:
+            counts = index.summary(company)
+            facts = index.lookup(company)
+        else:
+            facts = index.lookup(company, month, source)
+            counts = facts["status"].value_counts().reindex(STATUSES, fill_value=0).to_dict()
+        # Disagreements first: conflicts, then one-sided facts, then agreed ones
+        order = {"conflict": 0, "bassline_only": 1, "shadgpt_only": 2, "agreed": 3}
+        facts = facts.assign(_order=facts["status"].map(order).astype(int)).sort_values(["_order", "date"])
+        facts = facts.head(self.MAX_ROWS)
+        rows = [
+            {
+                "source": fact_source,
+                "target": target,
+                "article": article,
+                "date": date.strftime("%Y-%m-%d"),
+                "status": STATUS_LABELS[status],
+                "bassline": bassline,
+                "shadgpt": shadgpt,
+            }
+            for fact_source, target, article, date, status, bassline, shadgpt in zip(
+                facts["source"],
+                facts["target"],
+                facts["article"],
+                facts["date"],
+                facts["status"],
+                index.type_names(facts["bassline"]),
+                index.type_names(facts["shadgpt"]),
+            )
+        ]
+        return counts, rows
+
+    def render(self, company, month=None, source=None):
+        """
+        Render the status counts and the fact table of a company, or of one heatmap cell of it.
+
+        Returns:
+            dash.html.Div: Title, status counts and the Dash DataTable.
+        """
+        counts, rows = self.compute(company, month, source)
+        title = f"BassLine vs ShadGPT facts: {company}"
+        if month is not None:
+            title += f" ({source}, {month})"
+        columns = [
+            {"name": "Status", "id": "status"},
+            {"name": "Source", "id": "source"},
+            {"name": "Target", "id": "target"},
+            {"name": "Article", "id": "article"},
+            {"name": "Date", "id": "date"},
+            {"name": "BassLine types", "id": "bassline"},
+            {"name": "ShadGPT types", "id": "shadgpt"},
+        ]
+        return html.Div(
+            style={"height": "100%", "display": "flex", "flexDirection": "column", "padding": "8px 12px"},
+            children=[
+                html.H3(
+                    title,
+                    style={"color": "#083B6E", "fontSize": "1.1rem", "fontWeight": "normal", "margin": "0 0 8px"},
+                ),
+                html.Div(
+                    [
+                        html.Span(
+                            f"{STATUS_LABELS[status]}: {counts[status]}",
+                            style={"color": STATUS_COLORS[status], "marginRight": "16px", "fontWeight": "bold"},
+                        )
+                        for status in STATUSES
+                    ],
+                    style={"fontFamily": "Arial, sans-serif", "fontSize": "12px", "marginBottom": "6px"},
+                ),
+                dash_table.DataTable(
+                    id=self.html_id,
+                    data=rows,
+                    columns=columns,
+                    sort_action="native",
+                    filter_action="native",
+                    page_action="native",
+                    page_size=10,
+                    style_table={"overflowX": "auto"},
+                    style_header={"backgroundColor": "#083B6E", "color": "white", "fontWeight": "bold"},
+                    style_cell={"fontFamily": "Arial, sans-serif", "fontSize": "12px", "color": "#083B6E"},
+                    style_data_conditional=[
+                        {
+                            "if": {"filter_query": f'{{status}} = "{STATUS_LABELS[status]}"', "column_id": "status"},
+                            "color": STATUS_COLORS[status],
+                        }
+                        for status in STATUSES
+                    ],
+                ),
+            ],
+        )
@@ -0,0 +1,122 @@
+from dash import dash_table, dcc, html
+from dash.dash_table.Format import Format, Scheme, Sign
+
+from processing.annotator_agreement import AnnotatorAgreement
+
+
+class AnnotatorAgreementTable:
+    """
+    Sortable ranking of the annotators, or (annotator, company) pairs, whose edge types
+    disagree most with the other annotators. Clicking a pair row shows that company's
+    edge type and annotator charts like a graph click.
+
+    Attributes:
+        html_id (str): The HTML id of the Dash DataTable; the level selector is "<html_id>-level".
+        pcp (PCP): Provides the raw links with their annotators and the edge type sentiment.
+        heatmap (Heatmap): Provides the companies to compute statistics for.
+    """
+
+    # Rows sent to the browser; the table is sorted client-side
+    MAX_ROWS = 500
+    LEVELS = {"annotator": "Annotators", "pair": "Annotator × company"}
+    # A few links always diverge from the consensus; rank only pairs with enough evidence
+    MIN_LINKS = {"annotator": 1, "pair": 5}
+    # Columns without values at each level
+    HIDDEN_COLUMNS = {"annotator": ["company"], "pair": ["companies", "company_jsd"]}
+
+    def __init__(self, html_id, pcp, heatmap):
+        self.html_id = html_id
+        self.pcp = pcp
+        self.heatmap = heatmap
+
+    def compute(self):
+        """
+        Agreement statistics of every annotator and company, see AnnotatorAgreement.
+        """
+        return AnnotatorAgreement(self.pcp.df_links, self.pcp.edge_type_sentiment, self.heatmap.valid_companies)
+
+    def compute_rows(self, agreement, level="annotator"):
+        """
+        Annotators or (annotator, company) pairs, most divergent from the consensus first, as table rows.
+
+        Parameters:
+            agreement (AnnotatorAgreement): Output of `compute`.
+            level (str): "annotator" or "pair".
+
+        Returns:
+            List[dict]: Rows with the statistics columns and a row "id" (the row's position), at most
+            MAX_ROWS, leaving out rows with fewer than MIN_LINKS links.
+        """
+        ranked = agreement.ranked(level, min_links=self.MIN_LINKS[level]).head(self.MAX_ROWS)
+        float_columns = ["jsd", "sentiment_skew", "max_deviation"] + (["company_jsd"] if level == "annotator" else [])
+        ranked[float_columns] = ranked[float_columns].round(3)
+        rows = ranked.to_dict("records")
+        for i, row in enumerate(rows):
+            row["id"] = i
+        return rows
+
+    def render(self, rows):
+        """
+        Render the level selector and the annotator agreement table.
+
+        Parameters:
+            rows (List[dict]): Output of `compute_rows`.
+
+        Returns:
+            dash.html.Div: Title, level selector and the Dash DataTable.
+        """
+        score = Format(precision=2, scheme=Scheme.fixed, sign=Sign.positive)
+        divergence = Format(precision=3, scheme=Scheme.fixed)
+        columns = [
+            {"name": "Annotator", "id": "annotator"},
+            {"name": "Company", "id": "company"},
+            {"name": "Links", "id": "links", "type": "numeric"},
+            {"name": "Others' links", "id": "consensus_links", "type": "numeric"},
+            {"name": "Companies", "id": "companies", "type": "numeric"},
+            {"name": "JS divergence", "id": "jsd", "type": "numeric", "format": divergence},
+            {"name": "Mean company JSD", "id": "company_jsd", "type": "numeric", "format": divergence},
+            {"name": "Sentiment skew", "id": "sentiment_skew", "type": "numeric", "format": score},
+            {"name": "Most skewed type", "id": "max_deviation_type"},
+            {"name": "Rate deviation", "id": "max_deviation", "type": "numeric", "format": score},
+        ]
+        return html.Div(
+            style={"height": "100%", "display": "flex", "flexDirection": "column", "padding": "8px 12px"},
+            children=[
+                html.H3(
+                    "Annotator agreement: edge types vs the other annotators",
+                    style={"color": "#083B6E", "fontSize": "1.1rem", "fontWeight": "normal", "margin": "0 0 8px"},
+                ),
+                dcc.RadioItems(
+                    id=f"{self.html_id}-level",
+                    options=[{"label": label, "value": value} for value, label in self.LEVELS.items()],
+                    value="annotator",
+                    inline=True,
+                    inputStyle={"marginRight": "4px"},
+                    labelStyle={"marginRight": "12px", "color": "#083B6E", "fontSize": "12px"},
+                    style={"marginBottom": "6px"},
+                ),
+                dash_table.DataTable(
+                    id=self.html_id,
+                    data=rows,
+                    columns=columns,
+                    hidden_columns=self.HIDDEN_COLUMNS["annotator"],
+                    sort_action="native",
+                    page_action="native",
+                    page_size=10,
+                    css=[{"selector": ".show-hide", "rule": "display: none"}],
+                    style_table={"overflowX": "auto"},
+                    style_header={"backgroundColor": "#083B6E", "color": "white", "fontWeight": "bold"},
+                    style_cell={"fontFamily": "Arial, sans-serif", "fontSize": "12px", "color": "#083B6E"},
+                    style_data_conditional=[
+                        {
+                            "if": {"filter_query": "{sentiment_skew} < 0", "column_id": "sentiment_skew"},
+                            "color": "#e57373",
+                        },
+                        {
+                            "if": {"filter_query": "{sentiment_skew} > 0", "column_id": "sentiment_skew"},
+                            "color": "#81c784",
+                        },
+                    ],
+                ),
+            ],
+        )
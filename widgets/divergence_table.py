@@ -0,0 +1,90 @@
+from dash import dash_table, html
+from dash.dash_table.Format import Format, Scheme, Sign
+
+from processing.divergence import article_scores, divergence_cells
+from processing.rollups import DEFAULT_RESOLUTION
+
+
+class DivergenceTable:
+    """
+    Sortable table of the heatmap cells where CatchNet's triplet sentiment and the articles'
+    sentiment disagree most. Clicking a row selects that cell like a heatmap click.
+
+    Attributes:
+        html_id (str): The HTML id of the Dash DataTable.
+        heatmap (Heatmap): Provides the sentiment rollup and the enriched links.
+        sentiment_index (SentimentIndex): Provides the precomputed article scores.
+    """
+
+    # Rows sent to the browser; the table is sorted client-side
+    MAX_ROWS = 500
+
+    def __init__(self, html_id, heatmap, sentiment_index):
+        self.html_id = html_id
+        self.heatmap = heatmap
+        self.sentiment_index = sentiment_index
+
+    def compute_rows(self, resolution=DEFAULT_RESOLUTION):
+        """
+        Divergence of every cell at a time resolution, most divergent first, as table rows.
+
+        Returns:
+            List[dict]: Rows with the columns of processing.divergence.DIVERGENCE_COLUMNS and a
+            row "id" (the row's position), at most MAX_ROWS.
+        """
+        scores = article_scores(self.sentiment_index, self.heatmap.valid_companies)
+        cells = divergence_cells(self.heatmap.rollup, self.heatmap.df_links, scores, resolution)
+        # Article scores come from float16 probabilities; round in float64 so rows show clean values
+        float_columns = {"catchnet": "float64", "article_score": "float64", "gap": "float64"}
+        cells = cells.head(self.MAX_ROWS).astype(float_columns).round(3)
+        rows = cells.to_dict("records")
+        for i, row in enumerate(rows):
+            row["id"] = i
+        return rows
+
+    def render(self, rows):
+        """
+        Render the divergence table.
+
+        Parameters:
+            rows (List[dict]): Output of `compute_rows`.
+
+        Returns:
+            dash.html.Div: Title and the Dash DataTable.
+        """
+        score = Format(precision=2, scheme=Scheme.fixed, sign=Sign.positive)
+        columns = [
+            {"name": "Company", "id": "company"},
+            {"name": "Source", "id": "source"},
+            {"name": "Period", "id": "period"},
+            {"name": "CatchNet", "id": "catchnet", "type": "numeric", "format": score},
+            {"name": "Articles", "id": "article_score", "type": "numeric", "format": score},
+            {"name": "Gap", "id": "gap", "type": "numeric", "format": score},
+            {"name": "Links", "id": "links", "type": "numeric"},
+            {"name": "Cited", "id": "articles", "type": "numeric"},
+            {"name": "Scored", "id": "scored", "type": "numeric"},
+        ]
+        return html.Div(
+            style={"height": "100%", "display": "flex", "flexDirection": "column", "padding": "8px 12px"},
+            children=[
+                html.H3(
+                    "Most suspicious cells: CatchNet vs article sentiment",
+                    style={"color": "#083B6E", "fontSize": "1.1rem", "fontWeight": "normal", "margin": "0 0 8px"},
+                ),
+                dash_table.DataTable(
+                    id=self.html_id,
+                    data=rows,
+                    columns=columns,
+                    sort_action="native",
+                    page_action="native",
+                    page_size=10,
+                    style_table={"overflowX": "auto"},
+                    style_header={"backgroundColor": "#083B6E", "color": "white", "fontWeight": "bold"},
+                    style_cell={"fontFamily": "Arial, sans-serif", "fontSize": "12px", "color": "#083B6E"},
+                    style_data_conditional=[
+                        {"if": {"filter_query": "{gap} < 0", "column_id": "gap"}, "color": "#e57373"},
+                        {"if": {"filter_query": "{gap} > 0", "column_id": "gap"}, "color": "#81c784"},
+                    ],
+                ),
+            ],
+        )
@@ -1,16 +1,25 @@
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 import plotly.express as px
-from dash import dcc
+from dash import Patch, dcc, html
 import plotly.graph_objects as go
 import numpy as np
 
+from processing.rollups import DEFAULT_RESOLUTION, RESOLUTIONS, SentimentRollup, period_mask
+from utils.metrics import stage
+
 
 class Heatmap:
-    def __init__(self, data, html_id):
+    def __init__(self, data, html_id, tables=None):
         """
         Initialize Heatmap with graph data and HTML component ID.
+
+        `tables` (GraphTables from processing.ingest) can be given instead of the raw `data` dict.
         """
         self.html_id = html_id
+        self.tables = tables
 
         self.company_types = {
             "Entity.Organization.FishingCompany",
@@ -26,8 +35,10 @@ class Heatmap:
         self.df_nodes, self.df_links = self._create_dfs()
         self.valid_companies = set(self.df_nodes[self.df_nodes["type"].isin(self.company_types)]["id"])
         self.selected_articles = None
-        self.row_mapping = None
-        self.col_mapping = None
+        self.company_name = None
+        self._templates = OrderedDict()  # Figure skeletons per axis set, see figure_template
+        self._templates_lock = threading.Lock()  # Callbacks and the cache warmer share the skeletons
+        self._period_labels = {}  # Column labels per resolution, see period_labels
 
         self.event_sentiment_map = {
             "Event.Applaud": ("positive", "target"),
@@ -46,11 +57,71 @@ class Heatmap:
         }
 
         self._prepare_links()
+        self.rollup = SentimentRollup.from_scores(self._scores(self.df_links))
+
+        # Label mappings cover every source and period, so they stay valid whichever company was drawn last
+        self.row_mapping = {
+            self._abbreviate(name): name for name in sorted(self.df_links["_raw_source"].dropna().astype(str).unique())
+        }
+
+    @staticmethod
+    def _abbreviate(name):
+        """
+        Abbreviate a source name to its initials, e.g. "Lomark Daily" -> "L.D".
+        """
+        return ".".join([word[0] for word in name.split()])
+
+    @staticmethod
+    def _period_label(period, resolution):
+        if resolution == "quarter":
+            return f"Q{period.quarter} {period.year}"
+        if resolution == "week":
+            return f"wk {period.start_time.strftime('%d %b')}"
+        return period.start_time.strftime("%b" if resolution == "month" else "%d %b")
+
+    def period_labels(self, resolution=DEFAULT_RESOLUTION):
+        """
+        Column label of every period of a resolution in the data's time range, e.g. "Feb" for
+        "2035-02". Labels fall back to the full period string if the short ones would repeat,
+        e.g. when the data spans more than a year.
+
+        Returns:
+            dict: Mapping of period string to label.
+        """
+        labels = self._period_labels.get(resolution)
+        if labels is None:
+            periods = self.rollup.periods(resolution)
+            short = [self._period_label(period, resolution) for period in periods]
+            if len(set(short)) < len(short):
+                short = [str(period) for period in periods]
+            labels = dict(zip(periods.astype(str), short))
+            self._period_labels = {**self._period_labels, resolution: labels}
+        return labels
+
+    def time_range(self):
+        """
+        First and last day with links, as "YYYY-MM-DD" strings, or (None, None) without data.
+        """
+        if self.rollup.first_day is None:
+            return None, None
+        return str(self.rollup.first_day), str(self.rollup.last_day)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_templates_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._templates_lock = threading.Lock()
 
     def _create_dfs(self):
         """
         Convert raw node and link data into DataFrames.
         """
+        if self.tables is not None:
+            # Copy, since the link table is enriched in place
+            return self.tables.nodes.copy(), self.tables.links.copy()
         df_nodes = pd.DataFrame(self.data["nodes"])
         df_links = pd.DataFrame(self.data["links"])
         return df_nodes, df_links
@@ -76,122 +147,258 @@ class Heatmap:
         """
         Enrich links with sentiment and company data, convert dates, and extract month.
         """
-        df = self.df_links
-        df[["sentiment", "sentiment_recipient"]] = df["type"].apply(
-            lambda x: pd.Series(self.event_sentiment_map.get(x, ("neutral", "target")))
+        self.df_links = self._enrich_links(self.df_links)
+
+    def _enrich_links(self, df):
+        """
+        Add sentiment, sentiment recipient, company and month columns to raw links,
+        dropping links that involve no known company.
+        """
+        # Iterate the values rather than Series.apply, which maps categorical columns per category
+        df[["sentiment", "sentiment_recipient"]] = pd.DataFrame(
+            [self.event_sentiment_map.get(x, ("neutral", "target")) for x in df["type"]],
+            index=df.index,
+            columns=["sentiment", "sentiment_recipient"],
         )
         df["company"] = df.apply(self._get_company_from_link, axis=1)
         df.dropna(subset=["company"], inplace=True)
         df["_date_added"] = pd.to_datetime(df["_date_added"], errors="coerce")
         df["month"] = df["_date_added"].dt.to_period("M")
-        self.df_links = df
+        return df
+
+    def _scores(self, df):
+        """
+        Scored rows for the sentiment rollup, from the enriched links the heatmap cells average over.
+        """
+        df = df.dropna()
+        return pd.DataFrame(
+            {
+                "company": df["company"],
+                "source": df["_raw_source"],
+                "date": df["_date_added"],
+                "score": df["sentiment"].map(self.sentiment_score_map),
+            }
+        )
+
+    def add_links(self, new_links, new_nodes=None):
+        """
+        Append newly ingested links (and nodes) without rebuilding the widget.
+
+        The link table is replaced rather than modified, so callbacks running concurrently
+        keep a consistent view.
+
+        Parameters:
+            new_links (pd.DataFrame): Raw link rows, as in the node-link "links" list.
+            new_nodes (pd.DataFrame, optional): Raw node rows added alongside them.
+
+        Returns:
+            pd.DataFrame: The new links that were attributed to a company, with their enriched columns.
+        """
+        if new_nodes is not None and len(new_nodes):
+            self.df_nodes = pd.concat([self.df_nodes, new_nodes])
+            new_companies = set(new_nodes[new_nodes["type"].isin(self.company_types)]["id"])
+            self.valid_companies = self.valid_companies | new_companies
+        if not len(new_links):
+            return new_links
+
+        enriched = self._enrich_links(new_links.copy())
+        self.df_links = pd.concat([self.df_links, enriched])
+        self.rollup = self.rollup.with_scores(self._scores(enriched))
+        self._period_labels = {}
+
+        new_sources = set(enriched["_raw_source"].dropna().astype(str)) - set(self.row_mapping.values())
+        if new_sources:
+            self.row_mapping = {**self.row_mapping, **{self._abbreviate(name): name for name in new_sources}}
+        return enriched
 
     def generate_figure(self, company_name, clickData=None):
         """
-        Create a heatmap figure showing sentiment over time for a company.
+        Create a heatmap figure showing sentiment over time for a company,
+        and remember the company for later cell lookups.
         """
         self.company_name = company_name
-        df = self.df_links[self.df_links["company"] == self.company_name].dropna().copy()
-        self.selected_articles = df["_articleid"]
+        self.selected_articles = self.df_links.loc[self.df_links["company"] == company_name, "_articleid"]
+        return self.build_figure(company_name)
 
-        if df.empty:
-            return px.imshow([[0]], title="No sentiment data available")
+    def build_figure(self, company_name, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+        """
+        Create the heatmap figure for a company without changing the widget's state,
+        so it can be called from background threads.
+        """
+        return self.figure_from_values(self.cell_values(company_name, resolution, start, end))
 
-        df["score"] = df["sentiment"].map(self.sentiment_score_map)
-        df["month"] = df["month"].astype(str)
+    def cell_values(self, company_name, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+        """
+        Look up what differs between companies' heatmaps in the sentiment rollup: axis labels,
+        cell scores, empty-cell mask and title.
 
-        fixed_months = pd.period_range(start="2035-02", end="2035-07", freq="M").astype(str)
-        df_heat = df.groupby(["month", "_raw_source"])["score"].mean().reset_index()
-        heatmap_data = df_heat.pivot(index="_raw_source", columns="month", values="score")
-        heatmap_data = heatmap_data.reindex(columns=fixed_months, fill_value=np.nan)
+        Parameters:
+            company_name (str): Company to show.
+            resolution (str): "day", "week", "month" or "quarter".
+            start, end (str, optional): Dates to restrict the columns to. Default to the data's time range.
 
-        original_cols = heatmap_data.columns
-        heatmap_data.columns = pd.to_datetime(heatmap_data.columns).strftime("%b")
-        self.col_mapping = dict(zip(heatmap_data.columns, original_cols))
+        Returns:
+            dict or None: Keys "axes" ((source labels, period labels)), "z" (mean score per cell,
+            NaN where empty), "mask" (1 where empty) and "title"; None if the company has no data.
+        """
+        heatmap_data = self.rollup.cells(company_name, resolution, self.rollup.periods(resolution, start, end))
+        if heatmap_data is None:
+            return None
 
-        original_index = heatmap_data.index
-        abbreviated_index = heatmap_data.index.to_series().apply(
-            lambda name: ".".join([word[0] for word in name.split()])
-        )
-        self.row_mapping = {abbr: name for abbr, name in zip(abbreviated_index, original_index)}
-        heatmap_data.index = abbreviated_index
-        heatmap_data.index.name = "Source"
-
-        fig = px.imshow(
-            heatmap_data,
-            zmin=-1,
-            zmax=1,
-            color_continuous_scale=[[0.0, "red"], [0.5, "white"], [1.0, "green"]],
-            aspect="auto",
-        )
+        labels = self.period_labels(resolution)
+        periods = tuple(labels[period] for period in heatmap_data.columns)
+        sources = tuple(self._abbreviate(name) for name in heatmap_data.index)
+        return {
+            "axes": (sources, periods),
+            "z": heatmap_data.to_numpy(),
+            "mask": heatmap_data.isna().to_numpy(dtype=np.uint8),
+            "title": f"Sentiment Toward {company_name}<br>Over Time (extracted from CatchNet)",
+        }
 
-        fig.update_traces(
-            hovertemplate="Score: %{z}<extra></extra>",
-            zauto=False,
-            zsmooth=False,
-            xgap=2,
-            ygap=2,
-            showscale=True,
-            hoverongaps=False,
-            autocolorscale=False,
-        )
+    # Number of source/period axis sets whose figure skeleton is kept
+    MAX_TEMPLATES = 16
 
-        fig.update_layout(
-            coloraxis_colorbar=dict(
-                thickness=10,
-                tickfont=dict(size=10),
-                orientation="h",
-                x=0.5,
-                xanchor="center",
-                y=-0.2,
-            ),
-            margin=dict(t=85, l=0, r=0),
-            paper_bgcolor="#B9D3F6",
-            plot_bgcolor="white",
-            xaxis=dict(tickangle=0, color="#083B6E", tickfont=dict(color="#083B6E", size=14)),
-            yaxis=dict(color="#083B6E", tickfont=dict(color="#083B6E", size=14), tickangle=90),
-            title=dict(
-                text=f"Sentiment Toward {self.company_name}<br>Over Time (extracted from CatchNet)",
-                x=0.5,
-                y=0.95,
-                xanchor="center",
-                font=dict(size=15),
-            ),
-            font=dict(color="#083B6E", size=12),
-        )
+    def figure_template(self, axes):
+        """
+        Return the figure skeleton (traces, styling and annotations, but no cell values) for
+        a set of source and period labels, building it on first use.
 
-        fig.add_annotation(
-            text="Sentiment",
-            x=0.5,
-            y=-0.17,
-            xref="paper",
-            yref="paper",
-            showarrow=False,
-            font=dict(size=12, color="#083B6E"),
-            xanchor="center",
-            yanchor="top",
-        )
+        Parameters:
+            axes (Tuple[Tuple[str], Tuple[str]]): Source labels (rows) and period labels (columns).
 
-        fig.update_traces(z=heatmap_data.to_numpy())
+        Returns:
+            plotly.graph_objects.Figure: The shared skeleton. Copy it before modifying.
+        """
+        with self._templates_lock:
+            if axes in self._templates:
+                self._templates.move_to_end(axes)
+                return self._templates[axes]
+
+        sources, months = axes
+        empty = pd.DataFrame(np.nan, index=pd.Index(list(sources), name="Source"), columns=list(months))
+
+        with stage("heatmap_template"):
+            fig = px.imshow(
+                empty,
+                zmin=-1,
+                zmax=1,
+                color_continuous_scale=[[0.0, "red"], [0.5, "white"], [1.0, "green"]],
+                aspect="auto",
+            )
 
-        fig.add_trace(
-            go.Heatmap(
-                z=heatmap_data.isna().astype(int),
-                x=heatmap_data.columns,
-                y=heatmap_data.index,
-                showscale=False,
-                colorscale=[[0, "rgba(0,0,0,0)"], [1, "lightgrey"]],
-                hoverinfo="skip",
+            fig.update_traces(
+                hovertemplate="Score: %{z}<extra></extra>",
+                zauto=False,
+                zsmooth=False,
                 xgap=2,
                 ygap=2,
+                showscale=True,
+                hoverongaps=False,
+                autocolorscale=False,
+            )
+
+            fig.update_layout(
+                coloraxis_colorbar=dict(
+                    thickness=10,
+                    tickfont=dict(size=10),
+                    orientation="h",
+                    x=0.5,
+                    xanchor="center",
+                    y=-0.2,
+                ),
+                margin=dict(t=85, l=0, r=0),
+                paper_bgcolor="#B9D3F6",
+                plot_bgcolor="white",
+                xaxis=dict(tickangle=0, color="#083B6E", tickfont=dict(color="#083B6E", size=14)),
+                yaxis=dict(color="#083B6E", tickfont=dict(color="#083B6E", size=14), tickangle=90),
+                title=dict(
+                    text="",
+                    x=0.5,
+                    y=0.95,
+                    xanchor="center",
+                    font=dict(size=15),
+                ),
+                font=dict(color="#083B6E", size=12),
+            )
+
+            fig.add_annotation(
+                text="Sentiment",
+                x=0.5,
+                y=-0.17,
+                xref="paper",
+                yref="paper",
+                showarrow=False,
+                font=dict(size=12, color="#083B6E"),
+                xanchor="center",
+                yanchor="top",
+            )
+
+            fig.add_trace(
+                go.Heatmap(
+                    z=np.ones((len(sources), len(months)), dtype=np.uint8),
+                    x=list(months),
+                    y=list(sources),
+                    showscale=False,
+                    colorscale=[[0, "rgba(0,0,0,0)"], [1, "lightgrey"]],
+                    hoverinfo="skip",
+                    xgap=2,
+                    ygap=2,
+                )
             )
-        )
 
-        fig.update_xaxes(side="bottom", showgrid=True, gridcolor="lightgray", tickangle=0)
-        fig.update_yaxes(showgrid=True, gridcolor="lightgray")
+            fig.update_xaxes(side="bottom", showgrid=True, gridcolor="lightgray", tickangle=0)
+            fig.update_yaxes(showgrid=True, gridcolor="lightgray")
 
+        with self._templates_lock:
+            self._templates[axes] = fig
+            while len(self._templates) > self.MAX_TEMPLATES:
+                self._templates.popitem(last=False)
         return fig
 
+    def figure_from_values(self, values):
+        """
+        Fill a copy of the matching figure skeleton with a company's cell values.
+
+        Parameters:
+            values (dict or None): Output of `cell_values`.
+
+        Returns:
+            plotly.graph_objects.Figure: The heatmap figure.
+        """
+        if values is None:
+            return px.imshow([[0]], title="No sentiment data available")
+
+        fig = go.Figure(self.figure_template(values["axes"]))
+        fig.data[0].z = values["z"]
+        fig.data[1].z = values["mask"]
+        fig.layout.title.text = values["title"]
+        return fig
+
+    def shown_axes(self, company_name, resolution=DEFAULT_RESOLUTION, start=None, end=None):
+        """
+        Source and period labels of a company's heatmap as JSON lists, or None if it has no data.
+        """
+        values = self.cell_values(company_name, resolution, start, end)
+        return None if values is None else [list(labels) for labels in values["axes"]]
+
+    @staticmethod
+    def patch_from_values(values):
+        """
+        Partial figure update that swaps a company's cell values into a heatmap already
+        showing the same axes, instead of sending the whole figure.
+
+        Parameters:
+            values (dict): Output of `cell_values`, not None.
+
+        Returns:
+            dash.Patch: Update of the score matrix, empty-cell mask and title.
+        """
+        patch = Patch()
+        patch["data"][0]["z"] = np.where(np.isnan(values["z"]), None, values["z"]).tolist()
+        patch["data"][1]["z"] = values["mask"].tolist()
+        patch["layout"]["title"]["text"] = values["title"]
+        return patch
+
     def render(self, company_name, clickData=None):
         """
         Render the heatmap as a Dash Graph component.
@@ -199,60 +406,76 @@ class Heatmap:
         fig = self.generate_figure(company_name, clickData)
         return dcc.Graph(id=self.html_id, figure=fig)
 
-    def get_articles(self, month, source):
+    def render_time_controls(self):
         """
-        Return article IDs for the selected company, month, and source.
+        Render the resolution switch and the date range picker, bounded by the data's time range.
+
+        Returns:
+            dash.html.Div: Div with the "heatmap-resolution" radio items and the "heatmap-range" picker.
         """
-        filtered = self.df_links[
-            (self.df_links["company"] == self.company_name)
-            & (self.df_links["month"] == month[:7])
-            & (self.df_links["_raw_source"] == source)
-        ]
+        first_day, last_day = self.time_range()
+        return html.Div(
+            style={"display": "flex", "flexWrap": "wrap", "alignItems": "center", "gap": "6px", "color": "#083B6E"},
+            children=[
+                dcc.RadioItems(
+                    id="heatmap-resolution",
+                    options=[{"label": resolution.capitalize(), "value": resolution} for resolution in RESOLUTIONS],
+                    value=DEFAULT_RESOLUTION,
+                    inline=True,
+                    inputStyle={"marginRight": "4px", "marginLeft": "8px"},
+                ),
+                dcc.DatePickerRange(
+                    id="heatmap-range",
+                    min_date_allowed=first_day,
+                    max_date_allowed=last_day,
+                    start_date=first_day,
+                    end_date=last_day,
+                    display_format="YYYY-MM-DD",
+                    clearable=True,
+                ),
+            ],
+        )
+
+    def get_articles(self, period, source, company_name=None):
+        """
+        Return article IDs for the selected company, period, and source.
+
+        Defaults to the company of the last generated figure.
+        """
+        if period is None:
+            return []
+        company_name = company_name or self.company_name
+        links = self.df_links[(self.df_links["company"] == company_name) & (self.df_links["_raw_source"] == source)]
+        filtered = links[period_mask(links["_date_added"], period)]
         return list(set(filtered["_articleid"]))
 
-    def map_abbr_to_full(self, source_abbr, month_abbr):
+    def map_abbr_to_full(self, source_abbr, period_label, resolution=DEFAULT_RESOLUTION):
         """
-        Map abbreviated labels back to full source and month.
+        Map abbreviated labels back to full source and period string.
         """
         full_source = self.row_mapping.get(source_abbr)
-        full_month = self.col_mapping.get(month_abbr)
-        return full_source, full_month
+        col_mapping = {label: period for period, label in self.period_labels(resolution).items()}
+        return full_source, col_mapping.get(period_label)
 
-    def get_sentiment_score(self, clickData):
+    def get_sentiment_score(self, clickData, company_name=None, resolution=DEFAULT_RESOLUTION):
         """
         Return sentiment score of a clicked heatmap cell, or None.
+
+        Defaults to the company of the last generated figure.
         """
         if not clickData:
             return None
 
         try:
             point = clickData["points"][0]
-            raw_month = point["x"]
-            source = str(point["y"])
-            source, raw_month = self.map_abbr_to_full(source, raw_month)
-
-            if isinstance(raw_month, str):
-                month = raw_month[:7]  # assume format "YYYY-MM-DD" or "YYYY-MM"
-            elif hasattr(raw_month, "strftime"):  # datetime or Timestamp
-                month = raw_month.strftime("%Y-%m")
-            else:
-                month = str(raw_month)[:7]
-
+            source, period = self.map_abbr_to_full(str(point["y"]), point["x"], resolution)
         except (KeyError, IndexError, TypeError) as e:
             print("Error parsing clickData:", e)
             return None
 
-        df = self.df_links[self.df_links["company"] == self.company_name].copy()
-        df["score"] = df["sentiment"].map(self.sentiment_score_map)
-        df["month"] = df["month"].dt.to_timestamp().dt.strftime("%Y-%m")
-        df["_raw_source"] = df["_raw_source"].astype(str)
-
-        df_heat = df.groupby(["month", "_raw_source"])["score"].mean().reset_index()
-        heatmap_data = df_heat.pivot(index="_raw_source", columns="month", values="score")
-
-        try:
-            score = heatmap_data.loc[source, month]
-            return None if pd.isna(score) else round(score, 3)
-        except KeyError as e:
-            print(f"Lookup failed. Source: '{source}', Month: '{month}' not found.")
+        company_name = company_name or self.company_name
+        score = None if source is None or period is None else self.rollup.score(company_name, source, period)
+        if score is None:
+            print(f"Lookup failed. Source: '{source}', Period: '{period}' not found.")
             return None
+        return round(score, 3)
@@ -3,15 +3,19 @@ import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc
 
+from processing.algorithm_agreement import AlgorithmAgreementIndex
+from processing.rollups import period_mask
+
 
 class HorizontalBarPlot:
     """
     A class to create a horizontal bar chart comparing edge type frequencies between
-    two algorithms: BassLine and ShadGPT."""
+    two algorithms: BassLine and ShadGPT. `agreement` joins both algorithms' links fact by fact."""
 
-    def __init__(self, data, html_id):
+    def __init__(self, data, html_id, tables=None):
         self.html_id = html_id
         self.data = data
+        self.tables = tables  # Optional GraphTables from processing.ingest, used instead of `data`
 
         # Mapping edge types to sentiment categories
         self.edge_type_sentiment = {
@@ -33,15 +37,40 @@ class HorizontalBarPlot:
         self.df_nodes, self.df_links = self._create_dfs()
         self.edge_types_available = self._get_edge_types()
         self.color_map = self._generate_color_map()
+        self.agreement = AlgorithmAgreementIndex.from_links(self.df_links)
         self._prepare_plot_df(None)
         self.fig = self.generate_figure()
 
     def _create_dfs(self):
-        """Create DataFrames from raw node/link JSON structures."""
+        """Create DataFrames from raw node/link JSON structures, or take them from the ingested tables."""
+        if self.tables is not None:
+            return self.tables.nodes.copy(), self.tables.links.copy()
         nodes = self.data["nodes"]
         links = self.data["links"]
         return pd.DataFrame(nodes), pd.DataFrame(links)
 
+    def add_links(self, new_links, new_nodes=None):
+        """
+        Append newly ingested links (and nodes) without rebuilding the widget.
+
+        Parameters:
+            new_links (pd.DataFrame): Raw link rows.
+            new_nodes (pd.DataFrame, optional): Raw node rows added alongside them.
+
+        Returns:
+            bool: True if the links introduced edge types that were not plotted before.
+        """
+        if new_nodes is not None and len(new_nodes):
+            self.df_nodes = pd.concat([self.df_nodes, new_nodes])
+        if not len(new_links):
+            return False
+        self.df_links = pd.concat([self.df_links, new_links])
+        self.agreement = self.agreement.with_links(new_links)
+        edge_types = self._get_edge_types()
+        new_types = set(edge_types) != set(self.edge_types_available)
+        self.edge_types_available = edge_types
+        return new_types
+
     def _get_edge_types(self):
         """Get unique edge types sorted by sentiment (neg → neu → pos)."""
         types = self.df_links["type"].unique()
@@ -65,7 +94,13 @@ class HorizontalBarPlot:
         selected_point : str or None
                         The node selected from the graph.
         heatmap_filter : tuple(str, str) or None
-                        A (month, source) tuple for additional filtering.
+                        A (period, source) tuple for additional filtering, with the period
+                        as a day, week, month or quarter string, e.g. "2035-02".
+
+        Returns:
+        --------
+        df_plot : pd.DataFrame
+                        Edge type counts per algorithm, also stored as `self.df_plot`.
         """
         if selected_point is None:
             # Default to root company if nothing selected
@@ -82,12 +117,11 @@ class HorizontalBarPlot:
                 filtered_df = filtered_df.copy()
                 filtered_df["_date_added"] = pd.to_datetime(filtered_df["_date_added"])
 
-                filter_date = pd.to_datetime(heatmap_filter[0])
+                filter_period = heatmap_filter[0]
                 filter_source = heatmap_filter[1]
 
                 filtered_df = filtered_df[
-                    (filtered_df["_date_added"].dt.year == filter_date.year)
-                    & (filtered_df["_date_added"].dt.month == filter_date.month)
+                    period_mask(filtered_df["_date_added"], filter_period)
                     & (filtered_df["_raw_source"] == filter_source)
                 ]
 
@@ -111,16 +145,24 @@ class HorizontalBarPlot:
         df_plot["_algorithm_code"] = df_plot["_algorithm"].map(self.color_map)
 
         self.df_plot = df_plot
+        return df_plot
 
-    def generate_figure(self, month="", source=""):
+    def generate_figure(self, month="", source="", df_plot=None):
         """
         Create the vertical bar plot comparing edge type counts.
 
+        Parameters:
+        -----------
+        df_plot : pd.DataFrame or None
+                        Counts returned by `_prepare_plot_df`. Defaults to `self.df_plot`.
+
         Returns:
         --------
         fig : plotly.graph_objects.Figure
                         The constructed Plotly figure object.
         """
+        if df_plot is None:
+            df_plot = self.df_plot
         fig = go.Figure()
 
         # Define bar colors
@@ -128,7 +170,7 @@ class HorizontalBarPlot:
 
         # Plot bars for each algorithm
         for alg in ["BassLine", "ShadGPT"]:
-            df_alg = self.df_plot[self.df_plot["_algorithm"] == alg]
+            df_alg = df_plot[df_plot["_algorithm"] == alg]
             fig.add_trace(
                 go.Bar(
                     x=self.edge_types_available,
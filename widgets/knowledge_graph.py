@@ -1,9 +1,17 @@
+import threading
+
 import networkx as nx
-import community.community_louvain as community_louvain
+import numpy as np
 import plotly.graph_objects as go
-from dash import dcc
+from dash import dcc, html
+
+from processing.graph_index import AdjacencyIndex
+from processing.ingest import add_records_to_graph
+from collections import OrderedDict
 from itertools import cycle
 
+from utils.metrics import stage
+
 
 class KnowledgeGraphPlot:
     """
@@ -11,23 +19,40 @@ class KnowledgeGraphPlot:
 
     Attributes:
         data (dict): Graph data in node-link format.
+        graph (networkx.MultiDiGraph): The full graph, built once.
+        adjacency (AdjacencyIndex): Sparse adjacency per edge type, used for community detection and neighbourhoods.
+        layouts (OrderedDict): Spring layout and Louvain partition per selected edge type set, most recent last.
         edge_types_available (list): Unique edge types found in the graph.
         color_map (dict): Mapping of edge types to Plotly color strings.
         html_id (str): HTML id for the Dash graph component.
     """
 
-    def __init__(self, data, html_id):
+    def __init__(self, data, html_id, tables=None):
         """
         Initialize the KnowledgeGraphPlot instance.
 
         Args:
             data (dict): Graph data in node-link format.
             html_id (str): HTML id for the Dash graph component.
+            tables (GraphTables, optional): Ingested node and link tables, used instead of `data`.
         """
         self.data = data
+        self.graph = tables.to_networkx() if tables is not None else nx.node_link_graph(data, edges="links")
+        self.adjacency = AdjacencyIndex.from_graph(self.graph)
         self.edge_types_available = self._get_edge_types()
         self.color_map = self._generate_color_map()
         self.html_id = html_id
+        self.layouts = OrderedDict()
+        self._layouts_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_layouts_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._layouts_lock = threading.Lock()
 
     def _get_edge_types(self):
         """
@@ -36,8 +61,7 @@ class KnowledgeGraphPlot:
         Returns:
             list: Unique edge types present in the graph.
         """
-        G = nx.node_link_graph(self.data, edges="links")
-        return list({d.get("type") for _, _, d in G.edges(data=True)})
+        return list({d.get("type") for _, _, d in self.graph.edges(data=True)})
 
     def _generate_color_map(self):
         """
@@ -49,21 +73,112 @@ class KnowledgeGraphPlot:
         colors = cycle(["red", "green", "blue", "orange", "purple", "brown", "cyan", "magenta", "gray"])
         return {etype: next(colors) for etype in self.edge_types_available}
 
-    def build_graph(self, selected_types):
+    def add_links(self, new_links, new_nodes=None):
+        """
+        Add newly ingested links (and nodes) to the graph without rebuilding it.
+
+        The graph is copied, extended and swapped in, so figures being generated concurrently
+        keep a consistent view. Memoized layouts of edge type selections that contain one of the
+        new links' types are dropped; all other layouts are unaffected.
+
+        Args:
+            new_links (pd.DataFrame): Raw link rows.
+            new_nodes (pd.DataFrame, optional): Raw node rows added alongside them.
+
+        Returns:
+            set: Edge types of the new links.
+        """
+        graph = self.graph.copy()
+        add_records_to_graph(graph, new_nodes, new_links)
+        self.graph = graph
+        if len(new_links):
+            types = new_links["type"].astype(object).where(new_links["type"].notna(), None)
+            edges = zip(new_links["source"], new_links["target"], types)
+        else:
+            edges = []
+        new_node_ids = new_nodes["id"] if new_nodes is not None and len(new_nodes) else []
+        self.adjacency = self.adjacency.with_edges(edges, new_node_ids)
+
+        changed_types = set(new_links["type"].dropna()) if len(new_links) else set()
+        unseen_types = [etype for etype in sorted(changed_types) if etype not in self.edge_types_available]
+        if unseen_types:
+            self.edge_types_available = self.edge_types_available + unseen_types
+            self.color_map = self._generate_color_map()
+        with self._layouts_lock:
+            self.layouts = OrderedDict((key, value) for key, value in self.layouts.items() if not key & changed_types)
+        return changed_types
+
+    def build_graph(self, selected_types, nodes=None):
         """
         Build a filtered undirected graph containing only edges of the specified types.
 
         Args:
             selected_types (list): Edge types to retain in the graph.
+            nodes (list, optional): Restrict the graph to edges between these nodes.
 
         Returns:
             networkx.Graph: Subgraph containing only edges of the selected types.
         """
-        G = nx.node_link_graph(self.data, edges="links").to_undirected()
+        G = (self.graph if nodes is None else self.graph.subgraph(nodes)).to_undirected()
         filtered_edges = [(u, v, k) for u, v, k, d in G.edges(keys=True, data=True) if d.get("type") in selected_types]
         return G.edge_subgraph(filtered_edges).copy()
 
-    def generate_figure(self, selected_types, highlight_node_id=None):
+    # Number of edge type selections whose layout and partition are kept
+    MAX_LAYOUTS = 32
+
+    def layout_and_partition(self, selected_types, G_filtered=None):
+        """
+        Return the spring layout and Louvain partition of the graph filtered to some edge types,
+        computing them on first use. Results are memoized per edge type set.
+
+        Communities are detected on the summed sparse adjacency of the selected types with a
+        fixed seed, so the same selection always gets the same communities.
+
+        Args:
+            selected_types (list): Edge types in the filtered graph.
+            G_filtered (networkx.Graph, optional): The filtered graph, if already built.
+
+        Returns:
+            tuple: (positions by node, community by node).
+        """
+        key = frozenset(selected_types)
+        with self._layouts_lock:
+            if key in self.layouts:
+                self.layouts.move_to_end(key)
+                return self.layouts[key]
+
+        if G_filtered is None:
+            G_filtered = self.build_graph(selected_types)
+        with stage("layout"):
+            pos = nx.spring_layout(G_filtered, seed=42)
+        partition = self.adjacency.partition(selected_types)
+
+        with self._layouts_lock:
+            self.layouts[key] = (pos, partition)
+            while len(self.layouts) > self.MAX_LAYOUTS:
+                self.layouts.popitem(last=False)
+        return pos, partition
+
+    # Most edges followed per node when extracting a neighbourhood
+    EGO_MAX_DEGREE = 25
+
+    def ego_nodes(self, node_id, selected_types, hops, max_degree=None):
+        """
+        Return the nodes within `hops` edges of the selected types of a node.
+
+        Args:
+            node_id (str): Center node.
+            selected_types (list): Edge types to follow.
+            hops (int): Maximum distance from the center.
+            max_degree (int, optional): Edges followed per node, strongest first. Defaults to EGO_MAX_DEGREE.
+
+        Returns:
+            list: Node IDs, center first. Empty if the node is not in the graph.
+        """
+        max_degree = self.EGO_MAX_DEGREE if max_degree is None else max_degree
+        return self.adjacency.ego(node_id, selected_types, hops, max_degree=max_degree)
+
+    def generate_figure(self, selected_types, highlight_node_id=None, ego_hops=None):
         """
         Generate a Plotly figure to visualize the knowledge graph.
 
@@ -71,15 +186,23 @@ class KnowledgeGraphPlot:
         - Computes community detection and uses it to color nodes.
         - Applies different shapes and colors to node types.
         - Optionally highlights a specific node.
+        - Optionally shows only the neighbourhood of the highlighted node, placed at its
+          positions in the full layout, so only that subgraph is sent to the browser.
 
         Args:
             selected_types (list): Edge types to include in the visualization.
             highlight_node_id (str, optional): Node ID to highlight visually.
+            ego_hops (int, optional): Show only nodes within this many hops of the highlighted node.
 
         Returns:
             plotly.graph_objects.Figure: Plotly figure representing the filtered knowledge graph.
         """
-        G_filtered = self.build_graph(selected_types)
+        ego = None
+        if ego_hops and highlight_node_id is not None:
+            ego = self.ego_nodes(highlight_node_id, selected_types, ego_hops)
+
+        with stage("graph_build"):
+            G_filtered = self.build_graph(selected_types, nodes=ego or None)
 
         # Define shape and color schemes for known node types
         type_to_shape = {
@@ -111,21 +234,24 @@ class KnowledgeGraphPlot:
         if len(G_filtered.nodes) == 0:
             return go.Figure(layout={"title": "No edges match the selected types."})
 
-        # Compute spring layout and Louvain community partition
-        pos = nx.spring_layout(G_filtered, seed=42)
-        partition = community_louvain.best_partition(G_filtered)
+        # Spring layout and Louvain community partition, computed once per edge type selection
+        pos, partition = self.layout_and_partition(selected_types, None if ego else G_filtered)
         nx.set_node_attributes(G_filtered, partition, "community")
 
-        # Create edge traces grouped by edge type
+        # Create edge traces grouped by edge type. Coordinates are NumPy arrays with NaN
+        # separators between segments so they are sent as binary typed arrays.
+        edges_by_type = {}
+        for u, v, d in G_filtered.edges(data=True):
+            edges_by_type.setdefault(d.get("type"), []).append((u, v))
+
         edge_traces = []
         for etype in selected_types:
-            edge_x, edge_y = [], []
-            for u, v, d in G_filtered.edges(data=True):
-                if d.get("type") == etype:
-                    x0, y0 = pos[u]
-                    x1, y1 = pos[v]
-                    edge_x += [x0, x1, None]
-                    edge_y += [y0, y1, None]
+            edges = edges_by_type.get(etype, [])
+            edge_x = np.full(len(edges) * 3, np.nan)
+            edge_y = np.full(len(edges) * 3, np.nan)
+            if edges:
+                coords = np.array([(*pos[u], *pos[v]) for u, v in edges])
+                edge_x[0::3], edge_y[0::3], edge_x[1::3], edge_y[1::3] = coords.T
             edge_traces.append(
                 go.Scatter(
                     x=edge_x,
@@ -134,7 +260,6 @@ class KnowledgeGraphPlot:
                     mode="lines",
                     name=etype,
                     hoverinfo="skip",
-                    text=[etype] * (len(edge_x) // 3),
                 )
             )
 
@@ -166,31 +291,21 @@ class KnowledgeGraphPlot:
         # Create node traces with shape/color/size per type and optional highlight
         node_traces = []
         for ctype, nodes in nodes_by_type.items():
-            x_vals, y_vals, hover_texts, sizes, colors, line_colors = [], [], [], [], [], []
-
-            for n in nodes:
-                x, y = pos[n]
-                x_vals.append(x)
-                y_vals.append(y)
-                hover_texts.append(f"Node: {n}<br>Type: {ctype}")
-
-                is_highlighted = n == highlight_node_id
-                sizes.append(22 if is_highlighted else 15)
-                colors.append(color_map.get(ctype, "pink"))
-                line_colors.append("gold" if is_highlighted else "black")
-
+            coords = np.array([pos[n] for n in nodes])
+            is_highlighted = np.array([n == highlight_node_id for n in nodes])
             is_interactive = ctype not in non_interactive_types
+            line_colors = np.where(is_highlighted, "gold", "black").tolist() if is_highlighted.any() else "black"
 
             node_traces.append(
                 go.Scatter(
-                    x=x_vals,
-                    y=y_vals,
+                    x=coords[:, 0],
+                    y=coords[:, 1],
                     mode="markers",
                     hoverinfo="text" if is_interactive else "skip",
-                    text=hover_texts if is_interactive else None,
+                    text=[f"Node: {n}<br>Type: {ctype}" for n in nodes] if is_interactive else None,
                     marker=dict(
-                        size=sizes,
-                        color=colors,
+                        size=np.where(is_highlighted, 22, 15).astype(np.uint8),
+                        color=color_map.get(ctype, "pink"),
                         symbol=type_to_shape.get(ctype, "circle"),
                         line=dict(width=2, color=line_colors),
                         opacity=1,
@@ -201,8 +316,11 @@ class KnowledgeGraphPlot:
 
         # Combine traces into a final Plotly figure
         fig = go.Figure(data=edge_traces + node_traces)
+        title = "CatchNet (Filtered by Edge Type)"
+        if ego:
+            title = f"CatchNet: {ego_hops}-hop neighbourhood of {highlight_node_id}"
         fig.update_layout(
-            title="CatchNet (Filtered by Edge Type)",
+            title=title,
             title_font_size=16,
             showlegend=True,
             legend=dict(
@@ -241,3 +359,30 @@ class KnowledgeGraphPlot:
         """
         fig = self.generate_figure(self.edge_types_available)
         return dcc.Graph(id=self.html_id, figure=fig)
+
+    def render_view_controls(self):
+        """
+        Render the view mode switch (whole graph or neighbourhood of the clicked node) and the hop slider.
+
+        Returns:
+            dash.html.Div: Div with the "graph-view" radio items and the "ego-hops" slider.
+        """
+        return html.Div(
+            style={"display": "flex", "alignItems": "center", "gap": "12px", "color": "#083B6E"},
+            children=[
+                dcc.RadioItems(
+                    id="graph-view",
+                    options=[
+                        {"label": "Whole graph", "value": "full"},
+                        {"label": "Neighbourhood", "value": "ego"},
+                    ],
+                    value="full",
+                    inline=True,
+                    inputStyle={"marginRight": "4px", "marginLeft": "8px"},
+                ),
+                html.Div(
+                    dcc.Slider(id="ego-hops", min=1, max=3, step=1, value=1, marks={k: f"{k} hop" for k in (1, 2, 3)}),
+                    style={"flex": "1"},
+                ),
+            ],
+        )
@@ -8,19 +8,68 @@ from widgets.dropdown import *
 from widgets.wordcloud import *
 from widgets.pcp import *
 from widgets.sentiment_comparison_bar import *
+from widgets.divergence_table import DivergenceTable
+from widgets.annotator_table import AnnotatorAgreementTable
+from widgets.algorithm_agreement_panel import AlgorithmAgreementPanel
+from processing.article_catalog import ArticleCatalog
+from processing.corpus_index import CorpusIndex
+from processing.ingest import load_graph_tables
+from processing.snapshot import load_snapshot, save_snapshot, snapshot_path
+from processing.inference import ABSA_MODEL, inference_backend
+from processing.live_ingest import watch_interval
+from processing.sentiment_index import SentimentIndex
+from utils.jobs import CoalescingExecutor
+from utils.result_cache import ResultCache, dataset_version
 
-with open("data/mc1.json", "r") as f:
-    data = json.load(f)
+data_version = dataset_version("data/mc1.json", "data/articles")
 
 initial_point = "Namorna Transit Ltd"  # Company that all plots get initialized to
 
-knowledge_graph = KnowledgeGraphPlot(data=data, html_id="graph")
-horizontal_bar = HorizontalBarPlot(data=data, html_id="horizontalbar")
+
+def build_derived_state():
+    """
+    Build every data-derived structure from scratch: link tables, graph, default layout, article catalog
+    and corpus index.
+    """
+    tables = load_graph_tables("data/mc1.json")  # Columnar snapshot of mc1.json, rebuilt when the file changes
+    knowledge_graph = KnowledgeGraphPlot(data=None, html_id="graph", tables=tables)
+    knowledge_graph.layout_and_partition(knowledge_graph.edge_types_available)  # Layout of the initial view
+    catalog = ArticleCatalog.from_directory("data/articles", tables.links)  # Article files and their citing links
+    return {
+        "knowledge_graph": knowledge_graph,
+        "horizontal_bar": HorizontalBarPlot(data=None, html_id="horizontalbar", tables=tables),
+        "heatmap": Heatmap(data=None, html_id="heatmap", tables=tables),
+        "stream_graph": PCP(data=None, html_id="stream_graph", tables=tables),
+        "corpus_index": CorpusIndex(entities=tables.nodes["id"].tolist(), catalog=catalog),
+    }
+
+
+# Restore the derived state from the last full build if data and code are unchanged
+derived_state = load_snapshot(snapshot_path(), data_version)
+if derived_state is None:
+    derived_state = build_derived_state()
+    save_snapshot(snapshot_path(), data_version, derived_state)
+
+knowledge_graph = derived_state["knowledge_graph"]
+horizontal_bar = derived_state["horizontal_bar"]
 edge_type_dropdown = EdgeTypeDropdown(knowledge_graph._get_edge_types(), html_id="dropdown")
-heatmap = Heatmap(data=data, html_id="heatmap")
-wordcloud = WordCloudWidget([], id="wordcloud")
-sentiment_bar = DivergingSentimentPlot("sentiment-bar")
-stream_graph = PCP(data=data, html_id="stream_graph")
+heatmap = derived_state["heatmap"]
+corpus_index = derived_state["corpus_index"]
+stream_graph = derived_state["stream_graph"]
+for problem in corpus_index.catalog.check():
+    print(f"Article catalog: {problem}")
+inference = inference_backend()  # In-process models, or a client of the shared inference server
+wordcloud = WordCloudWidget([], id="wordcloud", corpus_index=corpus_index, inference=inference)
+sentiment_index = SentimentIndex(corpus_index, ABSA_MODEL)  # ABSA probabilities per entity mention, on disk
+sentiment_bar = DivergingSentimentPlot(
+    "sentiment-bar", corpus_index=corpus_index, inference=inference, sentiment_index=sentiment_index
+)
+divergence_table = DivergenceTable("divergence-table", heatmap, sentiment_index)
+annotator_table = AnnotatorAgreementTable("annotator-table", stream_graph, heatmap)
+algorithm_panel = AlgorithmAgreementPanel("algorithm-facts", horizontal_bar)
+nlp_jobs = CoalescingExecutor()  # Shares identical NLP runs and drops superseded ones
+panel_cache = ResultCache("panels")  # Word cloud phrases and article sentiment per heatmap cell
+figure_cache = ResultCache("figures", disk_dir="")  # Heatmap, bar and PCP figures per company and cell
 
 
 def create_layout():
@@ -34,6 +83,18 @@ def create_layout():
             "gap": "15px",
         },
         children=[
+            # Company, month, source and articles of the last graph/heatmap click, shared by the panel callbacks
+            dcc.Store(id="selection"),
+            # Source and period labels of the heatmap on screen, to send partial updates when they stay the same
+            dcc.Store(id="heatmap-axes", data=heatmap.shown_axes(initial_point)),
+            # Company shown in the heatmap, chosen in the graph or the most suspicious cells table
+            dcc.Store(id="heatmap-company", data=initial_point),
+            # Random per-tab id, set client-side, used to cancel a session's superseded NLP jobs
+            dcc.Store(id="session-id", storage_type="session"),
+            # Refreshes the edge type dropdown with types the dataset watcher picked up
+            dcc.Interval(
+                id="edge-type-refresh", interval=max(watch_interval(), 1) * 1000, disabled=watch_interval() <= 0
+            ),
             # Top row: Heatmap, Knowledge Graph, Wordcloud+Sentiment
             html.Div(
                 style={
@@ -54,6 +115,7 @@ def create_layout():
                             "borderRadius": "12px",
                         },
                         children=[
+                            html.Div(heatmap.render_time_controls(), style={"padding": "6px 8px 0"}),
                             html.Div(
                                 heatmap.render(company_name=initial_point, clickData=None),
                                 style={"width": "100%", "height": "100%"},
@@ -72,6 +134,7 @@ def create_layout():
                         },
                         children=[
                             html.Div(edge_type_dropdown.render(), style={"height": "40px"}),
+                            html.Div(knowledge_graph.render_view_controls(), style={"height": "30px"}),
                             html.Div(
                                 knowledge_graph.render(),
                                 style={
@@ -155,5 +218,21 @@ def create_layout():
                     ),
                 ],
             ),
+            # BassLine vs ShadGPT facts of the selected company or heatmap cell
+            html.Div(
+                id="algorithm-facts-container",
+                children=algorithm_panel.render(initial_point),
+                style={"backgroundColor": "#B9D3F6", "borderRadius": "12px"},
+            ),
+            # Most suspicious cells, filled once the page has loaded
+            html.Div(
+                divergence_table.render([]),
+                style={"backgroundColor": "#B9D3F6", "borderRadius": "12px"},
+            ),
+            # Annotator agreement ranking, filled once the page has loaded
+            html.Div(
+                annotator_table.render([]),
+                style={"backgroundColor": "#B9D3F6", "borderRadius": "12px"},
+            ),
         ],
     )
@@ -2,6 +2,8 @@ import plotly.express as px
 from dash import dcc
 import pandas as pd
 
+from processing.rollups import period_mask
+
 
 class PCP:
     """
@@ -9,7 +11,7 @@ class PCP:
     and annotated by different users, based on graph data containing nodes and links.
     """
 
-    def __init__(self, data, html_id):
+    def __init__(self, data, html_id, tables=None):
         """
         Initializes the PCP instance by preparing dataframes, edge types,
         processed plotting data, and the initial figure.
@@ -17,9 +19,11 @@ class PCP:
         Parameters:
             data (dict): Dictionary containing 'nodes' and 'links' lists.
             html_id (str): The HTML id string for the Dash Graph component.
+            tables (GraphTables, optional): Ingested node and link tables, used instead of `data`.
         """
         self.html_id = html_id
         self.data = data
+        self.tables = tables
 
         self.edge_type_sentiment = {
             "Event.Applaud": "positive",
@@ -49,10 +53,33 @@ class PCP:
         Returns:
             Tuple[pd.DataFrame, pd.DataFrame]: DataFrames for nodes and links respectively.
         """
+        if self.tables is not None:
+            return self.tables.nodes.copy(), self.tables.links.copy()
         nodes = self.data["nodes"]
         links = self.data["links"]
         return pd.DataFrame(nodes), pd.DataFrame(links)
 
+    def add_links(self, new_links, new_nodes=None):
+        """
+        Append newly ingested links (and nodes) without rebuilding the widget.
+
+        Parameters:
+            new_links (pd.DataFrame): Raw link rows.
+            new_nodes (pd.DataFrame, optional): Raw node rows added alongside them.
+
+        Returns:
+            bool: True if the links introduced edge types that were not plotted before.
+        """
+        if new_nodes is not None and len(new_nodes):
+            self.df_nodes = pd.concat([self.df_nodes, new_nodes])
+        if not len(new_links):
+            return False
+        self.df_links = pd.concat([self.df_links, new_links])
+        edge_types = self._get_edge_types()
+        new_types = set(edge_types) != set(self.edge_types_available)
+        self.edge_types_available = edge_types
+        return new_types
+
     def _get_edge_types(self):
         """
         Retrieves unique edge types from links and sorts them according to sentiment priority:
@@ -74,9 +101,12 @@ class PCP:
         Parameters:
             selected_point (str, optional): The node (source or target) to filter links by.
             Defaults to "Namorna Transit Ltd".
-            heatmap_filter (Tuple[datetime-like, str], optional): Tuple containing a date filter
-            (year-month) and raw source string to further filter links.
+            heatmap_filter (Tuple[str, str], optional): Tuple containing a period filter
+            (day, week, month or quarter string, e.g. "2035-02") and raw source string to further filter links.
             Defaults to None.
+
+        Returns:
+            pd.DataFrame: Long-format counts per annotator and edge type, also stored as `self.df_plot`.
         """
         if selected_point is not None:
             filtered_df = self.df_links[
@@ -88,12 +118,11 @@ class PCP:
                 filtered_df = filtered_df.copy()
                 filtered_df["_date_added"] = pd.to_datetime(filtered_df["_date_added"])
 
-                filter_date = pd.to_datetime(heatmap_filter[0])
+                filter_period = heatmap_filter[0]
                 filter_source = heatmap_filter[1]
 
                 filtered_df = filtered_df[
-                    (filtered_df["_date_added"].dt.year == filter_date.year)
-                    & (filtered_df["_date_added"].dt.month == filter_date.month)
+                    period_mask(filtered_df["_date_added"], filter_period)
                     & (filtered_df["_raw_source"] == filter_source)
                 ]
         else:
@@ -117,17 +146,21 @@ class PCP:
         else:
             # Create an empty DataFrame with expected columns
             self.df_plot = pd.DataFrame(columns=["_last_edited_by", "edge_type", "count"])
+        return self.df_plot
 
-    def _add_sentiment_bands(self, fig):
+    def _add_sentiment_bands(self, fig, df_plot=None):
         """
         Adds colored background bands to the plotly figure to visually indicate the sentiment
         category (positive, neutral, negative) associated with each edge type.
 
         Parameters:
             fig (plotly.graph_objs.Figure): The Plotly figure to add sentiment bands to.
+            df_plot (pd.DataFrame, optional): Counts to use. Defaults to `self.df_plot`.
         """
+        if df_plot is None:
+            df_plot = self.df_plot
         total_counts = (
-            self.df_plot.groupby("edge_type")["count"].sum().reindex(self.edge_types_available).fillna(0).cumsum()
+            df_plot.groupby("edge_type")["count"].sum().reindex(self.edge_types_available).fillna(0).cumsum()
         )
 
         sentiment_colors = {"positive": "green", "neutral": "lightgray", "negative": "red"}
@@ -155,15 +188,21 @@ class PCP:
             )
         fig.update_layout(shapes=shapes)
 
-    def generate_figure(self, month="", source=""):
+    def generate_figure(self, month="", source="", df_plot=None):
         """
         Generates the Plotly area chart figure representing the  PCP,
         with traces for each annotator and colored sentiment bands.
 
+        Parameters:
+            df_plot (pd.DataFrame, optional): Counts returned by `_prepare_plot_df`.
+            Defaults to `self.df_plot`.
+
         Returns:
             plotly.graph_objs.Figure: The generated  PCP figure.
         """
-        df_melted = self.df_plot
+        if df_plot is None:
+            df_plot = self.df_plot
+        df_melted = df_plot
         df_melted = df_melted.rename(columns={"_last_edited_by": "Annotator"})
         if month == "":
             title = "Edge Type  PCP by Annotator"
@@ -199,7 +238,7 @@ class PCP:
         )
 
         # Add colored background bands for sentiment categories
-        self._add_sentiment_bands(fig)
+        self._add_sentiment_bands(fig, df_plot)
 
         return fig
 
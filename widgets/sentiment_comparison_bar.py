@@ -1,10 +1,11 @@
 import plotly.graph_objects as go
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
-import torch.nn.functional as F
 from dash import dcc, html
 from nltk.tokenize import sent_tokenize
 
+from processing.article_catalog import ArticleCatalog
+from processing.inference import ABSA_MODEL, BatchedInference
+from utils.metrics import stage
+
 
 class DivergingSentimentPlot:
     """
@@ -18,14 +19,26 @@ class DivergingSentimentPlot:
         html_id (str): The HTML id used to render the Dash Graph component.
     """
 
-    def __init__(self, html_id):
+    def __init__(self, html_id, corpus_index=None, inference=None, sentiment_index=None):
         """
         Initializes the DivergingSentimentPlot instance.
 
         Parameters:
             html_id (str): The HTML element ID for the Dash Graph component.
+            corpus_index (CorpusIndex, optional): Index used to look up sentences mentioning the entity.
+            inference (BatchedInference or InferenceClient, optional): Runs the ABSA model. Defaults to
+                loading the models in this process.
+            sentiment_index (SentimentIndex, optional): Sentence-level ABSA index. When given, article
+                scores are the mean of the indexed sentence scores and only unindexed sentences are classified.
         """
         self.html_id = html_id
+        self.corpus_index = corpus_index
+        self.catalog = None  # Articles read without a corpus index, scanned on first use
+        self.sentiment_index = sentiment_index
+        self.model_name = ABSA_MODEL
+        # Sentence means and whole-article scores differ, so they are cached separately
+        self.model_version = self.model_name if sentiment_index is None else f"{self.model_name}|sentence-mean"
+        self.inference = inference or BatchedInference()
 
     def render_placeholder(self):
         """
@@ -48,14 +61,24 @@ class DivergingSentimentPlot:
             ],
         )
 
-    def render(self, triplet_sentiment_score, articles, entity, month, source):
+    def render(
+        self, triplet_sentiment_score, articles, entity, month, source, cancel_token=None, sentiment_scores=None
+    ):
         """
         Returns a Dash Graph with the sentiment diverging bar chart.
 
         Returns:
             dash.dcc.Graph: The Dash Graph.
         """
-        fig = self.build_figure(triplet_sentiment_score, articles, entity, month, source)
+        fig = self.build_figure(
+            triplet_sentiment_score,
+            articles,
+            entity,
+            month,
+            source,
+            cancel_token=cancel_token,
+            sentiment_scores=sentiment_scores,
+        )
         return dcc.Graph(
             id=self.html_id,
             figure=fig,
@@ -63,15 +86,22 @@ class DivergingSentimentPlot:
             style={"width": "100%", "height": "100%"},
         )
 
-    def build_figure(self, triplet_sentiment_score, articles, entity, month, source):
+    def build_figure(
+        self, triplet_sentiment_score, articles, entity, month, source, cancel_token=None, sentiment_scores=None
+    ):
         """
         Builds a horizontal bar chart comparing triplet and article sentiment scores.
 
+        Article scores are computed with `classify_aspect_sentiment` unless precomputed
+        (e.g. cached) `sentiment_scores` are given.
+
         Returns:
             Figure: The generated diverging bar chart figure.
         """
-        sentiment_scores = self.classify_aspect_sentiment(articles, entity)
-        sentiment_scores.insert(0, triplet_sentiment_score)
+        if sentiment_scores is None:
+            sentiment_scores = self.classify_aspect_sentiment(articles, entity, cancel_token=cancel_token)
+        sentiment_scores = [triplet_sentiment_score] + list(sentiment_scores)
+        articles = list(articles)
         y_labels = ["CatchNet"] + [f"Article {i}" for i in range(len(articles))]
 
         articles.insert(0, "Extracted triplet sentiment")
@@ -102,34 +132,53 @@ class DivergingSentimentPlot:
         )
         return fig
 
-    def classify_aspect_sentiment(self, articles, entity):
+    def classify_aspect_sentiment(self, articles, entity, cancel_token=None):
         """
         Returns sentiment scores (-1 to 1) for each article regarding the entity.
 
+        With a sentiment index, an article's score is the mean score of its sentences that
+        mention the entity, read from the index, and None if there are none. Otherwise all
+        articles are classified in one batch. If a cancel token is given, it is checked
+        while collecting sentences and before inference so superseded requests stop early.
+
         Returns:
             List[float]: Sentiment scores for each article.
         """
-        sentiments = []
+        if self.sentiment_index is not None:
+            return self.sentiment_index.article_scores(articles, entity, self.inference, cancel_token=cancel_token)
+
+        pairs = []
         for art in articles:
-            path = f"data/articles/{art}.txt"
-            with open(path, "r") as file:
-                text = file.read()
-                sentences = self.custom_sentence_split(text)
-                entity_sentences = " ".join(s for s in sentences if entity.lower() in s.lower())
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            # Sentences are passed separately so their token ids are cached across clicks
+            pairs.append((self.get_entity_sentences(art, entity), entity))
 
-                model_name = "yangheng/deberta-v3-base-absa-v1.1"
-                tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
-                model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        probs = self.inference.absa_probs(pairs)
+        return [float(-p[0] + p[2]) for p in probs]
 
-                inputs = tokenizer(entity_sentences, entity, return_tensors="pt")
+    def get_entity_sentences(self, article, entity):
+        """
+        Returns the sentences of an article that mention the entity.
+
+        Uses the corpus index when available, otherwise reads the article through an ArticleCatalog
+        of data/articles and splits it. Articles without a file have no sentences.
 
-                with torch.no_grad():
-                    outputs = model(**inputs)
+        Returns:
+            List[str]: Sentences mentioning the entity.
+        """
+        if self.corpus_index is not None:
+            return self.corpus_index.entity_sentences(article, entity)
 
-                probs = F.softmax(outputs.logits, dim=1)
-                score = -1 * probs[0][0] + probs[0][2]
-                sentiments.append(score.item())
-        return sentiments
+        if self.catalog is None:
+            self.catalog = ArticleCatalog.from_directory("data/articles")
+        if article not in self.catalog:
+            return []
+        text = self.catalog.read(article)
+        entity_lower = entity.lower()
+        return [s for s in self.custom_sentence_split(text) if entity_lower in s.lower()]
 
     def custom_sentence_split(self, text):
         """
@@ -138,10 +187,11 @@ class DivergingSentimentPlot:
         Returns:
             List[str]: List of extracted sentences.
         """
-        blocks = text.split("\n\n")
-        sentences = []
-        for block in blocks:
-            block = block.strip()
-            if block:
-                sentences.extend(sent_tokenize(block))
+        with stage("segmentation"):
+            blocks = text.split("\n\n")
+            sentences = []
+            for block in blocks:
+                block = block.strip()
+                if block:
+                    sentences.extend(sent_tokenize(block))
         return sentences
@@ -1,62 +1,13 @@
 from typing import List
 from dash import html, dcc
 import spacy
-from transformers import (
-    TokenClassificationPipeline,
-    AutoModelForTokenClassification,
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-)
-from transformers.pipelines import AggregationStrategy
 import numpy as np
-from transformers import AutoTokenizer
 from nltk.tokenize import sent_tokenize
-import torch
-import torch.nn.functional as F
 import random
 
-
-class KeyphraseExtractionPipeline(TokenClassificationPipeline):
-    """
-    Custom pipeline for keyphrase extraction using a token classification model.
-
-    Extends the Hugging Face TokenClassificationPipeline and applies
-    first-token aggregation strategy to extract unique keyphrases from text.
-    """
-
-    def __init__(self, model, *args, **kwargs):
-        """
-        Initializes the pipeline with a pretrained model and tokenizer.
-
-        Parameters:
-            model (str): The model name or path to load.
-            *args: Additional positional arguments.
-            **kwargs: Additional keyword arguments.
-        """
-        super().__init__(
-            model=AutoModelForTokenClassification.from_pretrained(model),
-            tokenizer=AutoTokenizer.from_pretrained(model),
-            *args,
-            **kwargs,
-        )
-
-    def postprocess(self, all_outputs):
-        """
-        Postprocesses the raw token classification outputs.
-
-        Applies aggregation strategy and returns unique keyphrases.
-
-        Parameters:
-            all_outputs (List): Raw model outputs from token classification.
-
-        Returns:
-            np.ndarray: Array of unique extracted keyphrases as strings.
-        """
-        results = super().postprocess(
-            all_outputs=all_outputs,
-            aggregation_strategy=AggregationStrategy.FIRST,
-        )
-        return np.unique([result.get("word").strip() for result in results])
+from processing.article_catalog import ArticleCatalog
+from processing.inference import ABSA_MODEL, KEYPHRASE_MODEL, BatchedInference
+from utils.metrics import stage
 
 
 class WordCloudWidget:
@@ -67,22 +18,37 @@ class WordCloudWidget:
     classified for sentiment, and displayed with color-coded styles.
     """
 
-    def __init__(self, phrases: List[str], width=800, height=400, background_color="white", id=None):
+    def __init__(
+        self,
+        phrases: List[str],
+        width=800,
+        height=400,
+        background_color="white",
+        id=None,
+        corpus_index=None,
+        inference=None,
+    ):
         """
         Initializes the word cloud widget.
 
-        Loads models for keyphrase extraction and phrase-level sentiment classification.
+        Keyphrase extraction and phrase-level sentiment classification run through `inference`
+        (a BatchedInference or an InferenceClient of the shared inference server); without one,
+        the models are loaded in this process.
+        If a CorpusIndex is given, entity sentences are looked up from it instead of
+        re-reading and re-scanning the articles on every request; without one, articles are read
+        through an ArticleCatalog of data/articles.
         """
         self.phrases = phrases
+        self.corpus_index = corpus_index
+        self.catalog = None  # Articles read without a corpus index, scanned on first use
         self.width = width
         self.height = height
         self.background_color = background_color
         self.id = id
-        self.phrase_polarity_model_name = "yangheng/deberta-v3-base-absa-v1.1"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.phrase_polarity_model_name, use_fast=False)
-        self.polarity_model = AutoModelForSequenceClassification.from_pretrained(self.phrase_polarity_model_name)
-        self.keyphrase_extractor_model_name = "ml6team/keyphrase-extraction-distilbert-inspec"
-        self.keyphrase_extractor = KeyphraseExtractionPipeline(model=self.keyphrase_extractor_model_name)
+        self.phrase_polarity_model_name = ABSA_MODEL
+        self.keyphrase_extractor_model_name = KEYPHRASE_MODEL
+        self.inference = inference or BatchedInference()
+        self.model_version = f"{self.keyphrase_extractor_model_name}|{self.phrase_polarity_model_name}|en_core_web_sm"
         self.force_red_keywords = {"overfishing, condemnation"}
         self.force_green_keywords = {"sustainab"}
         self.force_grey_keywords = {"stichtingmarine"}
@@ -109,7 +75,7 @@ class WordCloudWidget:
             ],
         )
 
-    def render_wordcloud(self, articles, entity, month, source):
+    def render_wordcloud(self, articles, entity, month, source, cancel_token=None):
         """
         Extracts keyphrases from articles related to an entity, classifies their sentiment,
         and returns a Dash HTML Div with color-coded phrases.
@@ -119,35 +85,68 @@ class WordCloudWidget:
             entity (str): The entity name to focus extraction and sentiment on.
             month (str): The month to filter by from the clicked heatmap cell.
             source (str): The source to filter by from the clicked heatmap cell.
+            cancel_token (CancelToken, optional): Checked between articles and phrases; raises
+                JobCancelled once a newer click has superseded this one.
 
         Returns:
             dash.html.Div: Dash Div component containing color-coded keyphrase tags.
         """
+        phrases_with_sentiment = self.compute_phrase_sentiments(articles, entity, cancel_token=cancel_token)
+        return self.render_phrases(phrases_with_sentiment, entity, month, source)
+
+    def compute_phrase_sentiments(self, articles, entity, cancel_token=None):
+        """
+        Extracts keyphrases from articles related to an entity and classifies their sentiment.
+
+        The result only depends on the articles, the entity and the models, so it can be cached.
+
+        Parameters:
+            articles (List[str]): List of article filenames (without extension).
+            entity (str): The entity name to focus extraction and sentiment on.
+            cancel_token (CancelToken, optional): Checked between articles and phrases.
+
+        Returns:
+            List[Tuple[str, Tuple[str, float]]]: Non-neutral phrases with their (label, score).
+        """
         phrases_list = []
-        for art in articles:
-            path = f"data/articles/{art}.txt"
-            with open(path, "r") as file:
-                text = file.read()
-                phrases = self.get_key_phrases(text, entity)
-                phrases_list.extend(phrases)
+        for phrases in self.get_key_phrases_per_article(articles, entity, cancel_token=cancel_token):
+            phrases_list.extend(phrases)
 
         if not phrases_list:
             phrases_list = [
                 "This company was never actually mentioned in the source article cited by the knowledge graph."
             ]
 
-        # Compute sentiment for each unique phrase
+        # Compute sentiment for all unique phrases in one batch
         unique_phrases = list(set(phrases_list))
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        probs = self.inference.absa_probs([(phrase, entity) for phrase in unique_phrases])
 
         phrases_with_sentiment = []
-        for phrase in unique_phrases:
-            label, score = self.classify_sentiment(phrase, entity)
+        for phrase, phrase_probs in zip(unique_phrases, probs):
+            label, score = self.label_and_score(phrase_probs)
             if label != "neutral":  # Filter out neutral phrases
                 phrases_with_sentiment.append((phrase, (label, score)))
 
         if not phrases_with_sentiment:
             phrases_with_sentiment = [("All phrases were neutral", ("neutral", 0.0))]
 
+        return phrases_with_sentiment
+
+    def render_phrases(self, phrases_with_sentiment, entity, month, source):
+        """
+        Returns the word cloud Dash Div for already classified phrases.
+
+        Parameters:
+            phrases_with_sentiment (List[Tuple[str, Tuple[str, float]]]): Output of `compute_phrase_sentiments`.
+            entity (str): The entity name.
+            month (str): The month of the clicked heatmap cell.
+            source (str): The source of the clicked heatmap cell.
+
+        Returns:
+            dash.html.Div: Dash Div component containing color-coded keyphrase tags.
+        """
         wordcloud_div = self.generate_phrase_tags(phrases_with_sentiment)
 
         return html.Div(
@@ -186,13 +185,21 @@ class WordCloudWidget:
             Tuple[str, float]: Sentiment label ("negative", "neutral", or "positive") and sentiment score.
                               Score is negative for negative sentiment, zero for neutral, and positive for positive.
         """
-        inputs = self.tokenizer(text, entity, return_tensors="pt")
-        with torch.no_grad():
-            outputs = self.polarity_model(**inputs)
-        probs = F.softmax(outputs.logits, dim=1)
-        label_id = probs.argmax().item()
+        return self.label_and_score(self.inference.absa_probs([(text, entity)])[0])
+
+    def label_and_score(self, probs):
+        """
+        Turns ABSA probabilities into a sentiment label and signed score.
+
+        Parameters:
+            probs (np.ndarray): Negative, neutral and positive probabilities.
+
+        Returns:
+            Tuple[str, float]: Sentiment label and score, as returned by `classify_sentiment`.
+        """
+        label_id = int(np.argmax(probs))
         labels = ["negative", "neutral", "positive"]
-        score = probs[0][label_id].item()
+        score = float(probs[label_id])
 
         if labels[label_id] == "negative":
             score = -score
@@ -293,7 +300,32 @@ class WordCloudWidget:
             ],
         )
 
-    def get_key_phrases(self, text, entity):
+    def get_entity_sentences(self, article, entity):
+        """
+        Returns the sentences of an article that mention the entity.
+
+        Uses the corpus index when available, otherwise reads the article through an ArticleCatalog
+        of data/articles and splits it. Articles without a file have no sentences.
+
+        Parameters:
+            article (str): Article filename (without extension).
+            entity (str): The entity name.
+
+        Returns:
+            List[str]: Sentences mentioning the entity.
+        """
+        if self.corpus_index is not None:
+            return self.corpus_index.entity_sentences(article, entity)
+
+        if self.catalog is None:
+            self.catalog = ArticleCatalog.from_directory("data/articles")
+        if article not in self.catalog:
+            return []
+        text = self.catalog.read(article)
+        entity_lower = entity.lower()
+        return [s for s in self.custom_sentence_split(text) if entity_lower in s.lower()]
+
+    def get_key_phrases(self, text, entity, entity_sentences=None):
         """
         Extracts keyphrases from text related to a given entity by combining model-based and
         NLP-based phrase extraction.
@@ -301,40 +333,76 @@ class WordCloudWidget:
         Parameters:
             text (str): The article or text content.
             entity (str): The entity name to focus extraction on.
+            entity_sentences (List[str], optional): Sentences already known to mention the entity.
+                When given, `text` is not split again.
 
         Returns:
             Set[str]: A set of unique keyphrases related to the entity.
         """
-        sentences = self.custom_sentence_split(text)
-        entity_sentences = [s for s in sentences if entity.lower() in s.lower()]
+        if entity_sentences is None:
+            entity_lower = entity.lower()
+            entity_sentences = [s for s in self.custom_sentence_split(text) if entity_lower in s.lower()]
         text = " ".join(entity_sentences)
 
-        model_phrases = self.keyphrase_extractor(text)
-        model_phrases = [str(s) for s in model_phrases.tolist()]
-        nlp_phrases = self.extract_polar_chunks(text, entity)
+        model_phrases = self.inference.keyphrases([text])[0]
+        nlp_phrases = self.extract_polar_chunks(text, entity, entity_sentences=entity_sentences)
 
         key_phrases = set(nlp_phrases + model_phrases)
         return key_phrases
 
-    def extract_polar_chunks(self, text, entity):
+    def get_key_phrases_per_article(self, articles, entity, cancel_token=None):
+        """
+        Extracts the keyphrases of several articles, running the keyphrase model once over all of them.
+
+        Parameters:
+            articles (List[str]): List of article filenames (without extension).
+            entity (str): The entity name to focus extraction on.
+            cancel_token (CancelToken, optional): Checked between articles and before the model call.
+
+        Returns:
+            List[Set[str]]: Unique keyphrases of each article, in input order.
+        """
+        sentences_per_article = []
+        for art in articles:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            sentences_per_article.append(self.get_entity_sentences(art, entity))
+
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        texts = [" ".join(entity_sentences) for entity_sentences in sentences_per_article]
+        model_phrases_per_article = self.inference.keyphrases(texts)
+
+        key_phrases = []
+        for text, entity_sentences, model_phrases in zip(texts, sentences_per_article, model_phrases_per_article):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            nlp_phrases = self.extract_polar_chunks(text, entity, entity_sentences=entity_sentences)
+            key_phrases.append(set(nlp_phrases + model_phrases))
+        return key_phrases
+
+    def extract_polar_chunks(self, text, entity, entity_sentences=None):
         """
         Extracts noun chunks from sentences mentioning the entity.
 
         Parameters:
             text (str): Text to analyze.
             entity (str): The target entity.
+            entity_sentences (List[str], optional): Sentences already known to mention the entity.
 
         Returns:
             List[str]: List of noun chunk strings.
         """
-        sentences = self.custom_sentence_split(text)
-        entity_sentences = [s for s in sentences if entity.lower() in s.lower()]
+        if entity_sentences is None:
+            entity_lower = entity.lower()
+            entity_sentences = [s for s in self.custom_sentence_split(text) if entity_lower in s.lower()]
 
         chunks = []
-        for sent in entity_sentences:
-            doc = self.nlp(sent)
-            for chunk in doc.noun_chunks:
-                chunks.append(chunk.text)
+        with stage("spacy"):
+            for sent in entity_sentences:
+                doc = self.nlp(sent)
+                for chunk in doc.noun_chunks:
+                    chunks.append(chunk.text)
 
         return chunks
 
@@ -349,11 +417,12 @@ class WordCloudWidget:
         Returns:
             List[str]: List of sentence strings.
         """
-        blocks = text.split("\n\n")
-        sentences = []
-        for block in blocks:
-            block = block.strip()
-            if not block:
-                continue
-            sentences.extend(sent_tokenize(block))
+        with stage("segmentation"):
+            blocks = text.split("\n\n")
+            sentences = []
+            for block in blocks:
+                block = block.strip()
+                if not block:
+                    continue
+                sentences.extend(sent_tokenize(block))
         return sentences